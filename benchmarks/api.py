@@ -0,0 +1,279 @@
+"""Script benchmarks the v1 API against a seeded SQLite database.
+
+Every endpoint is driven through the Flask test client by a pool of
+concurrent workers, the latency percentiles and throughput of each one
+are reported as JSON so runs can be compared across commits.
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from datetime import datetime
+from bucketlist_api import create_app, db
+from bucketlist_api.api import add_resources
+from bucketlist_api.cache import response_cache, token_cache
+from bucketlist_api.config import Config
+from bucketlist_api.sample_data import generate, SAMPLE_PASSWORD, THINGS
+
+PASSWORD = SAMPLE_PASSWORD
+WORDS = [thing.split()[-1] for thing in THINGS]
+
+
+class BenchConfig(Config):
+    """Configuration the benchmark app runs with."""
+    ENV = 'bench'
+    DEBUG = False
+    PASSWORD_HASH_WORKERS = 2
+
+
+def make_config(database_path, hash_rounds=None):
+    """Return a BenchConfig subclass using the database at path."""
+    settings = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path}
+    if hash_rounds:
+        settings['PASSWORD_HASH_ROUNDS'] = hash_rounds
+    return type('BenchConfig', (BenchConfig,), settings)
+
+
+def percentile(ordered, fraction):
+    """Return the nearest-rank percentile of an ordered list."""
+    if not ordered:
+        return None
+    index = max(int(round(fraction * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    """Summarize the latencies, in seconds, of one endpoint.
+
+    The percentiles are None when no latency was recorded.
+    """
+    ordered = sorted(latencies)
+
+    def milliseconds(fraction):
+        if not ordered:
+            return None
+        return percentile(ordered, fraction) * 1000
+
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput': elapsed and len(ordered) / elapsed or None,
+        'p50_ms': milliseconds(0.50),
+        'p95_ms': milliseconds(0.95),
+        'p99_ms': milliseconds(0.99),
+    }
+
+
+class Session(object):
+    """A benchmark client logged in as one of the seeded users."""
+
+    def __init__(self, app, username, token, bucketlist_ids):
+        self.client = app.test_client()
+        self.username = username
+        self.headers = {
+            'Authorization': 'Basic ' + b64encode(
+                (token + ':unused').encode('utf-8')).decode('utf-8'),
+        }
+        self.bucketlist_ids = list(bucketlist_ids)
+        self.item_ids = []
+
+    def send(self, method, url, body=None):
+        data = body is not None and json.dumps(body) or None
+        return self.client.open(url, method=method, data=data,
+                                headers=self.headers,
+                                content_type='application/json')
+
+
+def seed(app, users, bucketlists, items, seed_value):
+    """Create the tables of app and fill them with a generated dataset.
+
+    Return:
+        [dict] range of the bucketlist ids created for each username
+    """
+    with app.app_context():
+        # The session is per thread, drop one bound to another app
+        db.session.remove()
+        db.create_all()
+        seeded = generate(users=users, bucketlists=bucketlists, items=items,
+                          seed=seed_value, prefix='bench')
+        db.session.remove()
+    return seeded
+
+
+def login(app, username, bucketlist_ids):
+    """Log a seeded user in and return its benchmark session."""
+    client = app.test_client()
+    response = client.post('/v1/auth/login', content_type='application/json',
+                           data=json.dumps({'username': username,
+                                            'password': PASSWORD}))
+    token = json.loads(response.data.decode('utf-8'))['token']
+    return Session(app, username, token, bucketlist_ids)
+
+
+def scenarios(rng):
+    """Return the benchmarked endpoints in the order they are run.
+
+    Every scenario is a (name, function) pair, the function takes a
+    Session and returns a (response, expected status) pair.
+    """
+    def register(session):
+        username = 'new%d%d' % (threading.current_thread().ident,
+                                rng.randint(0, 10 ** 9))
+        return session.client.post(
+            '/v1/auth/register', content_type='application/json',
+            data=json.dumps({'username': username, 'password': PASSWORD})
+        ), 201
+
+    def login_user(session):
+        return session.client.post(
+            '/v1/auth/login', content_type='application/json',
+            data=json.dumps({'username': session.username,
+                             'password': PASSWORD})), 200
+
+    def list_bucketlists(session):
+        return session.send('GET', '/v1/bucketlists?limit=20'), 200
+
+    def list_cursor(session):
+        return session.send('GET', '/v1/bucketlists?limit=20&cursor='), 200
+
+    def search(session):
+        return session.send('GET', '/v1/bucketlists?q=%s' %
+                            rng.choice(WORDS)), 200
+
+    def create_bucketlist(session):
+        response = session.send('POST', '/v1/bucketlists',
+                                {'name': ' '.join(rng.sample(WORDS, 3))})
+        if response.status_code == 201:
+            session.bucketlist_ids.append(
+                json.loads(response.data.decode('utf-8'))['id'])
+        return response, 201
+
+    def create_item(session):
+        bucketlist_id = rng.choice(session.bucketlist_ids)
+        response = session.send('POST', '/v1/bucketlists/%d/items' %
+                                bucketlist_id,
+                                {'name': ' '.join(rng.sample(WORDS, 2))})
+        if response.status_code == 201:
+            item = json.loads(response.data.decode('utf-8'))
+            session.item_ids.append((bucketlist_id, item['id']))
+        return response, 201
+
+    def update_item(session):
+        if not session.item_ids:
+            create_item(session)
+        bucketlist_id, item_id = rng.choice(session.item_ids)
+        return session.send('PUT', '/v1/bucketlists/%d/items/%d' %
+                            (bucketlist_id, item_id), {'done': 1}), 200
+
+    def delete_item(session):
+        if not session.item_ids:
+            create_item(session)
+        bucketlist_id, item_id = session.item_ids.pop()
+        return session.send('DELETE', '/v1/bucketlists/%d/items/%d' %
+                            (bucketlist_id, item_id)), 204
+
+    return [
+        ('register', register),
+        ('login', login_user),
+        ('list_bucketlists', list_bucketlists),
+        ('list_bucketlists_cursor', list_cursor),
+        ('search', search),
+        ('create_bucketlist', create_bucketlist),
+        ('create_item', create_item),
+        ('update_item', update_item),
+        ('delete_item', delete_item),
+    ]
+
+
+def drive(sessions, scenario, requests):
+    """Run requests calls of scenario spread over one thread per session.
+
+    Return:
+        [dict] summary of the latencies observed
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    per_worker = [requests // len(sessions)] * len(sessions)
+    for index in range(requests % len(sessions)):
+        per_worker[index] += 1
+
+    def worker(session, count):
+        for _ in range(count):
+            start = time.time()
+            response, expected = scenario(session)
+            duration = time.time() - start
+            with lock:
+                latencies.append(duration)
+                if response.status_code != expected:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(session, count))
+               for session, count in zip(sessions, per_worker)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.time() - start)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=open(os.devnull, 'w')).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(users=10, bucketlists=50, items=20, requests=200, workers=4,
+        hash_rounds=None, seed_value=0):
+    """Seed a fresh database, benchmark every endpoint and return a report.
+
+    Arguments:
+        users: [int] number of seeded users
+        bucketlists: [int] number of bucketlists per seeded user
+        items: [int] number of items per seeded bucketlist
+        requests: [int] number of requests sent to each endpoint
+        workers: [int] number of concurrent clients
+        hash_rounds: [int] password hash rounds, defaults to the Config's
+        seed_value: [int] seed making the dataset and requests reproducible
+    """
+    rng = random.Random(seed_value)
+    directory = tempfile.mkdtemp(prefix='bucketlist-bench-')
+    try:
+        app = create_app(make_config(os.path.join(directory, 'bench.sqlite'),
+                                     hash_rounds))
+        add_resources()
+        seeded = seed(app, users, bucketlists, items, seed_value)
+        usernames = sorted(seeded)
+        sessions = []
+        for index in range(workers):
+            username = usernames[index % len(usernames)]
+            sessions.append(login(app, username, seeded[username]))
+        results = {}
+        for name, scenario in scenarios(rng):
+            results[name] = drive(sessions, scenario, requests)
+        with app.app_context():
+            db.session.remove()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'revision': git_revision(),
+        'date': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'dataset': {'users': users, 'bucketlists': bucketlists,
+                    'items': items, 'seed': seed_value},
+        'requests': requests,
+        'workers': workers,
+        'endpoints': results,
+        'caches': {'responses': response_cache.stats(),
+                   'tokens': token_cache.stats()},
+    }
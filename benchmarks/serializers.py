@@ -0,0 +1,67 @@
+"""Script compares flask_restful.marshal with the compiled serializers.
+
+Run with ``python -m benchmarks.serializers [bucketlists] [items]``.
+"""
+
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from flask_restful import marshal
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import bucketlist_collection_serializer
+
+
+class Record(object):
+    """Plain object standing in for a model instance."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def make_page(bucketlists, items):
+    """Build a paginated response of bucketlists with their items."""
+    start = datetime(2016, 6, 1, 12, 30)
+    page = []
+    for number in range(bucketlists):
+        stamp = start + timedelta(minutes=number)
+        page.append(Record(
+            id=number, name='Bucketlist %d' % number, is_public=number % 2,
+            date_created=stamp, date_modified=stamp, user_id=1,
+            item_list=[Record(id=number * items + item,
+                              name='Item %d' % item, done=item % 3 == 0,
+                              date_created=stamp, date_modified=stamp)
+                       for item in range(items)]))
+    return {
+        'bucketlists': page,
+        'pagination': {'page': 1, 'number_of_pages': 1, 'total': bucketlists},
+    }
+
+
+def run(bucketlists=100, items=20, repeat=5):
+    """Time both serializers on the same page.
+
+    Return:
+        [dict] best time in seconds of each serializer and the speedup
+    """
+    data = make_page(bucketlists, items)
+    compiled = compile_fields(bucketlist_collection_serializer)
+    expected = json.dumps(marshal(data, bucketlist_collection_serializer))
+    if json.dumps(compiled(data)) != expected:
+        raise AssertionError('compiled output differs from marshal')
+    marshal_time = min(timeit.repeat(
+        lambda: marshal(data, bucketlist_collection_serializer),
+        number=1, repeat=repeat))
+    compiled_time = min(timeit.repeat(lambda: compiled(data), number=1,
+                                      repeat=repeat))
+    return {
+        'bucketlists': bucketlists,
+        'items': items,
+        'marshal': marshal_time,
+        'compiled': compiled_time,
+        'speedup': marshal_time / compiled_time,
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(*[int(arg) for arg in sys.argv[1:3]]), indent=2))
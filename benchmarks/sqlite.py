@@ -0,0 +1,163 @@
+"""Script benchmarks concurrent reads and writes under SQLite PRAGMAs.
+
+The same seeded database is served with SQLite's defaults and with the
+SQLITE_PRAGMAS of the Config, readers list bucketlists while writers
+create and update items, the throughput and latencies of both sides are
+reported as JSON for each setup.
+"""
+
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from bucketlist_api import create_app, db
+from bucketlist_api.api import add_resources
+from bucketlist_api.config import Config
+from bucketlist_api.pragmas import sqlite_pragmas
+from benchmarks.api import BenchConfig, WORDS, login, seed, summarize, \
+                           git_revision
+
+# SQLite's own settings, foreign keys are needed by the deletes
+DEFAULT_PRAGMAS = [('foreign_keys', 'ON')]
+
+
+def make_config(database_path, pragmas):
+    """Return a BenchConfig subclass using the database and PRAGMAs given.
+
+    Responses aren't cached so every read reaches the database.
+    """
+    return type('SQLiteBenchConfig', (BenchConfig,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path,
+        'SQLITE_PRAGMAS': pragmas,
+        'RESPONSE_CACHE_SIZE': 0,
+        'PASSWORD_HASH_ROUNDS': 1000,
+        'PASSWORD_HASH_WORKERS': 0,
+        'SLOW_QUERY_THRESHOLD_MS': None,
+    })
+
+
+def read(session, rng):
+    bucketlist_id = rng.choice(session.bucketlist_ids)
+    return session.send('GET', '/v1/bucketlists/%d/items?limit=20' %
+                        bucketlist_id), 200
+
+
+def write(session, rng):
+    if session.item_ids and rng.random() < 0.5:
+        bucketlist_id, item_id = rng.choice(session.item_ids)
+        return session.send('PUT', '/v1/bucketlists/%d/items/%d' %
+                            (bucketlist_id, item_id), {'done': 1}), 200
+    bucketlist_id = rng.choice(session.bucketlist_ids)
+    response = session.send('POST', '/v1/bucketlists/%d/items' %
+                            bucketlist_id,
+                            {'name': ' '.join(rng.sample(WORDS, 2))})
+    if response.status_code == 201:
+        item = json.loads(response.data.decode('utf-8'))
+        session.item_ids.append((bucketlist_id, item['id']))
+    return response, 201
+
+
+def drive(readers, writers, requests, seed_value):
+    """Run readers and writers at the same time, requests calls each.
+
+    Return:
+        [dict] summaries of the reads and the writes, the throughput of
+        each counts until its last client finished
+    """
+    results = {'reads': ([], [0], [0.0]), 'writes': ([], [0], [0.0])}
+    lock = threading.Lock()
+
+    def worker(kind, operation, session, seed):
+        rng = random.Random(seed)
+        latencies, errors, finished = results[kind]
+        for _ in range(requests):
+            start = time.time()
+            response, expected = operation(session, rng)
+            duration = time.time() - start
+            with lock:
+                latencies.append(duration)
+                if response.status_code != expected:
+                    errors[0] += 1
+        with lock:
+            finished[0] = max(finished[0], time.time())
+
+    threads = [threading.Thread(target=worker,
+                                args=('reads', read, session,
+                                      seed_value + index))
+               for index, session in enumerate(readers)]
+    threads += [threading.Thread(target=worker,
+                                 args=('writes', write, session,
+                                       seed_value - index - 1))
+                for index, session in enumerate(writers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict((kind, summarize(latencies, errors[0], finished[0] - start))
+                for kind, (latencies, errors, finished) in results.items())
+
+
+def run_setup(pragmas, users, bucketlists, items, requests, readers,
+              writers, seed_value):
+    """Seed a fresh database served with pragmas and benchmark it."""
+    directory = tempfile.mkdtemp(prefix='bucketlist-sqlite-bench-')
+    try:
+        app = create_app(make_config(
+            os.path.join(directory, 'bench.sqlite'), pragmas))
+        add_resources()
+        seeded = seed(app, users, bucketlists, items, seed_value)
+        usernames = sorted(seeded)
+        sessions = [login(app, usernames[index % len(usernames)],
+                          seeded[usernames[index % len(usernames)]])
+                    for index in range(readers + writers)]
+        result = drive(sessions[:readers], sessions[readers:], requests,
+                       seed_value)
+        with app.app_context():
+            db.session.remove()
+            db.get_engine(app).dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+
+def run(users=10, bucketlists=20, items=20, requests=200, readers=4,
+        writers=2, seed_value=0):
+    """Benchmark SQLite's defaults against the configured PRAGMAs.
+
+    Arguments:
+        users: [int] number of seeded users
+        bucketlists: [int] number of bucketlists per seeded user
+        items: [int] number of items per seeded bucketlist
+        requests: [int] number of requests each client sends
+        readers: [int] number of clients listing items
+        writers: [int] number of clients creating and updating items
+        seed_value: [int] seed making the dataset and requests reproducible
+    """
+    setups = [('default', DEFAULT_PRAGMAS), ('tuned', Config.SQLITE_PRAGMAS)]
+    results = {}
+    previous = sqlite_pragmas.pragmas
+    try:
+        for name, pragmas in setups:
+            results[name] = run_setup(pragmas, users, bucketlists, items,
+                                      requests, readers, writers, seed_value)
+            results[name]['pragmas'] = [[key, value]
+                                        for key, value in pragmas]
+    finally:
+        sqlite_pragmas.pragmas = previous
+    return {
+        'revision': git_revision(),
+        'date': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'dataset': {'users': users, 'bucketlists': bucketlists,
+                    'items': items, 'seed': seed_value},
+        'requests': requests,
+        'readers': readers,
+        'writers': writers,
+        'setups': results,
+    }
@@ -5,6 +5,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_restful import Api
 from flask_api import FlaskAPI
 from bucketlist_api.custom_error import errors
+from bucketlist_api.cache import token_cache, response_cache, public_feed
+from bucketlist_api.hashing import password_hasher
+from bucketlist_api.instrumentation import sql_instrumentation
+from bucketlist_api.pragmas import sqlite_pragmas
 
 db = SQLAlchemy()
 api_blueprint = Blueprint("api", __name__, url_prefix='/v1')
@@ -23,5 +27,11 @@ def create_app(ConfigObj):
     app = Flask(__name__)
     app.config.from_object(ConfigObj)
     db.init_app(app)
+    token_cache.init_app(app)
+    response_cache.init_app(app)
+    public_feed.init_app(app)
+    password_hasher.init_app(app)
+    sql_instrumentation.init_app(app)
+    sqlite_pragmas.init_app(app)
     app.register_blueprint(api_blueprint)
     return app
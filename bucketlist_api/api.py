@@ -10,16 +10,35 @@ from bucketlist_api.resources.bucketlistapi import BucketListAPI
 from bucketlist_api.resources.itemlistapi import ItemListAPI
 from bucketlist_api.resources.createuserapi import CreateUserAPI
 from bucketlist_api.resources.loginuserapi import LoginUserAPI
+from bucketlist_api.resources.accountapi import AccountAPI
 from bucketlist_api.resources.helpapi import HelpAPI
+from bucketlist_api.resources.syncapi import SyncAPI
+from bucketlist_api.resources.exportapi import ExportAPI
+from bucketlist_api.resources.importapi import ImportAPI
+from bucketlist_api.resources.statsapi import StatsAPI
+from bucketlist_api.resources.publicapi import PublicBucketListAPI
+from bucketlist_api.resources.batchapi import BatchAPI
+
+
+def add_resources():
+    """Bind the API resources to the most recently created app."""
+    api.add_resource(HelpAPI, '/help', endpoint='help')
+    api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+    api.add_resource(LoginUserAPI, '/auth/login', endpoint='login')
+    api.add_resource(AccountAPI, '/account', endpoint='account')
+    api.add_resource(BucketListAPI, '/bucketlists', '/bucketlists/<int:id>',
+                     endpoint='bucketlists')
+    api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
+                     '/bucketlists/<int:bucketlist_id>/items/<int:item_id>',
+                     endpoint='items')
+    api.add_resource(SyncAPI, '/sync', endpoint='sync')
+    api.add_resource(ExportAPI, '/export', endpoint='export')
+    api.add_resource(ImportAPI, '/import', endpoint='import')
+    api.add_resource(StatsAPI, '/stats', endpoint='stats')
+    api.add_resource(PublicBucketListAPI, '/public/bucketlists',
+                     endpoint='public')
+    api.add_resource(BatchAPI, '/batch', endpoint='batch')
 
 # initialization
 app = create_app(DevConfig)
-
-api.add_resource(HelpAPI, '/help', endpoint='help')
-api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
-api.add_resource(LoginUserAPI, '/auth/login', endpoint='login')
-api.add_resource(BucketListAPI, '/bucketlists', '/bucketlists/<int:id>',
-                 endpoint='bucketlists')
-api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
-                 '/bucketlists/<int:bucketlist_id>/items/<int:item_id>',
-                 endpoint='items')
+add_resources()
@@ -2,16 +2,21 @@
 
 from flask_httpauth import HTTPBasicAuth
 from bucketlist_api.models import User
-from flask import jsonify, make_response, g
+from flask import jsonify, make_response, g, request
 
 # Authentication Object
 auth = HTTPBasicAuth()
 
+# Environ key of the user a batch authenticated for its sub-requests
+AUTHENTICATED_USER = 'bucketlist_api.authenticated_user'
+
 
 @auth.verify_password
 def authenticate_token(token, password):
-    """Autheticate User with the provideded token."""
-    user = User.verify_token(token)
+    """Autheticate User with the provideded token.
+    Sub-requests of a batch are run as the user the batch authenticated
+    """
+    user = request.environ.get(AUTHENTICATED_USER) or User.verify_token(token)
     if user:
         g.user = user
         return True
@@ -0,0 +1,532 @@
+"""Script defines the in-process caches used by the application."""
+
+import bisect
+import time
+import threading
+from collections import OrderedDict
+from six.moves.urllib.parse import urlencode
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+
+
+class TokenCache(object):
+    """Bounded LRU cache of verified authentication tokens.
+
+    Maps a token that has already passed signature verification to the
+    lightweight identity of its user, so repeated requests with the same
+    token skip both the HMAC check and the database lookup.
+
+    Attributes:
+        max_size: [int] maximum number of tokens held before evicting the
+                  least recently used one
+        ttl: [int] maximum number of seconds an entry is trusted, entries
+             never outlive the expiry encoded in the token itself
+        hits: [int] number of lookups answered from the cache
+        misses: [int] number of lookups that fell through to verification
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Configure the cache from the app config and start it empty."""
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('TOKEN_CACHE_TTL', self.ttl)
+        self.clear()
+
+    def get(self, token):
+        """Return the cached identity for token or None.
+
+        Arguments:
+            token: [String] the raw authentication token
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._touch(token)
+            self.hits += 1
+            return identity
+
+    def set(self, token, identity, token_expiry=None):
+        """Cache the identity a verified token resolves to.
+
+        Arguments:
+            token: [String] the raw authentication token
+            identity: the lightweight user identity, must expose an `id`
+            token_expiry: [int] unix time at which the token itself expires
+        """
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (identity, expires_at)
+            self._tokens_by_user.setdefault(identity.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token belonging to the user."""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_ratio': lookups and float(self.hits) / lookups or 0.0,
+            }
+
+    def _touch(self, token):
+        # OrderedDict.move_to_end is not available on Python 2
+        if hasattr(self._entries, 'move_to_end'):
+            self._entries.move_to_end(token)
+        else:
+            self._entries[token] = self._entries.pop(token)
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+token_cache = TokenCache()
+
+
+class MemoryBackend(object):
+    """In-process LRU store, the default backend of the response cache.
+
+    A shared backend, e.g. one wrapping Redis or memcached, only needs the
+    same get, set and incr methods, get also reading the counters made by
+    incr. Counters must outlive the entries, they are never evicted here.
+
+    Attributes:
+        max_size: [int] maximum number of entries held before evicting the
+                  least recently used one
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value or counter stored under key or None."""
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries[key] = self._entries.pop(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        """Increment the counter under key, starting from 0, return it."""
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+
+class ResponseCache(object):
+    """Cache of rendered responses, keyed by user, path and query arguments.
+
+    Every key embeds a generation counter of the user. Writes touching the
+    user's records bump it once their transaction commits, so the stale
+    responses are never read again and age out of the backend.
+
+    Attributes:
+        backend: store of the responses, MemoryBackend unless the config
+                 names another class in RESPONSE_CACHE_BACKEND
+        ttl: [int] maximum number of seconds a response is kept
+        hits: [int] number of lookups answered from the cache
+        misses: [int] number of lookups that fell through to the view
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._listening = False
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Configure the backend from the app config and start it empty."""
+        backend = app.config.get('RESPONSE_CACHE_BACKEND')
+        size = app.config.get('RESPONSE_CACHE_SIZE', 1024)
+        if backend:
+            self.backend = import_string(backend)(size)
+        else:
+            self.backend = MemoryBackend(size)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+        if not self._listening:
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+
+    def key(self, user_id, path, args):
+        """Return the key of a response for the current generation.
+
+        Arguments:
+            user_id: [int] id of the user the response belongs to
+            path: [String] path of the request
+            args: [MultiDict] query arguments of the request
+        """
+        generation = self._generation(user_id)
+        return 'response:%s:%s:%s?%s' % (user_id, generation, path,
+                                         urlencode(sorted(args.items(
+                                             multi=True))))
+
+    def get(self, key):
+        """Return the (body, status, headers) cached under key or None."""
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key, body, status, headers):
+        """Cache a rendered response under key."""
+        self.backend.set(key, (body, status, headers), self.ttl)
+
+    def invalidate_user(self, user_id, session=None):
+        """Make every cached response of the user stale.
+
+        Arguments:
+            user_id: [int] id of the user whose records changed
+            session: [Session] transaction making the change, the responses
+                     are invalidated once it commits
+        """
+        if user_id is None:
+            return
+        if session is None:
+            self.backend.incr('generation:%s' % user_id)
+        else:
+            session.info.setdefault('response_cache_users', set()).add(
+                user_id)
+
+    def is_pending(self, user_id, session):
+        """Tell whether session holds writes of the user not yet committed,
+        the cached responses of the user are stale for that session.
+        """
+        return user_id in session.info.get('response_cache_users', ())
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': lookups and float(self.hits) / lookups or 0.0,
+            }
+
+    def _generation(self, user_id):
+        return self.backend.get('generation:%s' % user_id) or 0
+
+    def _after_commit(self, session):
+        for user_id in session.info.pop('response_cache_users', ()):
+            self.invalidate_user(user_id)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('response_cache_users', None)
+
+
+response_cache = ResponseCache()
+
+
+class PublicFeed(object):
+    """Materialized head of the feed of public bucketlists, newest first.
+
+    Holds the rendered records of the size newest public bucketlists, the
+    pages inside them are answered without a query. Writes report the
+    bucketlists they touch with refresh, once their transaction commits
+    those entries are marked stale and the next read reloads only them
+    with a single query. Pages further down are read from the database.
+
+    Every method reading the database takes load, a function returning
+    the (key, record) of public bucketlists newest first, keys are the
+    (date_created, id) tuples ordering the feed. It is called with limit
+    for the head of the feed, with ids to reload some bucketlists, or with
+    after and limit for a later page. The queries run outside the lock of
+    the head, one at a time, a reader finding one under way serves the
+    head as it is rather than wait.
+
+    Attributes:
+        size: [int] maximum number of bucketlists held
+        ttl: [int] maximum number of seconds the head is kept, it picks up
+             writes made by other processes when it is loaded again
+        hits: [int] number of pages answered from the head
+        misses: [int] number of pages read from the database
+    """
+
+    def __init__(self):
+        self.size = 1000
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._listening = False
+        self._generation = 0
+        self._loading = False
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def init_app(self, app):
+        """Configure the feed from the app config and start it empty."""
+        self.size = app.config.get('PUBLIC_FEED_CACHE_SIZE', self.size)
+        self.ttl = app.config.get('PUBLIC_FEED_CACHE_TTL', self.ttl)
+        self.clear()
+        if not self._listening:
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+
+    def clear(self):
+        """Drop the head of the feed and reset the counters."""
+        with self._lock:
+            self._reset()
+            self.hits = 0
+            self.misses = 0
+
+    def refresh(self, bucketlist_id, is_public, session=None):
+        """Update the entry of a bucketlist after it changed.
+
+        Arguments:
+            bucketlist_id: [int] id of the bucketlist or of the bucketlist
+                           of the item that changed
+            is_public: [Boolean] whether the bucketlist is public now
+            session: [Session] transaction making the change, the entry is
+                     marked stale once it commits
+        """
+        if bucketlist_id is None:
+            return
+        with self._lock:
+            # A private bucketlist only matters if it was public till now
+            if not is_public and bucketlist_id not in self._keys_by_id:
+                return
+        if session is None:
+            self._mark_stale([bucketlist_id])
+        else:
+            session.info.setdefault('public_feed_ids', set()).add(
+                bucketlist_id)
+
+    def invalidate(self, session=None):
+        """Drop the head of the feed, for writes whose bucketlists aren't
+        known, once the session commits.
+        """
+        if session is None:
+            with self._lock:
+                self._reset()
+        else:
+            session.info['public_feed_reset'] = True
+
+    def page(self, load, after, limit):
+        """Return a page of the feed.
+
+        Arguments:
+            load: [function] reads the public bucketlists, see the class
+            after: key of the last bucketlist of the previous page or None
+                   for the first page
+            limit: [int] maximum number of bucketlists in the page
+
+        Return:
+            (entries, has_next, hit) entries are the (key, record) of the
+            page, hit tells whether the page came from the head without
+            loading it
+        """
+        loaded = self._sync(load)
+        with self._lock:
+            hit = not loaded
+            end = len(self._keys)
+            if after is not None:
+                end = bisect.bisect_left(self._keys, after)
+            if end >= limit or self._complete:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                start = max(end - limit, 0)
+                entries = list(zip(self._keys[start:end],
+                                   self._records[start:end]))
+                entries.reverse()
+                return entries, start > 0 or not self._complete, hit
+            self.misses += 1
+        entries = load(after=after, limit=limit + 1)
+        return entries[:limit], len(entries) > limit, False
+
+    def stats(self):
+        """Return the feed counters as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._keys),
+                'hit_ratio': lookups and float(self.hits) / lookups or 0.0,
+            }
+
+    def _reset(self):
+        # The head is kept oldest first so bisect can seek in it
+        self._keys = []
+        self._records = []
+        self._keys_by_id = {}
+        self._complete = False
+        self._loaded_at = None
+        self._stale = set()
+        # Loads started before are not applied
+        self._generation += 1
+
+    def _outdated(self):
+        if self._loaded_at is not None and \
+                self._loaded_at + self.ttl <= time.time():
+            self._reset()
+        return self._loaded_at is None or bool(self._stale)
+
+    def _sync(self, load):
+        """Bring the head up to date, return True if it was loaded again."""
+        with self._lock:
+            if not self._outdated():
+                return False
+            wait = self._loaded_at is None
+        if not self._load_lock.acquire(wait):
+            return False
+        try:
+            with self._lock:
+                if not self._outdated():
+                    return False
+                generation = self._generation
+                reload = self._loaded_at is None
+                # Marks made while the head loads are kept for next time
+                stale = set() if reload else self._stale
+                self._stale = set()
+                self._loading = True
+            loaded_at = time.time()
+            entries = None
+            try:
+                if reload:
+                    entries = load(limit=self.size + 1)
+                else:
+                    entries = load(ids=list(stale))
+            finally:
+                with self._lock:
+                    self._loading = False
+                    if self._generation == generation:
+                        self._store(reload, stale, entries, loaded_at)
+            return reload
+        finally:
+            self._load_lock.release()
+
+    def _store(self, reload, stale, entries, loaded_at):
+        if entries is None:
+            # The load failed, its bucketlists are still stale
+            self._stale.update(stale)
+        elif reload:
+            self._complete = len(entries) <= self.size
+            for key, record in reversed(entries[:self.size]):
+                self._insert(key, record)
+            self._loaded_at = loaded_at
+        else:
+            self._apply(stale, entries)
+
+    def _apply(self, ids, entries):
+        for bucketlist_id in ids:
+            self._remove(bucketlist_id)
+        for key, record in entries:
+            # Past the oldest key held are bucketlists the head doesn't hold
+            if self._complete or (self._keys and key > self._keys[0]):
+                self._insert(key, record)
+        while len(self._keys) > self.size:
+            self._remove(self._keys[0][1])
+            self._complete = False
+        if not self._keys and not self._complete:
+            self._loaded_at = None
+
+    def _insert(self, key, record):
+        position = bisect.bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._records.insert(position, record)
+        self._keys_by_id[key[1]] = key
+
+    def _remove(self, bucketlist_id):
+        key = self._keys_by_id.pop(bucketlist_id, None)
+        if key is None:
+            return
+        position = bisect.bisect_left(self._keys, key)
+        del self._keys[position]
+        del self._records[position]
+
+    def _mark_stale(self, ids):
+        with self._lock:
+            if self._loaded_at is not None or self._loading:
+                self._stale.update(ids)
+
+    def _after_commit(self, session):
+        if session.info.pop('public_feed_reset', False):
+            self.invalidate()
+        self._mark_stale(session.info.pop('public_feed_ids', ()))
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('public_feed_reset', None)
+        session.info.pop('public_feed_ids', None)
+
+
+public_feed = PublicFeed()
@@ -1,6 +1,7 @@
 """Script define the various app configuration."""
 
 import os
+from multiprocessing import cpu_count
 
 
 class Config(object):
@@ -11,6 +12,47 @@ class Config(object):
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
     DEFAULT_PER_PAGE = 20
     MAX_PER_PAGE = 100
+    MAX_ITEMS_PER_REQUEST = 1000
+    BATCH_MAX_REQUESTS = 50
+    SYNC_BATCH_SIZE = 500
+    SYNC_OVERLAP_SECONDS = 5
+    EXPORT_BATCH_SIZE = 1000
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_MAX_ERRORS = 100
+    ACCOUNT_DELETE_ASYNC_ITEMS = 10000
+    ACCOUNT_DELETE_BATCH_SIZE = 100
+    ACCOUNT_DELETE_WORKERS = 1
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_TTL = 300
+    RESPONSE_CACHE_BACKEND = None
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 60
+    PUBLIC_FEED_CACHE_SIZE = 1000
+    PUBLIC_FEED_CACHE_TTL = 60
+    PASSWORD_HASH_SCHEME = 'sha512_crypt'
+    PASSWORD_HASH_SCHEMES = ['sha512_crypt', 'sha256_crypt']
+    PASSWORD_HASH_ROUNDS = 535000
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE_DEPTH = 16
+    SQL_SERVER_TIMING = False
+    SLOW_QUERY_THRESHOLD_MS = 200
+    # Run on every SQLite connection. With WAL readers don't wait for the
+    # writer and NORMAL syncs the log at checkpoints instead of every commit
+    SQLITE_PRAGMAS = [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', 256 * 1024 * 1024),
+        ('cache_size', -64 * 1024),
+        ('busy_timeout', 5000),
+        ('foreign_keys', 'ON'),
+    ]
+    SERVER_BIND = '127.0.0.1:5000'
+    SERVER_WORKERS = 2 * cpu_count() + 1
+    SERVER_THREADS = 4
+    SERVER_KEEPALIVE = 5
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    SERVER_MAX_REQUESTS = 0
 
 
 class ProdConfig(Config):
@@ -27,6 +69,7 @@ class DevConfig(Config):
     DB_NAME = 'bucketlist.sqlite'
     DB_PATH = os.path.join(Config.PROJECT_ROOT, DB_NAME)
     SQLALCHEMY_DATABASE_URI = 'sqlite:///{0}'.format(DB_PATH)
+    SQL_SERVER_TIMING = True
 
 
 class TestConfig(Config):
@@ -37,3 +80,7 @@ class TestConfig(Config):
     PORT = 5000
     HOST = '0.0.0.0'
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    PASSWORD_HASH_ROUNDS = 1000
+    PASSWORD_HASH_WORKERS = 0
+    ACCOUNT_DELETE_WORKERS = 0
+    SQL_SERVER_TIMING = True
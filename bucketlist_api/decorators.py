@@ -1,16 +1,42 @@
+import hashlib
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
 from functools import wraps
-from bucketlist_api.models import User, BucketList
+from sqlalchemy import and_, or_
+from werkzeug.http import quote_etag, http_date
+from werkzeug.wrappers import BaseResponse
+from flask_restful import unpack
+from bucketlist_api import api, db
+from bucketlist_api.cache import response_cache
+from bucketlist_api.models import User, BucketList, BucketListItem
 from flask import g, request, abort, current_app, url_for
 
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
 
 def get_bucketlist(f):
+    """Load the bucketlist of the url, and its item if the url has one.
+
+    Both come from a single outer joined query. g.item is None when the
+    url has no item or the bucketlist has no item with that id.
+    """
     @wraps(f)
     def func_wrapper(*args, **kwargs):
         bucketlist_id = kwargs.get('bucketlist_id')
-        bucketlist = BucketList.query.get(bucketlist_id)
+        item_id = kwargs.get('item_id')
+        query = BucketList.query.filter(BucketList.id == bucketlist_id)
+        if item_id is None:
+            bucketlist, item = query.first(), None
+        else:
+            bucketlist, item = query.outerjoin(BucketListItem, and_(
+                BucketListItem.bucketlist_id == BucketList.id,
+                BucketListItem.id == item_id)).add_entity(
+                BucketListItem).first() or (None, None)
         if bucketlist is None:
             abort(404)
         g.bucketlist = bucketlist
+        g.item = item
         return f(*args, **kwargs)
     return func_wrapper
 
@@ -18,42 +44,305 @@ def get_bucketlist(f):
 def own_by_user(f):
     @wraps(f)
     def func_wrapper(*args, **kwargs):
-        if g.bucketlist.user.id != g.user.id:
+        if g.bucketlist.user_id != g.user.id:
             abort(403, "NotPermitted: You can't access bucketlist belonging to"
                   " other users")
         return f(*args, **kwargs)
     return func_wrapper
 
 
-def paginate(f):
+def keep_loaded(f):
+    """Keep the records of a write view loaded when it commits.
+
+    The session expires every record it holds on commit, serializing the
+    records just saved would read them back with a SELECT each. Their
+    timestamps are set in Python so the loaded values are already those
+    of the database.
+    """
     @wraps(f)
     def func_wrapper(*args, **kwargs):
-        query = f(*args, **kwargs)
-        page = request.args.get('page', 1, type=int)
-        limit = min(request.args.get('limit',
-                                     current_app.config['DEFAULT_PER_PAGE'],
-                                     type=int),
-                    current_app.config['MAX_PER_PAGE'])
-        q = request.args.get('q')
-        page_bucketlist = query.paginate(page=page, per_page=limit)
-        bucketlists = page_bucketlist.items
-        if not bucketlists:
-            abort(404)
-        pagination = {
-            'page': page_bucketlist.page,
-            'number_of_pages': page_bucketlist.pages,
-            'total': page_bucketlist.total,
-        }
-        if page_bucketlist.has_next:
-            pagination['next'] = url_for(endpoint=request.endpoint,
-                                         limit=limit,
-                                         page=page_bucketlist.next_num,
-                                         _method='GET', q=q, _external=True,
-                                         **kwargs)
-        if page_bucketlist.has_prev:
-            pagination['previous'] = url_for(endpoint=request.endpoint,
-                                             limit=limit, page=page_bucketlist
-                                             .prev_num, q=q, _method='GET',
-                                             _external=True, **kwargs)
-        return {'bucketlists': bucketlists, 'pagination': pagination}, 200
+        session = db.session()
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            return f(*args, **kwargs)
+        finally:
+            session.expire_on_commit = expire_on_commit
+    return func_wrapper
+
+
+def make_etag(version):
+    """Hash a version and the query arguments into an ETag value."""
+    key = json.dumps([version, sorted(request.args.items(multi=True))],
+                     default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag, last_modified):
+    """Tell whether the client's copy matches the ETag or date given.
+
+    If-Modified-Since is only looked at without If-None-Match.
+    """
+    if request.if_none_match:
+        return etag is not None and request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return None not in (since, last_modified) and \
+        last_modified <= since.replace(tzinfo=None)
+
+
+def conditional(version):
+    """Answer conditional GETs with 304 before the resource loads rows.
+
+    Arguments:
+        version: [function] called with the view arguments, returns None
+                 when there is nothing to validate or a (last_modified,
+                 version) pair. last_modified may be None, otherwise it
+                 is sent and checked against If-Modified-Since.
+    """
+    def decorator(f):
+        @wraps(f)
+        def func_wrapper(*args, **kwargs):
+            validators = version(**kwargs)
+            if validators is None:
+                return f(*args, **kwargs)
+            last_modified, current = validators
+            etag = make_etag(current)
+            headers = {'ETag': quote_etag(etag, weak=True)}
+            if last_modified is not None:
+                # HTTP dates count whole seconds, a date in the current one
+                # would hide writes made later in that second
+                last_modified = last_modified.replace(microsecond=0)
+                if last_modified < datetime.utcnow().replace(microsecond=0):
+                    headers['Last-Modified'] = http_date(last_modified)
+                else:
+                    last_modified = None
+            if is_fresh(etag, last_modified):
+                return current_app.response_class(status=304,
+                                                  headers=headers)
+            data, code, extra = unpack(f(*args, **kwargs))
+            headers.update(extra or {})
+            return data, code, headers
+        return func_wrapper
+    return decorator
+
+
+def cached(f):
+    """Serve a resource from response_cache while the user's data is unchanged.
+
+    Only 200 responses are cached, the X-Cache header tells whether the
+    response came from the cache. The cache is skipped while the session
+    holds writes of the user it hasn't committed, as in an atomic batch.
+    """
+    @wraps(f)
+    def func_wrapper(*args, **kwargs):
+        if response_cache.is_pending(g.user.id, db.session):
+            return f(*args, **kwargs)
+        key = response_cache.key(g.user.id, request.path, request.args)
+        entry = response_cache.get(key)
+        if entry is None:
+            response = f(*args, **kwargs)
+            if not isinstance(response, BaseResponse):
+                data, code, headers = unpack(response)
+                response = api.make_response(data, code, headers=headers)
+            if response.status_code == 200:
+                response_cache.set(key, response.get_data(), 200,
+                                   list(response.headers))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        body, status, headers = entry
+        response = current_app.response_class(body, status, headers)
+        last_modified = response.last_modified
+        if last_modified is not None:
+            last_modified = last_modified.replace(tzinfo=None)
+        if is_fresh(response.get_etag()[0], last_modified):
+            response = current_app.response_class(status=304, headers=[
+                header for header in headers
+                if header[0] in ('ETag', 'Last-Modified')])
+        response.headers['X-Cache'] = 'HIT'
+        return response
     return func_wrapper
+
+
+def encode_cursor(row, direction):
+    """Encode the keyset position of row into an opaque cursor.
+
+    Arguments:
+        row: [Model] the last row seen, must have date_created and id
+        direction: [String] 'next' to seek after row, 'prev' before it
+    """
+    key = [row.date_created.strftime(CURSOR_DATE_FORMAT), row.id, direction]
+    token = urlsafe_b64encode(json.dumps(key).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor made by encode_cursor.
+
+    Return:
+        (date_created, id, direction) of the encoded position
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_created, id, direction = json.loads(
+            urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return (datetime.strptime(date_created, CURSOR_DATE_FORMAT),
+                int(id), direction)
+    except (ValueError, TypeError, UnicodeError):
+        abort(400, 'InvalidCursor: The cursor supplied is not valid')
+
+
+def cursor_paginate(query, cursor, limit, descending=False):
+    """Seek a page of query ordered by (date_created, id).
+
+    Unlike query.paginate no OFFSET or COUNT is issued, the page starts
+    right after (or before) the position encoded in cursor.
+
+    Arguments:
+        descending: [Boolean] order the rows newest first
+
+    Return:
+        (rows, has_next, has_prev)
+    """
+    model = query.column_descriptions[0]['type']
+    query = query.order_by(None)
+    order = [model.date_created, model.id]
+    backwards = False
+    if cursor:
+        date_created, id, direction = decode_cursor(cursor)
+        backwards = direction == 'prev'
+        if backwards != descending:
+            query = query.filter(or_(model.date_created < date_created,
+                                     and_(model.date_created == date_created,
+                                          model.id < id)))
+        else:
+            query = query.filter(or_(model.date_created > date_created,
+                                     and_(model.date_created == date_created,
+                                          model.id > id)))
+    if backwards != descending:
+        order = [column.desc() for column in order]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        return rows, True, has_more
+    return rows, has_more, bool(cursor)
+
+
+def sort_descending():
+    """Return True when the request asks for ?order=desc."""
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        abort(400, 'InvalidOrder: order must be asc or desc')
+    return order == 'desc'
+
+
+def item_preview():
+    """Parse the ?items= option of a bucketlist listing.
+
+    Return:
+        None to list every item, 0 for the item count only or the number
+        of items to preview along with the count
+    """
+    items = request.args.get('items')
+    if items is None:
+        return None
+    if items == 'count':
+        return 0
+    try:
+        preview = int(items)
+    except ValueError:
+        preview = -1
+    if preview < 0:
+        abort(400, 'InvalidItems: items must be count or a number')
+    return min(preview, current_app.config['MAX_PER_PAGE'])
+
+
+def load_bucketlist_items(bucketlists):
+    """Load the items of a page of bucketlists as asked by ?items=."""
+    preview = item_preview()
+    if preview is None:
+        return BucketList.load_items(bucketlists)
+    return BucketList.load_items(bucketlists, limit=preview)
+
+
+def paginated(key, prepare=None, allow_empty=False):
+    """Return a decorator paginating the query a resource method returns.
+
+    Pages are numbered with ?page= unless ?cursor= is given, then they are
+    seeked by keyset with cursor_paginate. Other query arguments are kept
+    in the next and previous urls.
+
+    Arguments:
+        key: [String] key of the rows in the response
+        prepare: [function] called with the rows of a page before output
+        allow_empty: [Boolean] answer an empty page instead of 404
+    """
+    def decorator(f):
+        @wraps(f)
+        def func_wrapper(*args, **kwargs):
+            query = f(*args, **kwargs)
+            limit = min(request.args.get(
+                'limit', current_app.config['DEFAULT_PER_PAGE'], type=int),
+                current_app.config['MAX_PER_PAGE'])
+            params = dict((name, value) for name, value in
+                          request.args.items() if name not in kwargs and
+                          name not in ('page', 'cursor', 'limit'))
+            params.update((name, value) for name, value in kwargs.items()
+                          if value is not None)
+            if 'cursor' in request.args:
+                rows, pagination = cursor_page(query, limit, params)
+            else:
+                rows, pagination = numbered_page(query, limit, params)
+            if not rows and not allow_empty:
+                abort(404)
+            if prepare is not None:
+                prepare(rows)
+            return {key: rows, 'pagination': pagination}, 200
+        return func_wrapper
+    return decorator
+
+
+def numbered_page(query, limit, params):
+    """Fetch the ?page= page of query, with its total and number of pages."""
+    page = query.paginate(page=request.args.get('page', 1, type=int),
+                          per_page=limit)
+    pagination = {
+        'page': page.page,
+        'number_of_pages': page.pages,
+        'total': page.total,
+    }
+    if page.has_next:
+        pagination['next'] = url_for(endpoint=request.endpoint, limit=limit,
+                                     page=page.next_num, _method='GET',
+                                     _external=True, **params)
+    if page.has_prev:
+        pagination['previous'] = url_for(endpoint=request.endpoint,
+                                         limit=limit, page=page.prev_num,
+                                         _method='GET', _external=True,
+                                         **params)
+    return page.items, pagination
+
+
+def cursor_page(query, limit, params):
+    """Seek the ?cursor= page of query, no total is counted."""
+    rows, has_next, has_prev = cursor_paginate(
+        query, request.args.get('cursor'), limit, sort_descending())
+    pagination = {}
+    if has_next and rows:
+        pagination['next'] = url_for(endpoint=request.endpoint, limit=limit,
+                                     cursor=encode_cursor(rows[-1], 'next'),
+                                     _method='GET', _external=True, **params)
+    if has_prev and rows:
+        pagination['previous'] = url_for(endpoint=request.endpoint,
+                                         limit=limit,
+                                         cursor=encode_cursor(rows[0],
+                                                              'prev'),
+                                         _method='GET', _external=True,
+                                         **params)
+    return rows, pagination
+
+
+paginate = paginated('bucketlists', load_bucketlist_items)
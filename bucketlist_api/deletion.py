@@ -0,0 +1,113 @@
+"""Script deletes user accounts, the largest ones in the background."""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from six.moves import range
+from bucketlist_api import db
+from bucketlist_api.models import BucketList, BucketListItem
+from bucketlist_api.search import search_index
+
+logger = logging.getLogger('bucketlist_api.deletion')
+
+
+class AccountDeletion(object):
+    """Deletes a user and everything it owns.
+
+    Deleting the user row is enough, the database cascades it to the
+    bucketlists, items and tombstones. For accounts with more than
+    ACCOUNT_DELETE_ASYNC_ITEMS items that single statement would hold the
+    write lock for as long as deleting all of them takes, instead the user
+    is deleted at once with its bucketlists detached from it and a worker
+    thread deletes the bucketlists ACCOUNT_DELETE_BATCH_SIZE at a time, one
+    transaction each. With ACCOUNT_DELETE_WORKERS at 0 the batches are
+    deleted before delete returns.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def delete(self, user):
+        """Delete the user, its bucketlists and their items.
+
+        Arguments:
+            user: [Model] the User to delete
+
+        Return:
+            [Boolean] True when the bucketlists are deleted in the background
+        """
+        config = current_app.config
+        item_count = db.session.query(db.func.count(BucketListItem.id)) \
+            .join(BucketList, BucketList.id == BucketListItem.bucketlist_id) \
+            .filter(BucketList.user_id == user.id).scalar()
+        if item_count <= config['ACCOUNT_DELETE_ASYNC_ITEMS']:
+            user.delete()
+            return False
+        ids = [id for id, in db.session.query(BucketList.id).filter(
+            BucketList.user_id == user.id).order_by(BucketList.id)]
+        # The index finds the records to remove through their owner
+        search_index.remove(user, db.session)
+        BucketList.query.filter(BucketList.user_id == user.id).update(
+            {'user_id': None}, synchronize_session=False)
+        user.delete()
+        batch_size = config['ACCOUNT_DELETE_BATCH_SIZE']
+        if config['ACCOUNT_DELETE_WORKERS'] <= 0:
+            self._delete_bucketlists(ids, batch_size)
+        else:
+            self._get_pool(config['ACCOUNT_DELETE_WORKERS']).submit(
+                self._run, current_app._get_current_object(), ids,
+                batch_size)
+        return True
+
+    def sweep(self, batch_size):
+        """Delete the bucketlists a deletion detached and never removed.
+
+        A worker dying before its batches are deleted leaves bucketlists
+        without a user, run by `manage.py sweep`.
+
+        Arguments:
+            batch_size: [int] bucketlists deleted per transaction
+
+        Return:
+            [int] number of bucketlists deleted
+        """
+        deleted = 0
+        while True:
+            ids = [id for id, in db.session.query(BucketList.id).filter(
+                BucketList.user_id.is_(None)).order_by(BucketList.id)
+                .limit(batch_size)]
+            if not ids:
+                return deleted
+            self._delete_bucketlists(ids, batch_size)
+            deleted += len(ids)
+
+    def _run(self, app, ids, batch_size):
+        with app.app_context():
+            try:
+                self._delete_bucketlists(ids, batch_size)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Deleting %d detached bucketlists failed',
+                                 len(ids))
+
+    def _delete_bucketlists(self, ids, batch_size):
+        for start in range(0, len(ids), batch_size):
+            BucketList.query.filter(
+                BucketList.id.in_(ids[start:start + batch_size])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+    def _get_pool(self, workers):
+        with self._lock:
+            # A pool inherited through fork belongs to the parent process
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=workers)
+                self._pid = os.getpid()
+            return self._pool
+
+
+account_deletion = AccountDeletion()
@@ -0,0 +1,125 @@
+"""Script handles password hashing outside the request thread."""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import abort
+from passlib.context import CryptContext
+
+# CryptContext instances built in the current process, keyed by policy
+_contexts = {}
+
+
+def _get_context(policy):
+    """Return the CryptContext for a hashing policy.
+
+    Arguments:
+        policy: [tuple] (scheme, rounds, schemes) describing the hash
+
+    Return:
+        CryptContext built once per process for the policy
+    """
+    context = _contexts.get(policy)
+    if context is None:
+        scheme, rounds, schemes = policy
+        settings = {
+            'schemes': list(schemes),
+            'default': scheme,
+            'deprecated': [s for s in schemes if s != scheme],
+        }
+        if rounds:
+            settings[scheme + '__default_rounds'] = rounds
+            settings[scheme + '__min_rounds'] = rounds
+        context = CryptContext(**settings)
+        _contexts[policy] = context
+    return context
+
+
+def _encrypt(policy, password):
+    return _get_context(policy).encrypt(password)
+
+
+def _verify_and_update(policy, password, password_hash):
+    return _get_context(policy).verify_and_update(password, password_hash)
+
+
+class PasswordHasher(object):
+    """Runs password hashing on a bounded pool of worker processes.
+
+    Hashing is CPU bound and takes hundreds of milliseconds, running it in
+    a separate process keeps the request thread free to serve others while
+    it waits. At most `workers` hashes run at once and at most
+    `queue_depth` more wait for a worker, further calls abort with 503.
+
+    Attributes:
+        policy: [tuple] (scheme, rounds, schemes) used for new hashes
+        workers: [int] number of worker processes, 0 hashes inline
+        queue_depth: [int] number of calls allowed to wait for a worker
+    """
+
+    def __init__(self):
+        self.policy = ('sha512_crypt', None, ('sha512_crypt', 'sha256_crypt'))
+        self.workers = 0
+        self.queue_depth = 0
+        self._slots = threading.BoundedSemaphore(1)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the hashing policy and pool from the app config."""
+        schemes = tuple(app.config.get('PASSWORD_HASH_SCHEMES',
+                                       self.policy[2]))
+        policy = (app.config.get('PASSWORD_HASH_SCHEME', schemes[0]),
+                  app.config.get('PASSWORD_HASH_ROUNDS'), schemes)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        queue_depth = app.config.get('PASSWORD_HASH_QUEUE_DEPTH', 0)
+        with self._lock:
+            if workers != self.workers:
+                self._shutdown()
+            self.policy = policy
+            self.workers = workers
+            self.queue_depth = queue_depth
+            self._slots = threading.BoundedSemaphore(workers + queue_depth
+                                                     or 1)
+
+    def encrypt(self, password):
+        """Hash a password with the configured policy."""
+        return self._run(_encrypt, password)
+
+    def verify_and_update(self, password, password_hash):
+        """Verify a password against its hash.
+
+        Return:
+            (valid, new_hash) new_hash is None unless the stored hash was
+            made with outdated parameters and should be replaced
+        """
+        return self._run(_verify_and_update, password, password_hash)
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(self.policy, *args)
+        slots = self._slots
+        if not slots.acquire(False):
+            abort(503, 'ServiceUnavailable: Too many pending password '
+                       'checks, retry later')
+        try:
+            return self._get_pool().submit(func, self.policy, *args).result()
+        finally:
+            slots.release()
+
+    def _get_pool(self):
+        with self._lock:
+            # A pool inherited through fork belongs to the parent process
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False)
+        self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,113 @@
+"""Script records the database cost of every request."""
+
+import json
+import logging
+import time
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_logger = logging.getLogger('bucketlist_api.slow_query')
+
+
+class QueryStats(object):
+    """SQL statements executed while serving a single request.
+
+    Attributes:
+        count: [int] number of statements executed
+        duration: [float] total seconds spent executing them
+        slowest: [String] the statement that took longest
+        slowest_duration: [float] seconds the slowest statement took
+    """
+    __slots__ = ('count', 'duration', 'slowest', 'slowest_duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = None
+        self.slowest_duration = 0.0
+
+    def record(self, statement, duration):
+        """Account for one executed statement."""
+        self.count += 1
+        self.duration += duration
+        if self.slowest is None or duration > self.slowest_duration:
+            self.slowest = statement
+            self.slowest_duration = duration
+
+    def server_timing(self):
+        """Return the stats as a Server-Timing header value."""
+        return 'db;dur=%.2f;desc="%d queries", db-slowest;dur=%.2f' % (
+            self.duration * 1000, self.count, self.slowest_duration * 1000)
+
+
+class SQLInstrumentation(object):
+    """Times every statement and attributes it to the current request.
+
+    Statements run outside a request are timed but not recorded. When
+    SQL_SERVER_TIMING is set the totals are sent back in a Server-Timing
+    header, statements slower than SLOW_QUERY_THRESHOLD_MS milliseconds
+    are written to the bucketlist_api.slow_query log as JSON.
+    """
+
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        """Start timing statements and collect them for app requests."""
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before)
+            event.listen(Engine, 'after_cursor_execute', self._after)
+            event.listen(Engine, 'handle_error', self._failed)
+            self._listening = True
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    @staticmethod
+    def current_stats():
+        """Return the QueryStats of the request being served or None."""
+        if not has_request_context():
+            return None
+        return getattr(g, 'query_stats', None)
+
+    def start_request(self):
+        g.query_stats = QueryStats()
+
+    def finish_request(self, response):
+        stats = self.current_stats()
+        if stats is not None and current_app.config.get('SQL_SERVER_TIMING'):
+            response.headers.add('Server-Timing', stats.server_timing())
+        return response
+
+    def _before(self, conn, cursor, statement, parameters, context,
+                executemany):
+        conn.info.setdefault('query_start', []).append(time.time())
+
+    def _failed(self, context):
+        # A failed statement never reaches _after, drop its start time
+        starts = context.connection is not None and \
+            context.execution_context is not None and \
+            context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+    def _after(self, conn, cursor, statement, parameters, context,
+               executemany):
+        duration = time.time() - conn.info['query_start'].pop()
+        stats = self.current_stats()
+        if stats is None:
+            return
+        stats.record(statement, duration)
+        threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+        if threshold is not None and duration * 1000 >= threshold:
+            slow_query_logger.warning(json.dumps({
+                'duration_ms': round(duration * 1000, 3),
+                'statement': statement,
+                'executemany': executemany,
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+            }))
+
+
+sql_instrumentation = SQLInstrumentation()
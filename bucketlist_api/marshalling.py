@@ -0,0 +1,214 @@
+"""Script compiles serializer field dictionaries into marshal functions.
+
+flask_restful.marshal walks the field objects of a serializer for every
+object it outputs. The functions built here do that walk once, when the
+serializer is compiled, and produce the same output as marshal.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import six
+from flask_restful import fields, unpack
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug',
+               'Sep', 'Oct', 'Nov', 'Dec']
+
+# Whether instances of a type are looked up by key before attribute
+_indexable_types = {}
+
+
+def _is_indexable(obj):
+    kind = type(obj)
+    indexable = _indexable_types.get(kind)
+    if indexable is None:
+        indexable = fields.is_indexable_but_not_string(obj)
+        _indexable_types[kind] = indexable
+    return indexable
+
+
+def _is_simple_key(key):
+    return isinstance(key, six.string_types) and '.' not in key
+
+
+def _get_key(obj, key):
+    """Pull key off an indexable object, falling back to the attribute."""
+    try:
+        return obj[key]
+    except (IndexError, TypeError, KeyError):
+        return getattr(obj, key, None)
+
+
+def _make_getter(key):
+    """Return a function pulling key off an object like fields.get_value."""
+    if not _is_simple_key(key):
+        return lambda obj: fields.get_value(key, obj)
+
+    def getter(obj):
+        if _is_indexable(obj):
+            return _get_key(obj, key)
+        return getattr(obj, key, None)
+    return getter
+
+
+def rfc822(dt):
+    """Format a datetime the way fields.DateTime does, without timegm."""
+    if dt.tzinfo is None:
+        return '%s, %02d %s %04d %02d:%02d:%02d -0000' % (
+            DAY_NAMES[dt.weekday()], dt.day, MONTH_NAMES[dt.month - 1],
+            dt.year, dt.hour, dt.minute, dt.second)
+    t = dt.utctimetuple()
+    return '%s, %02d %s %04d %02d:%02d:%02d -0000' % (
+        DAY_NAMES[t.tm_wday], t.tm_mday, MONTH_NAMES[t.tm_mon - 1],
+        t.tm_year, t.tm_hour, t.tm_min, t.tm_sec)
+
+
+def _scalar_format(field):
+    """Return the format function of a scalar field or None."""
+    kind = type(field)
+    if kind is fields.Integer:
+        return int
+    if kind is fields.String:
+        return six.text_type
+    if kind is fields.Boolean:
+        return bool
+    if kind is fields.Raw:
+        return lambda value: value
+    if kind is fields.DateTime and field.dt_format == 'rfc822':
+        return rfc822
+    if kind is fields.DateTime and field.dt_format == 'iso8601':
+        return lambda value: value.isoformat()
+    return None
+
+
+def _compile_converter(field):
+    """Compile a field into a function of the value pulled for it.
+
+    Return:
+        function of the value, or None when the field needs the whole object
+    """
+    format = _scalar_format(field)
+    default = field.default
+    if format is not None:
+        def convert(value):
+            if value is None:
+                return default
+            try:
+                return format(value)
+            except (ValueError, AttributeError) as error:
+                raise fields.MarshallingException(error)
+        return convert
+    if type(field) is fields.Nested:
+        return _compile_nested(field)
+    if type(field) is fields.List and type(field.container) is \
+            fields.Nested and field.container.attribute is None:
+        return _compile_list(field)
+    return None
+
+
+def _compile_nested(field):
+    nested = compile_fields(field.nested)
+    allow_null = field.allow_null
+    default = field.default
+
+    def convert(value):
+        if value is None:
+            if allow_null:
+                return None
+            elif default is not None:
+                return default
+        return nested(value)
+    return convert
+
+
+def _compile_list(field):
+    element = _compile_nested(field.container)
+    nested = compile_fields(field.container.nested)
+    default = field.default
+
+    def convert(value):
+        if fields.is_indexable_but_not_string(value) and \
+                not isinstance(value, dict):
+            return [element(item) for item in value]
+        if value is None:
+            return default
+        return [nested(value)]
+    return convert
+
+
+def _compile_field(key, field):
+    """Compile one entry of a serializer into a function of the object."""
+    if isinstance(field, dict):
+        return compile_fields(field)
+    convert = _compile_converter(field)
+    if convert is None:
+        return lambda obj: field.output(key, obj)
+    get = _make_getter(key if field.attribute is None else field.attribute)
+    return lambda obj: convert(get(obj))
+
+
+def compile_fields(serializer, envelope=None):
+    """Compile a serializer into a function equivalent to marshal.
+
+    Arguments:
+        serializer: [dict] field dictionary as used with flask_restful
+        envelope: [String] optional key to envelop the output in
+
+    Return:
+        function taking the data to marshal, an object or a list of them
+    """
+    serializer = [(key, field() if isinstance(field, type) else field)
+                  for key, field in serializer.items()]
+    keys = [key for key, field in serializer]
+    converters = [not isinstance(field, dict) and _compile_converter(field)
+                  for key, field in serializer]
+    attrs = [not isinstance(field, dict) and (field.attribute or key)
+             for key, field in serializer]
+    if all(converters) and all(_is_simple_key(attr) for attr in attrs):
+        # Every field is a plain lookup, fetch the values in one pass and
+        # decide between key and attribute lookup once per object
+        pairs = list(zip(attrs, converters))
+
+        def marshal_one(obj):
+            if _is_indexable(obj):
+                return OrderedDict(zip(keys, [convert(_get_key(obj, attr))
+                                              for attr, convert in pairs]))
+            return OrderedDict(zip(keys, [convert(getattr(obj, attr, None))
+                                          for attr, convert in pairs]))
+    else:
+        compiled = [(key, _compile_field(key, field))
+                    for key, field in serializer]
+
+        def marshal_one(obj):
+            return OrderedDict([(key, output(obj))
+                                for key, output in compiled])
+
+    def marshal(data):
+        if isinstance(data, (list, tuple)):
+            result = [marshal_one(obj) for obj in data]
+        else:
+            result = marshal_one(data)
+        if envelope:
+            return OrderedDict([(envelope, result)])
+        return result
+    return marshal
+
+
+class marshal_with(object):
+    """Drop-in replacement for flask_restful.marshal_with.
+
+    The serializer is compiled once, when the decorator is applied.
+    """
+
+    def __init__(self, serializer, envelope=None):
+        self.marshal = compile_fields(serializer, envelope)
+
+    def __call__(self, f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            resp = f(*args, **kwargs)
+            if isinstance(resp, tuple):
+                data, code, headers = unpack(resp)
+                return self.marshal(data), code, headers
+            return self.marshal(resp)
+        return wrapper
@@ -2,17 +2,38 @@
 
 import os
 from flask import Flask, request, jsonify, g, url_for
-from sqlalchemy import desc
+from sqlalchemy import desc, event, and_, or_, select, bindparam
+from sqlalchemy.orm import Session
 from datetime import datetime
-from passlib.apps import custom_app_context as pwd_context
 from bucketlist_api import create_app, db
+from bucketlist_api.cache import token_cache, response_cache, public_feed
+from bucketlist_api.hashing import password_hasher
 from bucketlist_api.config import DevConfig
+from bucketlist_api.search import search_index
 from itsdangerous import (TimedJSONWebSignatureSerializer
                           as Serializer, BadSignature, SignatureExpired)
 
 # initialization
 app = create_app(DevConfig)
 
+# Whether each database dialect supports window functions
+_window_functions = {}
+
+
+def window_functions(bind):
+    """Return True when the database of an engine or connection supports
+    window functions, SQLite only has them from 3.25.
+    """
+    name = bind.dialect.name
+    if name not in _window_functions:
+        supported = True
+        if name == 'sqlite':
+            version = bind.execute('SELECT sqlite_version()').scalar()
+            supported = tuple(int(part) for part in
+                              version.split('.')[:2]) >= (3, 25)
+        _window_functions[name] = supported
+    return _window_functions[name]
+
 
 class BaseModel(db.Model):
     """The base model for implementing features common to all the models.
@@ -26,7 +47,7 @@ class BaseModel(db.Model):
     """
     __abstract__ = True
     id = db.Column(db.Integer, primary_key=True)
-    date_created = db.Column(db.DateTime, default=db.func.now())
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
 
     def update(self, commit=True, **kwargs):
         """Update specific fields of a record."""
@@ -37,15 +58,71 @@ class BaseModel(db.Model):
                 setattr(self, attr, value)
         return commit and self.save() or self
 
+    @property
+    def owner_id(self):
+        """Id of the user whose responses change with the record."""
+        return None
+
+    @property
+    def feed_entry(self):
+        """(bucketlist id, is public) of the public feed entry changing with
+        the record.
+        """
+        return None, False
+
     def save(self, commit=True):
-        """Save the record."""
+        """Save the record and keep the search index in sync."""
         db.session.add(self)
+        db.session.flush()
+        search_index.add(self, db.session)
+        response_cache.invalidate_user(self.owner_id, db.session)
+        public_feed.refresh(*self.feed_entry, session=db.session)
         if commit:
             db.session.commit()
         return self
 
+    @classmethod
+    def save_all(cls, instances, commit=True):
+        """Save many records of the model in a single transaction.
+
+        Arguments:
+            instances: [list] new or changed records of the model
+
+        Return:
+            [list] the saved records
+        """
+        db.session.add_all(instances)
+        db.session.flush()
+        search_index.add_all(instances, db.session)
+        for owner_id in set(instance.owner_id for instance in instances):
+            response_cache.invalidate_user(owner_id, db.session)
+        for bucketlist_id, is_public in set(instance.feed_entry
+                                            for instance in instances):
+            public_feed.refresh(bucketlist_id, is_public, db.session)
+        if commit:
+            db.session.commit()
+        return instances
+
+    def tombstone(self):
+        """Return the Tombstone recording the deletion of the record or None.
+        """
+        return None
+
+    def _make_tombstone(self, kind, bucketlist_id=None):
+        owner_id = self.owner_id
+        if owner_id is None:
+            return None
+        return Tombstone(user_id=owner_id, kind=kind, record_id=self.id,
+                         bucketlist_id=bucketlist_id)
+
     def delete(self, commit=True):
-        """Remove the record from the database."""
+        """Remove the record from the database and the search index."""
+        search_index.remove(self, db.session)
+        response_cache.invalidate_user(self.owner_id, db.session)
+        public_feed.refresh(*self.feed_entry, session=db.session)
+        tombstone = self.tombstone()
+        if tombstone is not None:
+            db.session.add(tombstone)
         db.session.delete(self)
         return commit and db.session.commit()
 
@@ -63,11 +140,13 @@ class BucketListModel(BaseModel):
     __abstract__ = True
 
     name = db.Column(db.String(50), nullable=False)
-    date_modified = db.Column(db.DateTime, default=db.func.now())
+    date_modified = db.Column(db.DateTime, default=datetime.utcnow,
+                              index=True)
 
     def save(self, commit=True):
-        self.date_modified = db.func.now()
-        super(BucketListModel, self).save()
+        # Set in Python, CURRENT_TIMESTAMP only has a resolution of seconds
+        self.date_modified = datetime.utcnow()
+        return super(BucketListModel, self).save(commit)
 
 
 class User(BaseModel):
@@ -84,25 +163,35 @@ class User(BaseModel):
 
     """
     __tablename__ = 'users'
-    username = db.Column(db.String(50), nullable=False)
-    password_hash = db.Column(db.String(70))
+    username = db.Column(db.String(50), nullable=False, unique=True,
+                         index=True)
+    password_hash = db.Column(db.String(128))
+    # The database deletes the bucketlists, the ORM doesn't load them
     bucketlists = db.relationship('BucketList', backref='user',
-                                  cascade="all, delete", lazy='dynamic')
+                                  cascade="all, delete", lazy='dynamic',
+                                  passive_deletes=True)
 
     def __init__(self, username, password, **kwargs):
         super(User, self).__init__(username=username, **kwargs)
         self.set_password(password)
 
+    @property
+    def owner_id(self):
+        return self.id
+
     def set_password(self, password):
         """Encrypt the User password.
 
         Arguments:
             password: [String] string Representing the User password
         """
-        self.password_hash = pwd_context.encrypt(password)
+        self.password_hash = password_hasher.encrypt(password)
+        if self.id is not None:
+            token_cache.invalidate_user(self.id)
 
     def verify_password(self, password):
         """Verify input password with the Hashed password.
+        A hash made with outdated parameters is replaced on success
 
         Arguments:
             password: [String] string Representing the User password
@@ -110,7 +199,13 @@ class User(BaseModel):
         Return:
             Boolean. Representing the status of the password check
         """
-        return pwd_context.verify(password, self.password_hash)
+        valid, new_hash = password_hasher.verify_and_update(
+            password, self.password_hash)
+        if valid and new_hash is not None:
+            self.password_hash = new_hash
+            if self.id is not None:
+                self.save()
+        return valid
 
     def generate_auth_token(self, expiration=20000):
         """Generate Authentication Token.
@@ -127,23 +222,31 @@ class User(BaseModel):
     @staticmethod
     def verify_token(token):
         """Verify the State of the Token.
-        Check if the token is valid and hasn't exipred
+        Check if the token is valid and hasn't exipred, tokens verified
+        before are answered from the token cache without a database query
 
         Arguments:
             token: [String]
 
         Return:
-            user [Model] User Model containing the user information
+            identity [UserIdentity] lightweight identity of the user
         """
+        identity = token_cache.get(token)
+        if identity is not None:
+            return identity
         s = Serializer(app.config['SECRET_KEY'])
         try:
-            data = s.loads(token)
+            data, header = s.loads(token, return_header=True)
         except SignatureExpired:
             return None
         except BadSignature:
             return None
         user = User.query.get(data['id'])
-        return user
+        if user is None:
+            return None
+        identity = UserIdentity(user.id, user.username)
+        token_cache.set(token, identity, header.get('exp'))
+        return identity
 
     @staticmethod
     def get_user(username, password):
@@ -175,6 +278,36 @@ class User(BaseModel):
             return True
         return False
 
+    def delete(self, commit=True):
+        """Remove the user and every token cached for it.
+        Its bucketlists, items and tombstones are deleted by the database
+        """
+        token_cache.invalidate_user(self.id)
+        public_feed.invalidate(db.session)
+        return super(User, self).delete(commit)
+
+
+class UserIdentity(object):
+    """Lightweight identity of an authenticated user.
+
+    Stands in for the User model on authenticated requests so a verified
+    token can be cached without holding on to a session bound instance.
+
+    Attributes:
+        id: [int] id of the user
+        username: [String] username of the user
+    """
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    @property
+    def bucketlists(self):
+        """Query of the bucketlists owned by the user."""
+        return BucketList.query.filter_by(user_id=self.id)
+
 
 class BucketList(BucketListModel):
     """Provides the database Model for the BucketList.
@@ -183,16 +316,178 @@ class BucketList(BucketListModel):
         is_public: [Boolean] Is availability to the user
         user_id: [int] the foreign key user id
         item: [Model Fk] The bucketlist-item relationship
+        item_count: [int] number of items in the bucketlist
+        done_count: [int] number of those items that are done
 
     Inherits:
         BucketListModel
 
     """
     __tablename__ = 'bucketlist'
+    __table_args__ = (db.Index('ix_bucketlist_user_id_date_created',
+                               'user_id', 'date_created', 'id'),)
     is_public = db.Column(db.Boolean, default=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id',
+                                                  ondelete='CASCADE'))
+    # Kept in step by every write to the items, see count_item_changes
+    item_count = db.Column(db.Integer, nullable=False, default=0,
+                           server_default='0')
+    done_count = db.Column(db.Integer, nullable=False, default=0,
+                           server_default='0')
     items = db.relationship('BucketListItem', backref='bucketlist',
-                            cascade="all, delete", lazy='dynamic')
+                            cascade="all, delete", lazy='dynamic',
+                            passive_deletes=True)
+
+    @property
+    def owner_id(self):
+        return self.user_id
+
+    @property
+    def feed_entry(self):
+        return self.id, self.is_public
+
+    def tombstone(self):
+        return self._make_tombstone('bucketlist')
+
+    @property
+    def item_list(self):
+        """Items of the bucketlist, as preloaded by load_items if it ran."""
+        loaded = getattr(self, '_loaded_items', None)
+        if loaded is None:
+            return self.items.all()
+        return loaded
+
+    @staticmethod
+    def load_items(bucketlists, limit=None):
+        """Load the items of many bucketlists with a single query.
+
+        Arguments:
+            bucketlists: [list] BucketList models to load the items for
+            limit: [int] load only the first limit items of each bucketlist,
+                   numbered with row_number() where the database has it
+        """
+        by_id = dict((bucketlist.id, []) for bucketlist in bucketlists)
+        if by_id and limit != 0:
+            items = BucketListItem.query.filter(
+                BucketListItem.bucketlist_id.in_(by_id))
+            if limit is not None and \
+                    window_functions(db.session.get_bind()):
+                position = db.func.row_number().over(
+                    partition_by=BucketListItem.bucketlist_id,
+                    order_by=BucketListItem.id).label('position')
+                numbered = db.session.query(BucketListItem.id, position) \
+                    .filter(BucketListItem.bucketlist_id.in_(by_id)) \
+                    .subquery()
+                items = items.join(numbered,
+                                   numbered.c.id == BucketListItem.id) \
+                    .filter(numbered.c.position <= limit)
+            elif limit is not None:
+                # Number each item by counting the ones before it instead
+                before = db.aliased(BucketListItem)
+                position = db.session.query(db.func.count(before.id)) \
+                    .filter(before.bucketlist_id ==
+                            BucketListItem.bucketlist_id,
+                            before.id <= BucketListItem.id) \
+                    .correlate(BucketListItem).as_scalar()
+                items = items.filter(position <= limit)
+            for item in items.order_by(BucketListItem.id):
+                by_id[item.bucketlist_id].append(item)
+        for bucketlist in bucketlists:
+            bucketlist._loaded_items = by_id[bucketlist.id]
+        return bucketlists
+
+    @staticmethod
+    def fingerprint(user_id, id=None):
+        """Summarize the bucketlists of a user and their items in one query.
+
+        Any write to the bucketlists or items changes the summary, so it can
+        validate a cached response without loading or serializing rows.
+
+        Arguments:
+            user_id: [int] id of the owner of the bucketlists
+            id: [int] restrict the summary to a single bucketlist
+
+        Return:
+            (last_modified, version) last_modified is None when there are
+            no bucketlists, version is a tuple of the user id, counts, ids
+            and dates
+        """
+        # Every write to an item moves its bucketlist, see BucketList.touch
+        query = db.session.query(
+            db.func.count(BucketList.id),
+            db.func.max(BucketList.id),
+            db.func.max(BucketList.date_modified)
+        ).filter(BucketList.user_id == user_id)
+        if id is not None:
+            query = query.filter(BucketList.id == id)
+        version = query.one()
+        return version[2], (user_id,) + tuple(version)
+
+    @staticmethod
+    def touch(ids, session=None):
+        """Mark bucketlists modified after a write to their items.
+
+        Arguments:
+            ids: [iterable] ids of the bucketlists, None is ignored
+            session: [Session] session to run in, db.session if None
+        """
+        ids = set(id for id in ids if id is not None)
+        if not ids:
+            return
+        (session or db.session).query(BucketList).filter(
+            BucketList.id.in_(ids)).update(
+            {'date_modified': datetime.utcnow()}, synchronize_session=False)
+
+    @staticmethod
+    def update_counts(deltas, session=None):
+        """Add to the item and done counts of bucketlists in one statement.
+
+        Arguments:
+            deltas: [dict] (items, done) to add, keyed by bucketlist id
+            session: [Session] session to run in, db.session if None
+        """
+        params = [{'bucketlist_id': id, 'items': items, 'done': done}
+                  for id, (items, done) in deltas.items()
+                  if id is not None and (items or done)]
+        if not params:
+            return
+        table = BucketList.__table__
+        statement = table.update().where(
+            table.c.id == bindparam('bucketlist_id')).values(
+            item_count=table.c.item_count + bindparam('items'),
+            done_count=table.c.done_count + bindparam('done'))
+        (session or db.session).execute(statement, params)
+
+    @staticmethod
+    def reconcile_counts(first_id=None, last_id=None):
+        """Count the items of the bucketlists again where counts are off.
+
+        Arguments:
+            first_id: [int] smallest id of the bucketlists to check
+            last_id: [int] largest id of the bucketlists to check
+
+        Return:
+            [int] number of bucketlists whose counts were wrong
+        """
+        items = select([db.func.count(BucketListItem.id)]).where(
+            BucketListItem.bucketlist_id == BucketList.id).as_scalar()
+        done = select([db.func.count(BucketListItem.id)]).where(and_(
+            BucketListItem.bucketlist_id == BucketList.id,
+            BucketListItem.done == db.true())).as_scalar()
+        query = BucketList.query.filter(or_(BucketList.item_count != items,
+                                            BucketList.done_count != done))
+        if first_id is not None:
+            query = query.filter(BucketList.id >= first_id)
+        if last_id is not None:
+            query = query.filter(BucketList.id <= last_id)
+        return query.update({'item_count': items, 'done_count': done},
+                            synchronize_session=False)
+
+
+# Only public bucketlists are indexed, in the order of the public feed
+db.Index('ix_bucketlist_public_date_created', BucketList.date_created,
+         BucketList.id, sqlite_where=BucketList.is_public == db.true(),
+         postgresql_where=BucketList.is_public == db.true())
 
 
 class BucketListItem(BucketListModel):
@@ -207,5 +502,150 @@ class BucketListItem(BucketListModel):
 
     """
     __tablename__ = 'items'
-    done = db.Column(db.Boolean, default=False)
-    bucketlist_id = db.Column(db.Integer, db.ForeignKey('bucketlist.id'))
+    __table_args__ = (db.Index('ix_items_bucketlist_id_date_created',
+                               'bucketlist_id', 'date_created', 'id'),)
+    # The done count needs the previous value of an expired item too
+    done = db.column_property(db.Column(db.Boolean, default=False),
+                              active_history=True)
+    bucketlist_id = db.Column(db.Integer, db.ForeignKey('bucketlist.id',
+                                                        ondelete='CASCADE'))
+
+    @property
+    def owner_id(self):
+        return self.bucketlist is not None and self.bucketlist.user_id or None
+
+    @property
+    def feed_entry(self):
+        if self.bucketlist is None:
+            return None, False
+        return self.bucketlist.id, self.bucketlist.is_public
+
+    def tombstone(self):
+        return self._make_tombstone('item', self.bucketlist_id)
+
+    def save(self, commit=True):
+        """Save the item, its bucketlist counts as modified."""
+        super(BucketListItem, self).save(commit=False)
+        BucketList.touch([self.bucketlist_id])
+        if commit:
+            db.session.commit()
+        return self
+
+    @classmethod
+    def save_all(cls, instances, commit=True):
+        """Save many items, their bucketlists count as modified."""
+        super(BucketListItem, cls).save_all(instances, commit=False)
+        BucketList.touch(item.bucketlist_id for item in instances)
+        if commit:
+            db.session.commit()
+        return instances
+
+    def delete(self, commit=True):
+        """Remove the item, its bucketlist counts as modified."""
+        BucketList.touch([self.bucketlist_id])
+        return super(BucketListItem, self).delete(commit)
+
+    @staticmethod
+    def mark_done(bucketlist_id, ids, done, commit=True):
+        """Set done on many items of a bucketlist with a single UPDATE.
+
+        Arguments:
+            bucketlist_id: [int] id of the bucketlist the items belong to
+            ids: [list] ids of the items to update
+            done: [Boolean] the new value of done
+
+        Return:
+            [list] the items updated, ids of other bucketlists are ignored
+        """
+        if not ids:
+            return []
+        query = BucketListItem.query.filter(
+            BucketListItem.bucketlist_id == bucketlist_id,
+            BucketListItem.id.in_(ids))
+        # Items already set are left alone so the count of changes is known,
+        # a NULL done was never counted as done
+        if done:
+            unset = or_(BucketListItem.done == db.false(),
+                        BucketListItem.done.is_(None))
+        else:
+            unset = BucketListItem.done == db.true()
+        changed = query.filter(unset).update(
+            {'done': done, 'date_modified': datetime.utcnow()},
+            synchronize_session=False)
+        BucketList.update_counts(
+            {bucketlist_id: (0, done and changed or -changed)})
+        if changed:
+            BucketList.touch([bucketlist_id])
+        bucketlist = BucketList.query.get(bucketlist_id)
+        if bucketlist is not None:
+            response_cache.invalidate_user(bucketlist.user_id, db.session)
+            public_feed.refresh(bucketlist.id, bucketlist.is_public,
+                                db.session)
+        if commit:
+            db.session.commit()
+        return query.order_by(BucketListItem.id).all()
+
+
+class Tombstone(BaseModel):
+    """Records a bucketlist or item deleted through BaseModel.delete.
+
+    Lets clients syncing changes learn about deletions, date_created is
+    the date of the deletion.
+
+    Inherits:
+        BaseModel
+
+    Attributes:
+        user_id: [int] id of the owner of the deleted record
+        kind: [String] 'bucketlist' or 'item'
+        record_id: [int] id the deleted record had
+        bucketlist_id: [int] bucketlist of a deleted item
+    """
+    __tablename__ = 'tombstones'
+    __table_args__ = (db.Index('ix_tombstones_user_id_date_created',
+                               'user_id', 'date_created', 'id'),)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id',
+                                                  ondelete='CASCADE'),
+                        nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    bucketlist_id = db.Column(db.Integer)
+
+
+def _add_count(deltas, bucketlist_id, items, done):
+    counts = deltas.get(bucketlist_id, (0, 0))
+    deltas[bucketlist_id] = (counts[0] + items, counts[1] + done)
+
+
+def count_item_changes(session, flush_context, instances):
+    """Record how the items updated or deleted change their bucketlists.
+
+    Runs before the flush, while the rows of deleted items still exist.
+    """
+    deltas = {}
+    for item in session.dirty:
+        if isinstance(item, BucketListItem):
+            history = db.inspect(item).attrs.done.history
+            if history.deleted:
+                change = int(bool(item.done)) - int(bool(history.deleted[0]))
+                _add_count(deltas, item.bucketlist_id, 0, change)
+    for item in session.deleted:
+        if isinstance(item, BucketListItem):
+            _add_count(deltas, item.bucketlist_id, -1, -int(bool(item.done)))
+    session.info['item_count_deltas'] = deltas
+
+
+def apply_item_counts(session, flush_context):
+    """Add the new items and update the counts, in the flush transaction.
+    """
+    deltas = session.info.pop('item_count_deltas', {})
+    for item in session.new:
+        if isinstance(item, BucketListItem):
+            _add_count(deltas, item.bucketlist_id, 1, int(bool(item.done)))
+    BucketList.update_counts(deltas, session)
+
+
+event.listen(db.metadata, 'after_create', search_index.create)
+event.listen(db.metadata, 'before_drop', search_index.drop)
+event.listen(Session, 'before_flush', count_item_changes)
+event.listen(Session, 'after_flush', apply_item_counts)
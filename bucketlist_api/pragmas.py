@@ -0,0 +1,40 @@
+"""Script sets the PRAGMAs of every SQLite connection."""
+
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class SQLitePragmas(object):
+    """Runs PRAGMA statements on every new SQLite connection.
+
+    The PRAGMAs come from the SQLITE_PRAGMAS list of the app config, in
+    order. SQLite does not enforce foreign keys unless asked to on each
+    connection, foreign_keys must stay ON for ON DELETE CASCADE to remove
+    the items of a bucketlist and the bucketlists of a user.
+
+    Attributes:
+        pragmas: [list] (name, value) of the PRAGMAs to set
+    """
+
+    def __init__(self):
+        self.pragmas = [('foreign_keys', 'ON')]
+        self._listening = False
+
+    def init_app(self, app):
+        """Set the PRAGMAs on the SQLite connections opened from now on."""
+        self.pragmas = list(app.config.get('SQLITE_PRAGMAS', self.pragmas))
+        if not self._listening:
+            event.listen(Engine, 'connect', self._connect)
+            self._listening = True
+
+    def _connect(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
+sqlite_pragmas = SQLitePragmas()
@@ -0,0 +1,30 @@
+"""Script defined to handle the account API call."""
+
+from flask_restful import Resource
+from flask import g
+from flask_api import status
+from bucketlist_api.models import User
+from bucketlist_api.authentication import auth
+from bucketlist_api.deletion import account_deletion
+
+
+class AccountAPI(Resource):
+    """The account of the authenticated user.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    def delete(self):
+        """Delete the user with all its bucketlists and items.
+
+        Large accounts are answered with 202 while their bucketlists are
+        still being deleted, the user can no longer log in either way.
+        """
+        user = User.query.get_or_404(g.user.id)
+        if account_deletion.delete(user):
+            message = ('AccountDeleted: The bucketlists of the account are '
+                       'being deleted')
+            return {'message': message}, status.HTTP_202_ACCEPTED
+        return '', status.HTTP_204_NO_CONTENT
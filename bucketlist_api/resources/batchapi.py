@@ -0,0 +1,175 @@
+"""Script defined to handle the batch API call."""
+
+import json
+import six
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.test import EnvironBuilder
+from flask_restful import Resource
+from flask import g, request, abort, current_app
+from bucketlist_api import db
+from bucketlist_api.authentication import auth, AUTHENTICATED_USER
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def parse_requests(payload):
+    """Validate the body of a batch.
+
+    Arguments:
+        payload: a list of sub-requests, or an object with the list in
+                 `requests` and an optional `atomic` flag
+
+    Return:
+        (sub-requests, atomic) the request aborts on an invalid body
+    """
+    atomic = False
+    if isinstance(payload, dict):
+        atomic = payload.get('atomic', False)
+        payload = payload.get('requests')
+    limit = current_app.config['BATCH_MAX_REQUESTS']
+    if not isinstance(payload, list) or not 0 < len(payload) <= limit:
+        abort(400, 'BatchNotProcessed: Send between 1 and %d requests'
+              % limit)
+    if atomic not in (0, 1):
+        abort(400, 'BatchNotProcessed: atomic must be true or false')
+    for sub_request in payload:
+        if not isinstance(sub_request, dict) or \
+                not isinstance(sub_request.get('url'), six.string_types) or \
+                not sub_request['url'].startswith('/'):
+            abort(400, 'BatchNotProcessed: Every request needs the url of '
+                       'a resource')
+        method = sub_request.get('method', 'GET')
+        if not isinstance(method, six.string_types) or \
+                method.upper() not in METHODS:
+            abort(400, 'BatchNotProcessed: method must be one of %s'
+                  % ', '.join(METHODS))
+        headers = sub_request.get('headers', {})
+        if not isinstance(headers, dict) or not all(
+                isinstance(value, six.string_types)
+                for value in headers.values()):
+            abort(400, 'BatchNotProcessed: headers must map names to '
+                       'strings')
+    return payload, bool(atomic)
+
+
+def sub_request_environ(sub_request, user):
+    """Build the WSGI environ of a sub-request, run as user.
+
+    A `body` that is a string is sent as is, other bodies as JSON.
+    """
+    body = sub_request.get('body')
+    data, content_type = None, None
+    if isinstance(body, six.string_types):
+        data = body
+    elif body is not None:
+        data, content_type = json.dumps(body), 'application/json'
+    builder = EnvironBuilder(path=sub_request['url'],
+                             base_url=request.url_root,
+                             method=sub_request.get('method', 'GET').upper(),
+                             headers=sub_request.get('headers'),
+                             data=data, content_type=content_type)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    environ[AUTHENTICATED_USER] = user
+    return environ
+
+
+def run_sub_request(environ):
+    """Dispatch a sub-request to its resource and render its response.
+
+    The sub-request shares the app context, and so the database session,
+    of the batch. Request hooks are not run again for it.
+
+    Return:
+        [dict] status, headers and body of the response, a JSON body is
+        decoded and other bodies are text
+    """
+    app = current_app._get_current_object()
+    batch_endpoint = request.endpoint
+    with app.request_context(environ):
+        try:
+            if request.endpoint == batch_endpoint:
+                abort(400, 'BatchNotProcessed: Batches can not be nested')
+            response = app.dispatch_request()
+        except Exception as error:
+            response = app.handle_user_exception(error)
+        response = app.make_response(response)
+        data = response.get_data(as_text=True)
+    body = data or None
+    if data and response.mimetype == 'application/json':
+        body = json.loads(data)
+    headers = dict((name, value) for name, value in response.headers
+                   if name != 'Content-Length')
+    return {'status': response.status_code, 'headers': headers,
+            'body': body}
+
+
+def refuse_commit(session):
+    """Keep a sub-request of an atomic batch from committing the batch.
+
+    Each sub-request runs in a subtransaction its first commit closes, a
+    resource committing again would commit the real transaction.
+    """
+    if session.info.get('atomic_batch'):
+        abort(409, 'BatchNotAtomic: The request commits more than once, '
+                   'send it outside an atomic batch')
+
+
+class BatchAPI(Resource):
+    """Runs many requests to the other resources in a single call.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    def post(self):
+        """Run the sub-requests in order and answer all their responses.
+
+        The user is authenticated once for the whole batch and every
+        sub-request uses the same database session, expired before each
+        one so it reads what the previous ones wrote. Each sub-request
+        commits on its own, unless the batch is atomic: then nothing is
+        committed before all of them succeeded, and everything is rolled
+        back after the first one that fails.
+        """
+        sub_requests, atomic = parse_requests(request.get_json(silent=True))
+        session = db.session()
+        responses = []
+        session.info['atomic_batch'] = atomic
+        try:
+            for sub_request in sub_requests:
+                environ = sub_request_environ(sub_request, g.user)
+                if atomic:
+                    session.flush()
+                    transaction = session.begin(subtransactions=True)
+                # Counters are bumped by UPDATE statements the loaded rows
+                # don't see, reload them for what the previous wrote
+                session.expire_all()
+                response = run_sub_request(environ)
+                responses.append(response)
+                if atomic and session.transaction is transaction and \
+                        transaction.is_active:
+                    transaction.commit()
+                if response['status'] >= 400:
+                    # Drop what the failed request left in the session
+                    db.session.rollback()
+                    if atomic:
+                        break
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            session.info.pop('atomic_batch', None)
+        if atomic and responses[-1]['status'] >= 400:
+            message = ('BatchRolledBack: Request %d failed, no change was '
+                       'saved' % len(responses))
+            return {'message': message, 'responses': responses}, 400
+        db.session.commit()
+        return {'responses': responses}, 200
+
+
+event.listen(Session, 'before_commit', refuse_commit)
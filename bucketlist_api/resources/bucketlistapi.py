@@ -1,13 +1,38 @@
 """Script defined to handle bucketlist API Calls."""
 
-from flask_restful import Resource, reqparse, marshal_with
+from flask_restful import Resource, reqparse
 from flask import g, jsonify, request, abort, url_for
 from flask_api import status
+from bucketlist_api import db
 from bucketlist_api.models import User, BucketList, BucketListItem
+from bucketlist_api.search import search_index
 from bucketlist_api.authentication import auth
-from bucketlist_api.decorators import paginate
+from bucketlist_api.decorators import paginate, item_preview, conditional, \
+                                      cached, keep_loaded
+from bucketlist_api.marshalling import marshal_with, compile_fields
 from bucketlist_api.serializers import bucketlist_serializer, \
-                                       bucketlist_collection_serializer
+                                       bucketlist_collection_serializer, \
+                                       bucketlist_count_collection_serializer, \
+                                       bucketlist_preview_collection_serializer
+
+marshal_collection = compile_fields(bucketlist_collection_serializer)
+marshal_count_collection = compile_fields(
+    bucketlist_count_collection_serializer)
+marshal_preview_collection = compile_fields(
+    bucketlist_preview_collection_serializer)
+
+
+def bucketlist_version(id=None):
+    """Validators of a bucketlist, or of the listing when id is None.
+
+    Deleting a bucketlist leaves no date behind, so the listing is only
+    validated by ETag. A single bucketlist also gets Last-Modified, its
+    date_modified moves with every write to its items.
+    """
+    last_modified, version = BucketList.fingerprint(g.user.id, id)
+    if last_modified is None:
+        return None
+    return id is not None and last_modified or None, version
 
 
 class BucketListAPI(Resource):
@@ -31,28 +56,46 @@ class BucketListAPI(Resource):
         super(BucketListAPI, self).__init__()
 
     @marshal_with(bucketlist_serializer)
+    @keep_loaded
     def post(self):
         data = self.parser.parse_args()
         if not data.get('name'):
             abort(400, 'BucketListNotCreated: Name not specified'
                        'for bucketlist')
         is_public = data.get('is_public', False)
-        bucketlist = BucketList(name=data['name'], is_public=is_public)
-        g.user.bucketlists.append(bucketlist)
+        bucketlist = BucketList(name=data['name'], is_public=is_public,
+                                user_id=g.user.id)
         bucketlist.save()
         return bucketlist, 201
 
-    @marshal_with(bucketlist_collection_serializer)
-    @paginate
+    @cached
+    @conditional(bucketlist_version)
     def get(self, id=None):
+        """List the bucketlists, ?items=count|N limits the items listed."""
+        preview = item_preview()
+        page, code = self.get_page(id=id)
+        if preview is None:
+            return marshal_collection(page), code
+        if preview == 0:
+            return marshal_count_collection(page), code
+        return marshal_preview_collection(page), code
+
+    @paginate
+    def get_page(self, id=None):
         if id:
             return g.user.bucketlists.filter_by(id=id)
         q = request.args.get('q')
         if q:
-            return g.user.bucketlists.filter(BucketList.name.contains(q))
+            # Cursors seek by date, which would drop the ranking
+            if 'cursor' in request.args:
+                abort(400, 'InvalidCursor: Search results are ranked, page '
+                           'them with page')
+            return search_index.search(g.user.bucketlists, BucketList, q,
+                                       g.user.id, db.session)
         return g.user.bucketlists
 
     @marshal_with(bucketlist_serializer)
+    @keep_loaded
     def put(self, id):
         data = self.parser.parse_args()
         bucketlist = g.user.bucketlists.filter_by(id=id).first_or_404()
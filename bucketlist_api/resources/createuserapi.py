@@ -1,8 +1,11 @@
 """Script defined to handle Register API Call."""
 
-from flask_restful import Resource, reqparse, marshal_with
+from flask_restful import Resource, reqparse
 from flask import abort
+from sqlalchemy.exc import IntegrityError
+from bucketlist_api import db
 from bucketlist_api.models import User
+from bucketlist_api.marshalling import marshal_with
 from bucketlist_api.serializers import user_serializer
 
 class CreateUserAPI(Resource):
@@ -31,10 +34,13 @@ class CreateUserAPI(Resource):
         data = self.parser.parse_args()
         username = data.get('username')
         password = data.get('password')
-        if User.user_exist(username):
+        new_user = User(username=username, password=password)
+        try:
+            new_user.save()
+        except IntegrityError:
+            # username is unique, a duplicate sign up fails the insert
+            db.session.rollback()
             abort(400, 'SignUpFailed: A User with the specified username '
                        'already exist')
-        new_user = User(username=username, password=password)
-        new_user.save()
         token = new_user.generate_auth_token()
         return {'token': token.decode('utf-8')}, 201
@@ -0,0 +1,89 @@
+"""Script defined to handle the data export API call."""
+
+import json
+from collections import OrderedDict
+from flask_restful import Resource
+from flask import g, current_app, stream_with_context
+from bucketlist_api import db
+from bucketlist_api.models import BucketList, BucketListItem
+from bucketlist_api.authentication import auth
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import export_bucketlist_serializer, \
+                                       export_item_serializer
+
+marshal_bucketlist = compile_fields(export_bucketlist_serializer)
+marshal_item = compile_fields(export_item_serializer)
+
+
+def ndjson_line(kind, record):
+    """Render a marshalled record as one NDJSON line tagged with its kind."""
+    line = OrderedDict([('type', kind)])
+    line.update(record)
+    return json.dumps(line) + '\n'
+
+
+def export_lines(user_id, batch_size):
+    """Yield every bucketlist of the user, each followed by its items.
+
+    Bucketlists and items are read by two cursors ordered by bucketlist
+    id and merged, rows are fetched batch_size at a time and are plain
+    tuples rather than models, so memory stays flat whatever the size of
+    the account.
+    """
+    bucketlists = db.session.query(
+        BucketList.id, BucketList.name, BucketList.is_public,
+        BucketList.date_modified, BucketList.date_created
+    ).filter(BucketList.user_id == user_id).order_by(
+        BucketList.id).yield_per(batch_size)
+    items = iter(db.session.query(
+        BucketListItem.id, BucketListItem.bucketlist_id, BucketListItem.name,
+        BucketListItem.done, BucketListItem.date_modified,
+        BucketListItem.date_created
+    ).join(BucketList, BucketList.id == BucketListItem.bucketlist_id).filter(
+        BucketList.user_id == user_id).order_by(
+        BucketListItem.bucketlist_id, BucketListItem.id).yield_per(
+        batch_size))
+    item = next(items, None)
+    for bucketlist in bucketlists:
+        yield ndjson_line('bucketlist',
+                          marshal_bucketlist(bucketlist._asdict()))
+        while item is not None and item.bucketlist_id == bucketlist.id:
+            yield ndjson_line('item', marshal_item(item._asdict()))
+            item = next(items, None)
+
+
+def chunks(lines, size):
+    """Join lines into chunks of size lines, one per write to the client."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+class ExportAPI(Resource):
+    """Exports all the bucketlists and items of the user.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    def get(self):
+        """Stream the user's data as newline-delimited JSON.
+
+        Every line is an object with a `type`, 'bucketlist' or 'item', a
+        bucketlist's items follow it. No length is known in advance so the
+        response is sent with chunked transfer encoding.
+        """
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        lines = export_lines(g.user.id, batch_size)
+        response = current_app.response_class(
+            stream_with_context(chunks(lines, batch_size)),
+            mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = \
+            'attachment; filename=bucketlists.ndjson'
+        return response
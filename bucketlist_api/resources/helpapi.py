@@ -1,6 +1,7 @@
 """Script defined to handle Help API calls."""
 
-from flask_restful import Resource, marshal_with
+from flask_restful import Resource
+from bucketlist_api.marshalling import marshal_with
 from bucketlist_api.serializers import help_message_serializer
 
 
@@ -22,16 +23,51 @@ class HelpAPI(Resource):
                 "url": "/auth/login",
                 "PublicAccess": True,
               },
+            "account": {
+                "methods": "DELETE",
+                "url": "/account",
+                "PublicAccess": False,
+             },
             "bucketlists": {
                 "methods": "GET, POST, PUT, DELETE",
                 "url": ["/bucketlists", "/bucketlists/<int:id>"],
                 "PublicAccess": False,
              },
             "items": {
-                "methods": "POST, PUT, DELETE",
+                "methods": "GET, POST, PUT, PATCH, DELETE",
                 "url": ["/bucketlists/<int:id>/items",
                         "/bucketlists/<int:id>/items/<int:item_id>"],
                 "PublicAccess": False,
              },
+            "sync": {
+                "methods": "GET",
+                "url": "/sync?since=<token>",
+                "PublicAccess": False,
+             },
+            "export": {
+                "methods": "GET",
+                "url": "/export",
+                "PublicAccess": False,
+             },
+            "import": {
+                "methods": "POST",
+                "url": "/import",
+                "PublicAccess": False,
+             },
+            "stats": {
+                "methods": "GET",
+                "url": "/stats",
+                "PublicAccess": False,
+             },
+            "public": {
+                "methods": "GET",
+                "url": "/public/bucketlists",
+                "PublicAccess": True,
+             },
+            "batch": {
+                "methods": "POST",
+                "url": "/batch",
+                "PublicAccess": False,
+             },
         }
         return help_message
@@ -0,0 +1,265 @@
+"""Script defined to handle the data import API call."""
+
+import json
+import pytz
+import six
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from six.moves import cPickle as pickle
+from flask_restful import Resource, inputs
+from flask import g, request, current_app
+from bucketlist_api import db
+from bucketlist_api.cache import response_cache, public_feed
+from bucketlist_api.models import BucketList, BucketListItem
+from bucketlist_api.authentication import auth
+from bucketlist_api.search import search_index
+
+# Bytes of validated rows held in memory before spooling to disk
+SPOOL_MEMORY_SIZE = 1024 * 1024
+
+
+class InvalidLine(ValueError):
+    """Raised for a line of the import that cannot be imported."""
+
+
+def parse_date(record, key, default):
+    """Return the ISO 8601 date of record[key] as naive UTC, or default."""
+    value = record.get(key)
+    if value is None:
+        return default
+    try:
+        date = inputs.datetime_from_iso8601(value)
+    except Exception:
+        raise InvalidLine('%s must be an ISO 8601 date' % key)
+    if date.tzinfo is not None:
+        date = date.astimezone(pytz.utc).replace(tzinfo=None)
+    return date
+
+
+def parse_flag(record, key):
+    """Return record[key] sent as a boolean, 0 or 1, False when absent."""
+    value = record.get(key, False)
+    if value in (0, 1):
+        return bool(value)
+    raise InvalidLine('%s must be true or false' % key)
+
+
+def parse_id(record, key):
+    """Return the exported id record[key], None when absent."""
+    value = record.get(key)
+    if value is not None and (isinstance(value, bool) or
+                              not isinstance(value, six.integer_types)):
+        raise InvalidLine('%s must be an integer' % key)
+    return value
+
+
+def parse_name(record):
+    name = record.get('name')
+    if not name or not isinstance(name, six.string_types):
+        raise InvalidLine('name not specified')
+    return name
+
+
+def read_lines(stream):
+    """Yield (line number, record) of each non blank NDJSON line.
+
+    Lines are read from the request stream one at a time, a line which is
+    not a JSON object is yielded as its InvalidLine error.
+    """
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            yield number, InvalidLine('not valid JSON')
+            continue
+        if not isinstance(record, dict):
+            record = InvalidLine('not a JSON object')
+        yield number, record
+
+
+class Importer(object):
+    """Imports the lines of an export into the account of a user.
+
+    The lines are read and validated first, the valid ones are spooled to
+    a temporary file so the request body is never read while the write
+    transaction holds the database. Their rows are then written at once:
+    bucketlists one at a time since their new id is needed by their items,
+    items batch_size at a time with a single executemany. Only the ids and
+    item counts of the new bucketlists are kept, never the records.
+
+    Attributes:
+        bucketlists: [int] number of bucketlists imported
+        items: [int] number of items imported
+        errors: [list] the first max_errors {line, message} of rejected lines
+        error_count: [int] number of rejected lines
+    """
+
+    def __init__(self, user_id, batch_size, max_errors):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.spool = SpooledTemporaryFile(SPOOL_MEMORY_SIZE)
+        self.positions = {}
+        self.current = None
+        self.now = None
+        self.created = []
+        self.counts = {}
+        self.batch = []
+        self.bucketlists = 0
+        self.items = 0
+        self.errors = []
+        self.error_count = 0
+
+    def read(self, lines):
+        """Validate every (line number, record) and spool the valid rows."""
+        for number, record in lines:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                pickle.dump(self.parse(record), self.spool, 2)
+            except InvalidLine as error:
+                self.reject(number, str(error))
+
+    def parse(self, record):
+        kind = record.get('type')
+        if kind == 'bucketlist':
+            return self.parse_bucketlist(record)
+        elif kind == 'item':
+            return self.parse_item(record)
+        raise InvalidLine('type must be bucketlist or item')
+
+    def parse_bucketlist(self, record):
+        # An invalid bucketlist also rejects the items following it
+        self.current = None
+        exported_id = parse_id(record, 'id')
+        row = ('bucketlist', parse_name(record),
+               parse_flag(record, 'is_public'),
+               parse_date(record, 'date_created', None))
+        self.current = self.bucketlists
+        if exported_id is not None:
+            self.positions[exported_id] = self.current
+        self.bucketlists += 1
+        return row
+
+    def parse_item(self, record):
+        bucketlist_id = parse_id(record, 'bucketlist_id')
+        if bucketlist_id is None:
+            position = self.current
+        else:
+            position = self.positions.get(bucketlist_id)
+        if position is None:
+            raise InvalidLine('bucketlist of the item not imported')
+        row = ('item', position, parse_name(record),
+               parse_flag(record, 'done'),
+               parse_date(record, 'date_created', None))
+        self.items += 1
+        return row
+
+    def write(self):
+        """Insert the spooled rows and index the new records.
+
+        The rows are dated when the write starts rather than when the
+        import was sent, the overlap of the sync tokens covers the time
+        they take to commit.
+        """
+        self.now = datetime.utcnow()
+        self.spool.seek(0)
+        for row in self.rows():
+            if row[0] == 'bucketlist':
+                self.insert_bucketlist(*row[1:])
+            else:
+                self.add_item(*row[1:])
+        self.flush()
+        BucketList.update_counts(self.counts)
+        search_index.add_bucketlists(self.created, db.session)
+        response_cache.invalidate_user(self.user_id, db.session)
+
+    def rows(self):
+        while True:
+            try:
+                yield pickle.load(self.spool)
+            except EOFError:
+                return
+
+    def insert_bucketlist(self, name, is_public, date_created):
+        row = {
+            'user_id': self.user_id,
+            'name': name,
+            'is_public': is_public,
+            'date_created': date_created or self.now,
+            'date_modified': self.now,
+        }
+        result = db.session.execute(BucketList.__table__.insert(), row)
+        self.created.append(result.inserted_primary_key[0])
+        if is_public:
+            public_feed.refresh(self.created[-1], True, db.session)
+
+    def add_item(self, position, name, done, date_created):
+        bucketlist_id = self.created[position]
+        self.batch.append({
+            'bucketlist_id': bucketlist_id,
+            'name': name,
+            'done': done,
+            'date_created': date_created or self.now,
+            'date_modified': self.now,
+        })
+        items, done_items = self.counts.get(bucketlist_id, (0, 0))
+        self.counts[bucketlist_id] = (items + 1, done_items + done)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            db.session.execute(BucketListItem.__table__.insert(), self.batch)
+            self.batch = []
+
+    def reject(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': number, 'message': message})
+
+    def close(self):
+        self.spool.close()
+
+
+class ImportAPI(Resource):
+    """Imports bucketlists and items into the account of the user.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    def post(self):
+        """Import a stream of newline-delimited JSON in the export format.
+
+        Every line is a bucketlist or an item, items belong to the
+        bucketlist whose exported id is their bucketlist_id, or to the
+        bucketlist before them. Invalid lines are skipped and reported,
+        the rest is imported in a single transaction once the whole body
+        has been read.
+        """
+        importer = Importer(g.user.id,
+                            current_app.config['IMPORT_BATCH_SIZE'],
+                            current_app.config['IMPORT_MAX_ERRORS'])
+        try:
+            importer.read(read_lines(request.stream))
+            if importer.bucketlists or importer.items:
+                importer.write()
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            importer.close()
+        report = {
+            'bucketlists': importer.bucketlists,
+            'items': importer.items,
+            'error_count': importer.error_count,
+            'errors': importer.errors,
+        }
+        if not importer.bucketlists and not importer.items:
+            return report, 400
+        return report, 201
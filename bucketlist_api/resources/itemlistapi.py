@@ -1,11 +1,70 @@
 """Script defined to handle BucketList Item API Calls."""
 
-from flask_restful import Resource, reqparse, marshal_with
-from flask import g, request, abort, url_for
+from flask_restful import Resource, reqparse
+from flask import g, request, abort, url_for, current_app
 from bucketlist_api.models import User, BucketList, BucketListItem
 from bucketlist_api.authentication import auth
-from bucketlist_api.decorators import get_bucketlist, own_by_user
-from bucketlist_api.serializers import bucketlist_serializer
+from bucketlist_api.decorators import get_bucketlist, own_by_user, \
+                                      keep_loaded, paginated, \
+                                      sort_descending
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import item_serializer, \
+                                       item_collection_serializer
+
+marshal_items = compile_fields(item_serializer, envelope='items')
+marshal_item = compile_fields(item_serializer)
+marshal_item_collection = compile_fields(item_collection_serializer)
+
+
+def parse_done(value, error):
+    """Convert a done flag sent as a boolean or an int, abort on others."""
+    if value is None or isinstance(value, bool):
+        return value
+    try:
+        return bool(int(value))
+    except (TypeError, ValueError):
+        abort(400, error + ': done must be 0 or 1')
+
+
+def done_filter():
+    """Parse the ?done= filter of an item listing, None when absent."""
+    done = request.args.get('done')
+    if done is None:
+        return None
+    if done.lower() in ('1', 'true'):
+        return True
+    if done.lower() in ('0', 'false'):
+        return False
+    abort(400, 'InvalidFilter: done must be 0 or 1')
+
+
+def requested_item():
+    """Return the item of the url loaded by get_bucketlist, 404 if none."""
+    if g.item is None:
+        abort(404)
+    return g.item
+
+
+def parse_batch(payload):
+    """Build unsaved items from a list of JSON objects.
+
+    Arguments:
+        payload: [list] objects with a `name` and an optional `done` field
+
+    Return:
+        [list] BucketListItem models, the request aborts on an invalid one
+    """
+    limit = current_app.config['MAX_ITEMS_PER_REQUEST']
+    if not payload or len(payload) > limit:
+        abort(400, 'itemNotCreated: Send between 1 and %d items' % limit)
+    items = []
+    for data in payload:
+        if not isinstance(data, dict) or not data.get('name'):
+            abort(400, 'itemNotCreated: Name not specified for items')
+        done = parse_done(data.get('done'), 'itemNotCreated')
+        items.append(BucketListItem(name=data['name'], done=bool(done),
+                                    bucketlist_id=g.bucketlist.id))
+    return items
 
 
 class ItemListAPI(Resource):
@@ -27,8 +86,34 @@ class ItemListAPI(Resource):
         self.parser.add_argument('done', type=int, location='json')
         super(ItemListAPI, self).__init__()
 
-    @marshal_with(bucketlist_serializer)
+    def get(self, bucketlist_id, item_id=None):
+        """List the items of the bucketlist a page at a time.
+
+        ?done=0|1 filters on done and ?order=asc|desc sorts by creation,
+        pages are numbered with ?page= or seeked with ?cursor=.
+        """
+        if item_id is not None:
+            return marshal_item(requested_item())
+        page, code = self.get_page(bucketlist_id=bucketlist_id)
+        return marshal_item_collection(page), code
+
+    @paginated('items', allow_empty=True)
+    def get_page(self, bucketlist_id):
+        query = BucketListItem.query.filter_by(bucketlist_id=bucketlist_id)
+        done = done_filter()
+        if done is not None:
+            query = query.filter_by(done=done)
+        order = [BucketListItem.date_created, BucketListItem.id]
+        if sort_descending():
+            order = [column.desc() for column in order]
+        return query.order_by(*order)
+
+    @keep_loaded
     def post(self, bucketlist_id):
+        payload = request.get_json(silent=True)
+        if isinstance(payload, list):
+            items = BucketListItem.save_all(parse_batch(payload))
+            return marshal_items(items), 201
         data = self.parser.parse_args()
         if not data.get('name'):
             abort(400, 'itemNotCreated: Name not specified for items')
@@ -36,20 +121,40 @@ class ItemListAPI(Resource):
         item = BucketListItem(name=data['name'], done=done)
         g.bucketlist.items.append(item)
         item.save()
-        return g.bucketlist, 201
+        return marshal_item(item), 201
 
-    @marshal_with(bucketlist_serializer)
+    @keep_loaded
     def put(self, bucketlist_id, item_id):
         data = self.parser.parse_args()
-        item = BucketListItem.query.filter_by(id=item_id,
-                              bucketlist_id=bucketlist_id).first_or_404()
+        item = requested_item()
         name = data.get('name', item.name)
         done = data.get('done', item.done)
         item.update(name=name, done=done)
-        return g.bucketlist
+        return marshal_item(item)
+
+    def patch(self, bucketlist_id, item_id=None):
+        """Set done on many items of the bucketlist with one UPDATE.
+
+        The body is a JSON object with `done` and the `ids` of the items,
+        PATCH on a single item url updates that item only.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or data.get('done') is None:
+            abort(400, 'itemNotUpdated: done not specified for items')
+        done = parse_done(data['done'], 'itemNotUpdated')
+        ids = [item_id] if item_id is not None else data.get('ids')
+        limit = current_app.config['MAX_ITEMS_PER_REQUEST']
+        if not isinstance(ids, list) or not 0 < len(ids) <= limit:
+            abort(400, 'itemNotUpdated: Send between 1 and %d ids' % limit)
+        try:
+            ids = [int(id) for id in ids]
+        except (TypeError, ValueError):
+            abort(400, 'itemNotUpdated: ids must be integers')
+        items = BucketListItem.mark_done(bucketlist_id, ids, done)
+        if item_id is not None and not items:
+            abort(404)
+        return marshal_items(items)
 
     def delete(self, bucketlist_id, item_id):
-        item = BucketListItem.query.filter_by(id=item_id,
-                              bucketlist_id=bucketlist_id).first_or_404()
-        item.delete()
+        requested_item().delete()
         return '', 204
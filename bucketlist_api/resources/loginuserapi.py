@@ -1,8 +1,9 @@
 """Script handles Login API Calls."""
 
-from flask_restful import Resource, reqparse, marshal_with
+from flask_restful import Resource, reqparse
 from flask import abort, url_for
 from bucketlist_api.models import User
+from bucketlist_api.marshalling import marshal_with
 from bucketlist_api.serializers import user_serializer
 
 
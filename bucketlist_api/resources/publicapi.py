@@ -0,0 +1,91 @@
+"""Script defined to handle the public bucketlist feed API call."""
+
+from collections import namedtuple
+from sqlalchemy import or_
+from flask_restful import Resource
+from flask import request, current_app, url_for
+from bucketlist_api import db
+from bucketlist_api.cache import public_feed
+from bucketlist_api.models import User, BucketList
+from bucketlist_api.decorators import encode_cursor, decode_cursor
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import public_bucketlist_serializer, \
+                                       pagination_fields
+
+marshal_public = compile_fields(public_bucketlist_serializer)
+marshal_pagination = compile_fields(pagination_fields)
+
+# Position of a bucketlist in the feed, encoded in the cursors
+FeedKey = namedtuple('FeedKey', ['date_created', 'id'])
+
+
+def load_public(ids=None, after=None, limit=None):
+    """Read public bucketlists newest first, as public_feed.page loads them.
+
+    The filter on is_public matches the partial index on date_created and
+    id, which is walked backwards from after without an OFFSET.
+
+    Arguments:
+        ids: [iterable] read only the bucketlists with these ids
+        after: [FeedKey] read the bucketlists older than this position
+        limit: [int] maximum number of bucketlists to read
+
+    Return:
+        [list] (FeedKey, record) of the bucketlists
+    """
+    query = db.session.query(
+        BucketList.id, BucketList.name, User.username.label('owner'),
+        BucketList.item_count, BucketList.done_count,
+        BucketList.date_modified, BucketList.date_created
+    ).join(User, User.id == BucketList.user_id).filter(
+        BucketList.is_public == db.true())
+    if ids is not None:
+        query = query.filter(BucketList.id.in_(ids))
+    if after is not None:
+        # The first term bounds the index range, the second seeks past ids
+        query = query.filter(
+            BucketList.date_created <= after.date_created,
+            or_(BucketList.date_created < after.date_created,
+                BucketList.id < after.id))
+    query = query.order_by(BucketList.date_created.desc(),
+                           BucketList.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [(FeedKey(row.date_created, row.id), marshal_public(row._asdict()))
+            for row in query]
+
+
+class PublicBucketListAPI(Resource):
+    """The public bucketlists of every user, newest first.
+       doesn't require authentication
+
+       Inherits:
+           Resource
+    """
+
+    def get(self):
+        """List a page of the feed, ?cursor= seeks the next page.
+
+        The newest PUBLIC_FEED_CACHE_SIZE bucketlists are served from
+        public_feed, the X-Cache header tells whether the page was.
+        """
+        limit = max(min(request.args.get(
+            'limit', current_app.config['DEFAULT_PER_PAGE'], type=int),
+            current_app.config['MAX_PER_PAGE']), 1)
+        after = None
+        if request.args.get('cursor'):
+            date_created, id, direction = decode_cursor(
+                request.args['cursor'])
+            after = FeedKey(date_created, id)
+        entries, has_next, hit = public_feed.page(load_public, after, limit)
+        pagination = {}
+        if has_next:
+            pagination['next'] = url_for(
+                endpoint=request.endpoint, limit=limit,
+                cursor=encode_cursor(entries[-1][0], 'next'),
+                _method='GET', _external=True)
+        body = {
+            'bucketlists': [record for key, record in entries],
+            'pagination': marshal_pagination(pagination),
+        }
+        return body, 200, {'X-Cache': hit and 'HIT' or 'MISS'}
@@ -0,0 +1,40 @@
+"""Script defined to handle the item statistics API call."""
+
+from flask_restful import Resource
+from flask import g
+from bucketlist_api import db
+from bucketlist_api.models import BucketList
+from bucketlist_api.authentication import auth
+from bucketlist_api.decorators import cached
+from bucketlist_api.marshalling import marshal_with
+from bucketlist_api.serializers import stats_serializer
+
+
+class StatsAPI(Resource):
+    """Counts of the items and done items of the user's bucketlists.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    @cached
+    @marshal_with(stats_serializer)
+    def get(self):
+        """Answer the counts kept on the bucketlists, items aren't read."""
+        rows = db.session.query(
+            BucketList.id, BucketList.name, BucketList.item_count,
+            BucketList.done_count
+        ).filter(BucketList.user_id == g.user.id).order_by(BucketList.id)
+        bucketlists = [row._asdict() for row in rows]
+        return {
+            'bucketlists': bucketlists,
+            'total': {
+                'bucketlists': len(bucketlists),
+                'items': sum(row['item_count'] for row in bucketlists),
+                'done': sum(row['done_count'] for row in bucketlists),
+                'completed': sum(
+                    1 for row in bucketlists
+                    if 0 < row['done_count'] == row['item_count']),
+            },
+        }
@@ -0,0 +1,119 @@
+"""Script defined to handle the incremental sync API call."""
+
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime, timedelta
+from flask_restful import Resource
+from flask import g, request, abort, current_app, stream_with_context
+from bucketlist_api import db
+from bucketlist_api.models import BucketList, BucketListItem, Tombstone
+from bucketlist_api.authentication import auth
+from bucketlist_api.decorators import CURSOR_DATE_FORMAT
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import sync_bucketlist_serializer, \
+                                       sync_item_serializer, \
+                                       tombstone_serializer
+
+marshal_bucketlists = compile_fields(sync_bucketlist_serializer)
+marshal_items = compile_fields(sync_item_serializer)
+marshal_tombstones = compile_fields(tombstone_serializer)
+
+
+def encode_token(date):
+    """Encode the date a sync covers changes up to into an opaque token."""
+    token = urlsafe_b64encode(json.dumps(
+        [date.strftime(CURSOR_DATE_FORMAT)]).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """Decode a token made by encode_token, abort with 400 if invalid."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        date, = json.loads(urlsafe_b64decode(padded.encode('ascii'))
+                           .decode('utf-8'))
+        return datetime.strptime(date, CURSOR_DATE_FORMAT)
+    except (ValueError, TypeError, UnicodeError):
+        abort(400, 'InvalidToken: The sync token supplied is not valid')
+
+
+def batches(query, model, batch_size):
+    """Yield the rows of query batch_size at a time, seeking by id.
+
+    Every batch is a separate query and is expunged from the session once
+    yielded, so memory stays flat however many rows changed.
+    """
+    last_id = 0
+    while True:
+        rows = query.filter(model.id > last_id).order_by(model.id) \
+            .limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        for row in rows:
+            db.session.expunge(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].id
+
+
+def stream_changes(next_token, sections):
+    """Render the changes as one JSON object, a batch at a time.
+
+    Arguments:
+        next_token: [String] token of the next sync
+        sections: [list] (key, marshal function, batches) of each array
+    """
+    yield '{"next": %s' % json.dumps(next_token)
+    for key, marshal, rows in sections:
+        yield ', "%s": [' % key
+        separator = ''
+        for batch in rows:
+            yield separator + ', '.join(json.dumps(record)
+                                        for record in marshal(batch))
+            separator = ', '
+        yield ']'
+    yield '}\n'
+
+
+class SyncAPI(Resource):
+    """Returns what changed in the user's bucketlists since a sync token.
+
+    Inherits:
+        Resource
+    """
+    decorators = [auth.login_required]
+
+    def get(self):
+        """Stream the deletions, bucketlists and items changed since ?since=.
+
+        Without since every bucketlist and item is sent. Deletions come
+        first so a record deleted and created again ends up present. The
+        next token overlaps the sync by SYNC_OVERLAP_SECONDS so writes
+        still committing are not missed, records may be sent twice.
+        """
+        since = request.args.get('since')
+        since = since and decode_token(since) or datetime.min
+        next_token = encode_token(datetime.utcnow() - timedelta(
+            seconds=current_app.config['SYNC_OVERLAP_SECONDS']))
+        batch_size = current_app.config['SYNC_BATCH_SIZE']
+        user_id = g.user.id
+        tombstones = Tombstone.query.filter(
+            Tombstone.user_id == user_id, Tombstone.date_created > since)
+        bucketlists = BucketList.query.filter(
+            BucketList.user_id == user_id, BucketList.date_modified > since)
+        items = BucketListItem.query.join(
+            BucketList, BucketList.id == BucketListItem.bucketlist_id).filter(
+            BucketList.user_id == user_id,
+            BucketListItem.date_modified > since)
+        sections = [
+            ('deleted', marshal_tombstones,
+             batches(tombstones, Tombstone, batch_size)),
+            ('bucketlists', marshal_bucketlists,
+             batches(bucketlists, BucketList, batch_size)),
+            ('items', marshal_items,
+             batches(items, BucketListItem, batch_size)),
+        ]
+        return current_app.response_class(
+            stream_with_context(stream_changes(next_token, sections)),
+            mimetype='application/json')
@@ -0,0 +1,121 @@
+"""Script generates synthetic users, bucketlists and items in bulk.
+
+Rows are written with Core executemany in batches inside one transaction
+instead of BaseModel.save, which flushes and commits every row. The same
+seed always produces the same names, flags and dates so performance
+experiments can be reproduced.
+"""
+
+import random
+from datetime import datetime, timedelta
+from six.moves import range
+from bucketlist_api import db
+from bucketlist_api.hashing import password_hasher
+from bucketlist_api.models import User, BucketList, BucketListItem
+from bucketlist_api.search import search_index
+
+SAMPLE_PASSWORD = 'password'
+START_DATE = datetime(2016, 1, 1)
+VERBS = ['travel to', 'learn', 'visit', 'climb', 'read', 'cook', 'build',
+         'paint', 'swim in', 'write', 'run', 'photograph', 'sail to',
+         'taste', 'see']
+THINGS = ['paris', 'guitar', 'kilimanjaro', 'a marathon', 'a novel',
+          'a garden', 'spanish', 'a safari', 'the pyramids', 'tokyo',
+          'the northern lights', 'a cabin', 'sushi', 'the alps', 'lagos',
+          'a sculpture', 'the amazon', 'chess', 'a podcast', 'machu picchu']
+
+
+def _max_id(model):
+    return db.session.query(db.func.max(model.id)).scalar() or 0
+
+
+def _insert(table, rows, batch_size):
+    """Insert rows, an iterable of dicts, batch_size rows per statement."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def generate(users=100, bucketlists=10, items=10, seed=0, batch_size=10000,
+             prefix='sample', password_hash=None):
+    """Add a synthetic dataset to the database in a single transaction.
+
+    Ids continue from the largest existing ones so the data can be added to
+    a database already in use. Every user gets the password 'password'.
+
+    Arguments:
+        users: [int] number of users to create
+        bucketlists: [int] number of bucketlists per user
+        items: [int] number of items per bucketlist
+        seed: [int] seed of the generated names, flags and dates
+        batch_size: [int] number of rows sent per insert statement
+        prefix: [String] prefix of the generated usernames
+        password_hash: [String] hash to store, hashed from 'password' if None
+
+    Return:
+        [dict] range of the bucketlist ids created for each username
+    """
+    rng = random.Random(seed)
+    if password_hash is None:
+        password_hash = password_hasher.encrypt(SAMPLE_PASSWORD)
+    first_user = _max_id(User) + 1
+    first_bucketlist = _max_id(BucketList) + 1
+    created = {}
+    try:
+        usernames = ['%s%d' % (prefix, user_id) for user_id in
+                     range(first_user, first_user + users)]
+        _insert(User.__table__, (
+            {'id': user_id, 'username': username,
+             'password_hash': password_hash, 'date_created': START_DATE}
+            for user_id, username in enumerate(usernames, first_user)
+        ), batch_size)
+        for number, username in enumerate(usernames):
+            start = first_bucketlist + number * bucketlists
+            created[username] = range(start, start + bucketlists)
+        _insert(BucketList.__table__,
+                _bucketlist_rows(rng, first_user, first_bucketlist, users,
+                                 bucketlists), batch_size)
+        _insert(BucketListItem.__table__,
+                _item_rows(rng, first_bucketlist, users * bucketlists, items),
+                batch_size)
+        BucketList.reconcile_counts(first_bucketlist,
+                                    first_bucketlist + users * bucketlists - 1)
+        search_index.add_bucketlists(
+            range(first_bucketlist, first_bucketlist + users * bucketlists),
+            db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created
+
+
+def _name(rng):
+    return '%s %s' % (rng.choice(VERBS), rng.choice(THINGS))
+
+
+def _bucketlist_rows(rng, first_user, first_bucketlist, users, bucketlists):
+    bucketlist_id = first_bucketlist
+    for user_id in range(first_user, first_user + users):
+        date = START_DATE + timedelta(seconds=rng.randint(0, 3600))
+        for _ in range(bucketlists):
+            date += timedelta(seconds=rng.randint(1, 86400))
+            yield {'id': bucketlist_id, 'user_id': user_id,
+                   'name': _name(rng), 'is_public': rng.random() < 0.2,
+                   'date_created': date, 'date_modified': date}
+            bucketlist_id += 1
+
+
+def _item_rows(rng, first_bucketlist, count, items):
+    for bucketlist_id in range(first_bucketlist, first_bucketlist + count):
+        date = START_DATE + timedelta(seconds=rng.randint(0, 86400 * 30))
+        for _ in range(items):
+            date += timedelta(seconds=rng.randint(1, 86400))
+            yield {'bucketlist_id': bucketlist_id, 'name': _name(rng),
+                   'done': rng.random() < 0.3, 'date_created': date,
+                   'date_modified': date}
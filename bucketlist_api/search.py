@@ -0,0 +1,255 @@
+"""Script defines the full-text search over bucketlist and item names."""
+
+import re
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.sql import column
+
+# Rows of a user matching a search, one per bucketlist, lower rank is a
+# better match. The terms match the owner column too, so only the rows of
+# the user are read, and bm25 only weighs the name.
+SQLITE_HITS = """
+SELECT bucketlist_id, min(rank) AS rank FROM (
+    SELECT rowid AS bucketlist_id, bm25(bucketlist_fts, 1.0, 0.0) AS rank
+    FROM bucketlist_fts WHERE bucketlist_fts MATCH :terms
+    UNION ALL
+    SELECT bucketlist_id, bm25(item_fts, 1.0, 0.0, 0.0) FROM item_fts
+    WHERE item_fts MATCH :terms
+) GROUP BY bucketlist_id
+"""
+
+POSTGRES_HITS = """
+SELECT bucketlist_id, min(rank) AS rank FROM (
+    SELECT id AS bucketlist_id,
+           -ts_rank(to_tsvector('simple', name),
+                    to_tsquery('simple', :terms)) AS rank
+    FROM bucketlist
+    WHERE user_id = :user_id
+    AND to_tsvector('simple', name) @@ to_tsquery('simple', :terms)
+    UNION ALL
+    SELECT items.bucketlist_id,
+           -ts_rank(to_tsvector('simple', items.name),
+                    to_tsquery('simple', :terms)) AS rank
+    FROM items JOIN bucketlist ON bucketlist.id = items.bucketlist_id
+    WHERE bucketlist.user_id = :user_id
+    AND to_tsvector('simple', items.name) @@ to_tsquery('simple', :terms)
+) AS matches GROUP BY bucketlist_id
+"""
+
+# The owner column holds 'u' followed by the id of the user owning the row
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS bucketlist_fts "
+    "USING fts5(name, owner)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS item_fts "
+    "USING fts5(name, bucketlist_id UNINDEXED, owner)",
+]
+
+SQLITE_DROP = [
+    "DROP TABLE IF EXISTS bucketlist_fts",
+    "DROP TABLE IF EXISTS item_fts",
+]
+
+SQLITE_REBUILD = [
+    "DELETE FROM bucketlist_fts",
+    "DELETE FROM item_fts",
+    "INSERT INTO bucketlist_fts (rowid, name, owner) "
+    "SELECT id, name, 'u' || user_id FROM bucketlist",
+    "INSERT INTO item_fts (rowid, name, bucketlist_id, owner) "
+    "SELECT items.id, items.name, items.bucketlist_id, "
+    "'u' || bucketlist.user_id FROM items "
+    "JOIN bucketlist ON bucketlist.id = items.bucketlist_id",
+]
+
+# Index new bucketlists and every item in them, executed once per id
+SQLITE_ADD_BUCKETLISTS = [
+    "INSERT INTO bucketlist_fts (rowid, name, owner) "
+    "SELECT id, name, 'u' || user_id FROM bucketlist WHERE id = :id",
+    "INSERT INTO item_fts (rowid, name, bucketlist_id, owner) "
+    "SELECT items.id, items.name, items.bucketlist_id, "
+    "'u' || bucketlist.user_id FROM items "
+    "JOIN bucketlist ON bucketlist.id = items.bucketlist_id "
+    "WHERE items.bucketlist_id = :id",
+]
+
+POSTGRES_CREATE = [
+    "CREATE INDEX IF NOT EXISTS ix_bucketlist_name_fts ON bucketlist "
+    "USING gin (to_tsvector('simple', name))",
+    "CREATE INDEX IF NOT EXISTS ix_items_name_fts ON items "
+    "USING gin (to_tsvector('simple', name))",
+]
+
+# Statements keeping the SQLite index in sync, keyed by table and action
+SQLITE_SYNC = {
+    ('bucketlist', 'remove'): [
+        "DELETE FROM bucketlist_fts WHERE rowid = :id",
+        "DELETE FROM item_fts WHERE rowid IN "
+        "(SELECT id FROM items WHERE bucketlist_id = :id)",
+    ],
+    ('bucketlist', 'add'): [
+        "DELETE FROM bucketlist_fts WHERE rowid = :id",
+        "INSERT INTO bucketlist_fts (rowid, name, owner) "
+        "VALUES (:id, :name, 'u' || :user_id)",
+    ],
+    ('items', 'remove'): [
+        "DELETE FROM item_fts WHERE rowid = :id",
+    ],
+    ('items', 'add'): [
+        "DELETE FROM item_fts WHERE rowid = :id",
+        "INSERT INTO item_fts (rowid, name, bucketlist_id, owner) "
+        "SELECT :id, :name, :bucketlist_id, 'u' || user_id FROM bucketlist "
+        "WHERE id = :bucketlist_id",
+    ],
+    ('users', 'remove'): [
+        "DELETE FROM item_fts WHERE rowid IN (SELECT items.id FROM items "
+        "JOIN bucketlist ON bucketlist.id = items.bucketlist_id "
+        "WHERE bucketlist.user_id = :id)",
+        "DELETE FROM bucketlist_fts WHERE rowid IN "
+        "(SELECT id FROM bucketlist WHERE user_id = :id)",
+    ],
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Hide the search tables and indexes from Alembic autogenerate."""
+    if type_ == 'table':
+        return not name.startswith(('bucketlist_fts', 'item_fts'))
+    if type_ == 'index':
+        return not name.endswith('_name_fts')
+    return True
+
+
+def search_terms(q):
+    """Split free text into words, dropping any full-text query syntax.
+
+    Arguments:
+        q: [String] the search text supplied by the client
+
+    Return:
+        [list] the words of q, stripped of any query syntax
+    """
+    return re.findall(r'\w+', q, re.UNICODE)
+
+
+class SearchIndex(object):
+    """Full-text index over the names of bucketlists and their items.
+
+    SQLite databases use FTS5 tables kept in sync by BaseModel.save and
+    BaseModel.delete, Postgres databases use GIN expression indexes which
+    the database maintains itself. Any other database, or an SQLite build
+    without FTS5, falls back to a LIKE match on the bucketlist name.
+    """
+
+    def __init__(self):
+        self._backends = {}
+
+    def backend(self, bind):
+        """Return the search backend name for an engine or connection.
+
+        Return:
+            [String] 'sqlite', 'postgresql' or None when unsupported
+        """
+        name = bind.dialect.name
+        if name not in self._backends:
+            supported = name == 'postgresql'
+            if name == 'sqlite':
+                supported = bool(bind.execute(
+                    "SELECT sqlite_compileoption_used('ENABLE_FTS5')"
+                ).scalar())
+            self._backends[name] = supported and name or None
+        return self._backends[name]
+
+    def create(self, target, connection, **kwargs):
+        """Create the search tables, runs after metadata.create_all."""
+        backend = self.backend(connection)
+        if backend == 'sqlite':
+            for statement in SQLITE_CREATE:
+                connection.execute(statement)
+        elif backend == 'postgresql':
+            for statement in POSTGRES_CREATE:
+                connection.execute(statement)
+
+    def drop(self, target, connection, **kwargs):
+        """Drop the search tables, runs before metadata.drop_all."""
+        if self.backend(connection) == 'sqlite':
+            for statement in SQLITE_DROP:
+                connection.execute(statement)
+
+    def rebuild(self, session):
+        """Index every bucketlist and item again from scratch."""
+        if self.backend(session.get_bind()) == 'sqlite':
+            for statement in SQLITE_REBUILD:
+                session.execute(statement)
+
+    def add(self, instance, session):
+        """Index a saved bucketlist or item, others are ignored."""
+        self._sync([instance], session, 'add')
+
+    def add_all(self, instances, session):
+        """Index saved records of one model, one statement per step."""
+        self._sync(instances, session, 'add')
+
+    def add_bucketlists(self, ids, session):
+        """Index bucketlists inserted without the models and their items.
+
+        Arguments:
+            ids: [list] ids of bucketlists not yet in the index
+        """
+        if not ids or self.backend(session.get_bind()) != 'sqlite':
+            return
+        params = [{'id': id} for id in ids]
+        if len(params) == 1:
+            params = params[0]
+        for statement in SQLITE_ADD_BUCKETLISTS:
+            session.execute(statement, params)
+
+    def remove(self, instance, session):
+        """Remove a record about to be deleted from the index."""
+        self._sync([instance], session, 'remove')
+
+    def _sync(self, instances, session, action):
+        if not instances:
+            return
+        statements = SQLITE_SYNC.get((instances[0].__tablename__, action))
+        if not statements or self.backend(session.get_bind()) != 'sqlite':
+            return
+        params = [{
+            'id': instance.id,
+            'name': getattr(instance, 'name', None),
+            'bucketlist_id': getattr(instance, 'bucketlist_id', None),
+            'user_id': getattr(instance, 'user_id', None),
+        } for instance in instances]
+        if len(params) == 1:
+            params = params[0]
+        for statement in statements:
+            session.execute(statement, params)
+
+    def search(self, query, model, q, user_id, session):
+        """Filter a bucketlist query down to matches of q, best first.
+
+        Only the index entries of the user are searched.
+
+        Arguments:
+            query: [Query] query over the bucketlist model
+            model: [Model] the bucketlist model class
+            q: [String] the search text supplied by the client
+            user_id: [int] id of the user owning the bucketlists of query
+        """
+        terms = search_terms(q)
+        backend = self.backend(session.get_bind())
+        if not terms or backend is None:
+            return query.filter(model.name.contains(q))
+        if backend == 'sqlite':
+            hits = text(SQLITE_HITS).bindparams(
+                terms='owner : u%d AND name : (%s)' % (
+                    user_id, ' '.join('"%s"*' % term for term in terms)))
+        else:
+            hits = text(POSTGRES_HITS).bindparams(
+                terms=' & '.join('%s:*' % term for term in terms),
+                user_id=user_id)
+        hits = hits.columns(
+            column('bucketlist_id', Integer),
+            column('rank', Float)).alias('search_hits')
+        return query.join(hits, hits.c.bucketlist_id == model.id).order_by(
+            hits.c.rank, model.id)
+
+
+search_index = SearchIndex()
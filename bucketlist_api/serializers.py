@@ -14,9 +14,9 @@ item_serializer = {
 }
 
 pagination_fields = {
-    'page': fields.Integer,
-    'number_of_pages': fields.Integer,
-    'total': fields.Integer,
+    'page': fields.Integer(default=None),
+    'number_of_pages': fields.Integer(default=None),
+    'total': fields.Integer(default=None),
     'next': fields.String,
     'previous': fields.String,
 }
@@ -27,14 +27,96 @@ bucketlist_serializer = {
     'date_modified': fields.DateTime,
     'date_created': fields.DateTime,
     'created_by': fields.Integer(attribute='user_id'),
-    'items': fields.List(fields.Nested(item_serializer)),
+    'items': fields.List(fields.Nested(item_serializer),
+                         attribute='item_list'),
 }
 
+# Bucketlists listed with ?items=count, and with ?items=N a preview
+bucketlist_count_serializer = dict(
+    (key, field) for key, field in bucketlist_serializer.items()
+    if key != 'items')
+bucketlist_count_serializer['item_count'] = fields.Integer
+bucketlist_count_serializer['done_count'] = fields.Integer
+bucketlist_preview_serializer = dict(bucketlist_count_serializer,
+                                     items=bucketlist_serializer['items'])
+
 bucketlist_collection_serializer = {
     'pagination': fields.Nested(pagination_fields),
     'bucketlists': fields.List(fields.Nested(bucketlist_serializer)),
 }
 
+bucketlist_count_collection_serializer = {
+    'pagination': fields.Nested(pagination_fields),
+    'bucketlists': fields.List(fields.Nested(bucketlist_count_serializer)),
+}
+
+bucketlist_preview_collection_serializer = {
+    'pagination': fields.Nested(pagination_fields),
+    'bucketlists': fields.List(fields.Nested(bucketlist_preview_serializer)),
+}
+
+# Records sent by /v1/sync, items are not nested in their bucketlist
+sync_bucketlist_serializer = dict(
+    (key, field) for key, field in bucketlist_serializer.items()
+    if key != 'items')
+sync_item_serializer = dict(item_serializer,
+                            bucketlist_id=fields.Integer)
+tombstone_serializer = {
+    'type': fields.String(attribute='kind'),
+    'id': fields.Integer(attribute='record_id'),
+    'bucketlist_id': fields.Integer(default=None),
+    'date_deleted': fields.DateTime(attribute='date_created'),
+}
+
+# Lines of /v1/export, dates keep their microseconds for a later import
+export_bucketlist_serializer = {
+    'id': fields.Integer,
+    'name': fields.String,
+    'is_public': fields.Boolean,
+    'date_modified': fields.DateTime(dt_format='iso8601'),
+    'date_created': fields.DateTime(dt_format='iso8601'),
+}
+export_item_serializer = {
+    'id': fields.Integer,
+    'bucketlist_id': fields.Integer,
+    'name': fields.String,
+    'done': fields.Boolean,
+    'date_modified': fields.DateTime(dt_format='iso8601'),
+    'date_created': fields.DateTime(dt_format='iso8601'),
+}
+
+item_collection_serializer = {
+    'pagination': fields.Nested(pagination_fields),
+    'items': fields.List(fields.Nested(item_serializer)),
+}
+
+# GET /v1/stats, completed counts the bucketlists with all items done
+stats_serializer = {
+    'total': fields.Nested({
+        'bucketlists': fields.Integer,
+        'items': fields.Integer,
+        'done': fields.Integer,
+        'completed': fields.Integer,
+    }),
+    'bucketlists': fields.List(fields.Nested({
+        'id': fields.Integer,
+        'name': fields.String,
+        'item_count': fields.Integer,
+        'done_count': fields.Integer,
+    })),
+}
+
+# GET /v1/public/bucketlists, owner is the username of the owner
+public_bucketlist_serializer = {
+    'id': fields.Integer,
+    'name': fields.String,
+    'owner': fields.String,
+    'item_count': fields.Integer,
+    'done_count': fields.Integer,
+    'date_modified': fields.DateTime,
+    'date_created': fields.DateTime,
+}
+
 help_fields = {
     "methods": fields.String,
     "url": fields.String,
@@ -45,6 +127,13 @@ help_message_serializer = {
     "message": fields.String,
     "register": fields.Nested(help_fields),
     "login": fields.Nested(help_fields),
+    "account": fields.Nested(help_fields),
     "bucketlists": fields.Nested(help_fields),
     "items": fields.Nested(help_fields),
+    "sync": fields.Nested(help_fields),
+    "export": fields.Nested(help_fields),
+    "import": fields.Nested(help_fields),
+    "stats": fields.Nested(help_fields),
+    "public": fields.Nested(help_fields),
+    "batch": fields.Nested(help_fields),
 }
@@ -0,0 +1,103 @@
+"""Script serves the app with a pre-forking WSGI server."""
+
+import logging
+from gunicorn.app.base import BaseApplication
+from bucketlist_api import db
+from bucketlist_api.cache import response_cache, token_cache
+
+logger = logging.getLogger(__name__)
+
+
+def server_options(config, **overrides):
+    """Return the gunicorn settings of the SERVER_* app config.
+
+    Arguments:
+        config: [Config] the app config
+        overrides: settings given on the command line, None values are
+                   left to the config
+
+    Return:
+        [dict] the gunicorn settings
+    """
+    options = {
+        'bind': config['SERVER_BIND'],
+        'workers': config['SERVER_WORKERS'],
+        'threads': config['SERVER_THREADS'],
+        'keepalive': config['SERVER_KEEPALIVE'],
+        'timeout': config['SERVER_TIMEOUT'],
+        'graceful_timeout': config['SERVER_GRACEFUL_TIMEOUT'],
+        'max_requests': config['SERVER_MAX_REQUESTS'],
+    }
+    options.update((name, value) for name, value in overrides.items()
+                   if value is not None)
+    # Only the threaded worker keeps connections alive between requests
+    options['worker_class'] = options['threads'] > 1 and 'gthread' or 'sync'
+    return options
+
+
+def post_fork(server, worker):
+    """Give a new worker database engines of its own.
+
+    The pool of an engine created in the master holds connections every
+    forked worker would share, disposing it makes the worker open its own.
+    """
+    db.get_engine(worker.app.application).dispose()
+
+
+def isolate_caches(app, workers):
+    """Turn off the caches workers can't keep in step with each other.
+
+    The caches live in each worker, one would keep answering what another
+    changed. The token cache would authenticate a deleted user's token
+    until its TOKEN_CACHE_TTL ran out, and the response cache would serve
+    a user's old data, unless RESPONSE_CACHE_BACKEND names a backend the
+    workers share. With a single worker both are kept.
+
+    Arguments:
+        app: [Flask] the app served
+        workers: [int] number of worker processes
+
+    Return:
+        [list] names of the caches turned off
+    """
+    if workers <= 1:
+        return []
+    disabled = ['token']
+    app.config['TOKEN_CACHE_SIZE'] = 0
+    token_cache.init_app(app)
+    if not app.config.get('RESPONSE_CACHE_BACKEND'):
+        disabled.append('response')
+        app.config['RESPONSE_CACHE_SIZE'] = 0
+        response_cache.init_app(app)
+    logger.warning('%s cache disabled: %d workers can not share it',
+                   ' and '.join(disabled).capitalize(), workers)
+    return disabled
+
+
+class PreforkServer(BaseApplication):
+    """Serves the app from gunicorn's pre-forking master and workers.
+
+    The master forks `workers` processes each serving up to `threads`
+    requests at once and keeping idle connections open `keepalive`
+    seconds. On SIGHUP it starts new workers and lets the old ones finish
+    their requests within `graceful_timeout` seconds before stopping. The
+    caches the workers can't share are turned off, see isolate_caches.
+
+    Attributes:
+        application: [Flask] the app served
+        options: [dict] gunicorn settings, see server_options
+    """
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        isolate_caches(application, options['workers'])
+        super(PreforkServer, self).__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+        self.cfg.set('post_fork', post_fork)
+
+    def load(self):
+        return self.application
@@ -4,10 +4,13 @@ from flask_script import Manager, Server
 from flask_migrate import Migrate, MigrateCommand
 from bucketlist_api import models, create_app, db
 from bucketlist_api.api import app
+from bucketlist_api.search import include_object
+import json
+import time
 import nose
 
 manager = Manager(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=include_object)
 
 
 @manager.command
@@ -17,10 +20,55 @@ def drop():
         db.drop_all()
 
 
-@manager.command
-def create(default_data=True, sample_data=False):
+@manager.option('--sample_data', dest='sample_data', action='store_true',
+                default=False, help='add a generated dataset')
+@manager.option('-u', '--users', dest='users', type=int, default=1000)
+@manager.option('-b', '--bucketlists', dest='bucketlists', type=int,
+                default=10, help='bucketlists per user')
+@manager.option('-i', '--items', dest='items', type=int, default=10,
+                help='items per bucketlist')
+@manager.option('--seed', dest='seed', type=int, default=0)
+@manager.option('--batch_size', dest='batch_size', type=int, default=10000,
+                help='rows per insert statement')
+def create(sample_data=False, users=1000, bucketlists=10, items=10, seed=0,
+           batch_size=10000):
     "Creates database tables from sqlalchemy models"
     db.create_all()
+    if sample_data:
+        from bucketlist_api.sample_data import generate
+        start = time.time()
+        generate(users=users, bucketlists=bucketlists, items=items,
+                 seed=seed, batch_size=batch_size)
+        print('Added {0} users, {1} bucketlists and {2} items in {3:.1f}s'
+              .format(users, users * bucketlists, users * bucketlists * items,
+                      time.time() - start))
+
+
+@manager.option('--batch_size', dest='batch_size', type=int, default=10000,
+                help='bucketlists checked per transaction')
+def reconcile(batch_size=10000):
+    """Recount the items and done items of every bucketlist."""
+    from bucketlist_api.models import BucketList
+    start = time.time()
+    last_id = db.session.query(db.func.max(BucketList.id)).scalar() or 0
+    fixed = 0
+    for first_id in range(1, last_id + 1, batch_size):
+        fixed += BucketList.reconcile_counts(first_id,
+                                             first_id + batch_size - 1)
+        db.session.commit()
+    print('Fixed the counts of {0} bucketlists in {1:.1f}s'.format(
+        fixed, time.time() - start))
+
+
+@manager.option('--batch_size', dest='batch_size', type=int, default=100,
+                help='bucketlists deleted per transaction')
+def sweep(batch_size=100):
+    """Delete the bucketlists left behind by interrupted account deletions."""
+    from bucketlist_api.deletion import account_deletion
+    start = time.time()
+    deleted = account_deletion.sweep(batch_size)
+    print('Deleted {0} detached bucketlists in {1:.1f}s'.format(
+        deleted, time.time() - start))
 
 
 @manager.command
@@ -30,6 +78,103 @@ def test():
     return test_response
 
 
+def measure(value, width, precision):
+    """Format a benchmark measure, which is None when nothing was timed."""
+    if value is None:
+        return '-'.rjust(width)
+    return '{0:{1}.{2}f}'.format(value, width, precision)
+
+
+@manager.option('-u', '--users', dest='users', type=int, default=10)
+@manager.option('-b', '--bucketlists', dest='bucketlists', type=int,
+                default=50, help='bucketlists per user')
+@manager.option('-i', '--items', dest='items', type=int, default=20,
+                help='items per bucketlist')
+@manager.option('-r', '--requests', dest='requests', type=int, default=200,
+                help='requests sent to each endpoint')
+@manager.option('-w', '--workers', dest='workers', type=int, default=4,
+                help='concurrent clients')
+@manager.option('--rounds', dest='rounds', type=int, default=None,
+                help='password hash rounds, defaults to the app config')
+@manager.option('-s', '--seed', dest='seed', type=int, default=0)
+@manager.option('-o', '--output', dest='output', default='bench.json')
+def bench(users, bucketlists, items, requests, workers, rounds, seed, output):
+    """Benchmark the API endpoints and write the report as JSON."""
+    from benchmarks.api import run
+    report = run(users=users, bucketlists=bucketlists, items=items,
+                 requests=requests, workers=workers, hash_rounds=rounds,
+                 seed_value=seed)
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    for name, result in sorted(report['endpoints'].items()):
+        print('{0:<26} p50 {1}ms  p95 {2}ms  p99 {3}ms  {4} req/s  '
+              '{5} errors'.format(
+                  name, measure(result['p50_ms'], 8, 2),
+                  measure(result['p95_ms'], 8, 2),
+                  measure(result['p99_ms'], 8, 2),
+                  measure(result['throughput'], 8, 1), result['errors']))
+    for name, stats in sorted(report['caches'].items()):
+        print('{0} cache hit ratio {1:.1%}'.format(name, stats['hit_ratio']))
+
+
+@manager.option('-u', '--users', dest='users', type=int, default=10)
+@manager.option('-b', '--bucketlists', dest='bucketlists', type=int,
+                default=20, help='bucketlists per user')
+@manager.option('-i', '--items', dest='items', type=int, default=20,
+                help='items per bucketlist')
+@manager.option('-r', '--requests', dest='requests', type=int, default=200,
+                help='requests sent by each client')
+@manager.option('--readers', dest='readers', type=int, default=4,
+                help='concurrent clients listing items')
+@manager.option('--writers', dest='writers', type=int, default=2,
+                help='concurrent clients creating and updating items')
+@manager.option('-s', '--seed', dest='seed', type=int, default=0)
+@manager.option('-o', '--output', dest='output', default='bench-sqlite.json')
+def bench_sqlite(users, bucketlists, items, requests, readers, writers, seed,
+                 output):
+    """Benchmark concurrent reads and writes under the SQLite PRAGMAs."""
+    from benchmarks.sqlite import run
+    report = run(users=users, bucketlists=bucketlists, items=items,
+                 requests=requests, readers=readers, writers=writers,
+                 seed_value=seed)
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    for name, result in sorted(report['setups'].items()):
+        for kind in ('reads', 'writes'):
+            print('{0:<8} {1:<6} p50 {2}ms  p95 {3}ms  {4} req/s  '
+                  '{5} errors'.format(
+                      name, kind, measure(result[kind]['p50_ms'], 8, 2),
+                      measure(result[kind]['p95_ms'], 8, 2),
+                      measure(result[kind]['throughput'], 8, 1),
+                      result[kind]['errors']))
+
+
+@manager.option('-b', '--bind', dest='bind', default=None,
+                help='host:port to listen on')
+@manager.option('-w', '--workers', dest='workers', type=int, default=None,
+                help='worker processes')
+@manager.option('-t', '--threads', dest='threads', type=int, default=None,
+                help='requests each worker serves at once')
+@manager.option('-k', '--keepalive', dest='keepalive', type=int,
+                default=None, help='seconds an idle connection is kept open')
+@manager.option('--timeout', dest='timeout', type=int, default=None,
+                help='seconds before a silent worker is restarted')
+@manager.option('--graceful_timeout', dest='graceful_timeout', type=int,
+                default=None, help='seconds workers get to finish on reload')
+@manager.option('--max_requests', dest='max_requests', type=int,
+                default=None, help='requests before a worker is replaced')
+def serve(bind, workers, threads, keepalive, timeout, graceful_timeout,
+          max_requests):
+    """Serve the app with pre-forked worker processes, SIGHUP reloads."""
+    from bucketlist_api.server import PreforkServer, server_options
+    options = server_options(app.config, bind=bind, workers=workers,
+                             threads=threads, keepalive=keepalive,
+                             timeout=timeout,
+                             graceful_timeout=graceful_timeout,
+                             max_requests=max_requests)
+    PreforkServer(app, options).run()
+
+
 @manager.shell
 def make_shell_context():
     """Create a Python Shell to test application."""
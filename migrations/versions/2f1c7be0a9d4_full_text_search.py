@@ -0,0 +1,36 @@
+"""full text search
+
+Revision ID: 2f1c7be0a9d4
+Revises: 6b649dabd5fe
+Create Date: 2026-10-18 19:02:11.482913
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f1c7be0a9d4'
+down_revision = '6b649dabd5fe'
+
+from alembic import op
+import sqlalchemy as sa
+from bucketlist_api.search import (SQLITE_CREATE, SQLITE_DROP, SQLITE_REBUILD,
+                                   POSTGRES_CREATE)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_CREATE + SQLITE_REBUILD:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DROP:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.drop_index('ix_items_name_fts', table_name='items')
+        op.drop_index('ix_bucketlist_name_fts', table_name='bucketlist')
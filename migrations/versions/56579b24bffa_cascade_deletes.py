@@ -0,0 +1,55 @@
+"""cascade deletes
+
+Revision ID: 56579b24bffa
+Revises: 8e0ea8714c1d
+Create Date: 2026-10-18 18:54:59.851970
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '56579b24bffa'
+down_revision = '8e0ea8714c1d'
+
+from alembic import op
+import sqlalchemy as sa
+
+# Names the unnamed foreign keys of SQLite so batch mode can drop them
+NAMING_CONVENTION = {
+    'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s',
+}
+FOREIGN_KEYS = [
+    ('bucketlist', 'user_id', 'users'),
+    ('items', 'bucketlist_id', 'bucketlist'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    bind = op.get_bind()
+    sqlite = bind.dialect.name == 'sqlite'
+    if sqlite:
+        # Recreating a parent table with foreign keys enforced would
+        # delete the rows referencing it
+        op.execute('PRAGMA foreign_keys = OFF')
+    inspector = sa.inspect(bind)
+    for table, column, referred in FOREIGN_KEYS:
+        name = NAMING_CONVENTION['fk'] % {'table_name': table,
+                                          'column_0_name': column,
+                                          'referred_table_name': referred}
+        existing = [fk['name'] for fk in inspector.get_foreign_keys(table)
+                    if fk['constrained_columns'] == [column]]
+        with op.batch_alter_table(
+                table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(existing and existing[0] or name,
+                                     type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'],
+                                        ondelete=ondelete)
+    if sqlite:
+        op.execute('PRAGMA foreign_keys = ON')
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
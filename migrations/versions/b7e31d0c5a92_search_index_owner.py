@@ -0,0 +1,34 @@
+"""search index owner
+
+Revision ID: b7e31d0c5a92
+Revises: 029bfa819fef
+Create Date: 2026-10-18 21:40:27.316540
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b7e31d0c5a92'
+down_revision = '029bfa819fef'
+
+from alembic import op
+import sqlalchemy as sa
+from bucketlist_api.search import SQLITE_CREATE, SQLITE_DROP, SQLITE_REBUILD
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_DROP + SQLITE_CREATE + SQLITE_REBUILD:
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_DROP:
+            op.execute(statement)
+        op.execute("CREATE VIRTUAL TABLE bucketlist_fts USING fts5(name)")
+        op.execute("CREATE VIRTUAL TABLE item_fts "
+                   "USING fts5(name, bucketlist_id UNINDEXED)")
+        op.execute("INSERT INTO bucketlist_fts (rowid, name) "
+                   "SELECT id, name FROM bucketlist")
+        op.execute("INSERT INTO item_fts (rowid, name, bucketlist_id) "
+                   "SELECT id, name, bucketlist_id FROM items")
@@ -7,18 +7,34 @@ currentdir = os.path.dirname(os.path.abspath(inspect.
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
+import io
 import json
+import logging
 from base64 import b64encode
-from bucketlist_api.models import User, BucketList, BucketListItem
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from bucketlist_api.models import User, BucketList, BucketListItem, Tombstone
 import unittest
 from bucketlist_api import create_app, db
 from bucketlist_api.api import api
+from bucketlist_api.cache import response_cache, public_feed
 from bucketlist_api.config import TestConfig
+from bucketlist_api.deletion import account_deletion
 from bucketlist_api.resources.bucketlistapi import BucketListAPI
 from bucketlist_api.resources.itemlistapi import ItemListAPI
 from bucketlist_api.resources.createuserapi import CreateUserAPI
 from bucketlist_api.resources.loginuserapi import LoginUserAPI
+from bucketlist_api.resources.accountapi import AccountAPI
 from bucketlist_api.resources.helpapi import HelpAPI
+from bucketlist_api.resources.syncapi import SyncAPI
+from bucketlist_api.resources.exportapi import ExportAPI
+from bucketlist_api.resources.importapi import ImportAPI, Importer, \
+                                                read_lines
+from bucketlist_api.resources.statsapi import StatsAPI
+from bucketlist_api.resources.publicapi import PublicBucketListAPI
+from bucketlist_api.resources.batchapi import BatchAPI
 
 
 def send_post(test_client, url, body, headers=None):
@@ -55,6 +71,25 @@ def authorization_header(token):
     return headers
 
 
+class QueryCounter(object):
+    """Count the SQL statements executed while the context is active."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _count(self, conn, cursor, statement, *args):
+        self.count += 1
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(Engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
 class TestAuthentication(unittest.TestCase):
 
     def setUp(self):
@@ -167,6 +202,38 @@ class TestBucketListAPI(unittest.TestCase):
         self.assertIn('next', response_json)
         self.assertIn('previous', response_json)
 
+    def test_get_bucketlists_cursor(self):
+        headers = authorization_header(self.token)
+        for name in ("For Work", "For Family", "For Fun"):
+            send_post(self.test_client, '/v1/bucketlists', {"name": name},
+                      headers=headers)
+        response, response_json = self.get_bucketlists()
+        total = response_json['pagination']['total']
+        url = '/v1/bucketlists?limit=1&cursor='
+        seen = []
+        while url:
+            response = self.test_client.get(url, headers=headers)
+            response_json = json.loads(response.data.decode('utf-8'))
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response_json['pagination']['total'])
+            seen.extend(b['id'] for b in response_json['bucketlists'])
+            url = response_json['pagination']['next']
+        self.assertEqual(len(seen), total)
+        self.assertEqual(len(set(seen)), total)
+        response = self.test_client.get(response_json['pagination']
+                                        ['previous'], headers=headers)
+        response_json = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(response_json['bucketlists'][0]['id'], seen[-2])
+        BucketList.query.filter(BucketList.name.in_(
+            ["For Work", "For Family", "For Fun"])).delete(
+            synchronize_session=False)
+
+    def test_get_bucketlists_invalid_cursor(self):
+        headers = authorization_header(self.token)
+        response = self.test_client.get('/v1/bucketlists?cursor=invalid',
+                                        headers=headers)
+        self.assertEqual(response.status_code, 400)
+
     def test_get_bucketlists_search(self):
         headers = authorization_header(self.token)
         response = self.test_client.get('/v1/bucketlists?q=travel&limit=200',
@@ -175,6 +242,138 @@ class TestBucketListAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('bucketlist', response_json)
 
+    def test_search_bucketlist_items(self):
+        headers = authorization_header(self.token)
+        response = send_post(self.test_client, '/v1/bucketlists',
+                             {"name": "Hobbies"}, headers=headers)
+        bucketlist = json.loads(response.data.decode('utf-8'))
+        BucketListItem(name="Learn the saxophone",
+                       bucketlist_id=bucketlist['id']).save()
+        response = self.test_client.get('/v1/bucketlists?q=saxo',
+                                        headers=headers)
+        response_json = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['id'] for b in response_json['bucketlists']],
+                         [bucketlist['id']])
+        BucketList.query.get(bucketlist['id']).delete()
+        response = self.test_client.get('/v1/bucketlists?q=saxo',
+                                        headers=headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_other_users_hidden(self):
+        headers = authorization_header(register_a_user(self.test_client,
+                                                       "oboist"))
+        response = send_post(self.test_client, '/v1/bucketlists',
+                             {"name": "Play the oboe"}, headers=headers)
+        bucketlist = json.loads(response.data.decode('utf-8'))
+        BucketListItem(name="Buy an oboe reed",
+                       bucketlist_id=bucketlist['id']).save()
+        response = self.test_client.get('/v1/bucketlists?q=oboe',
+                                        headers=headers)
+        response_json = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([b['id'] for b in response_json['bucketlists']],
+                         [bucketlist['id']])
+        response = self.test_client.get(
+            '/v1/bucketlists?q=oboe', headers=authorization_header(self.token))
+        self.assertEqual(response.status_code, 404)
+        BucketList.query.get(bucketlist['id']).delete()
+        User.query.filter_by(username='oboist').delete()
+        db.session.commit()
+
+    def test_search_rejects_cursor(self):
+        headers = authorization_header(self.token)
+        response = self.test_client.get('/v1/bucketlists?q=travel&cursor=',
+                                        headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('InvalidCursor', response.data.decode('utf-8'))
+
+    def test_search_query_syntax_ignored(self):
+        headers = authorization_header(self.token)
+        response = self.test_client.get('/v1/bucketlists?q="travel*(',
+                                        headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_bucketlists_item_preview(self):
+        headers = authorization_header(self.token)
+        bucketlist_id = json.loads(self.response.data.decode('utf-8'))['id']
+        for name in ("Visit Accra", "Visit Kano", "Visit Lome"):
+            BucketListItem(name=name, bucketlist_id=bucketlist_id).save()
+        count = BucketList.query.get(bucketlist_id).items.count()
+        url = '/v1/bucketlists/%d?items=' % bucketlist_id
+        response = self.test_client.get(url + 'count', headers=headers)
+        bucketlist = json.loads(response.data.decode('utf-8'))[
+            'bucketlists'][0]
+        self.assertEqual(bucketlist['item_count'], count)
+        self.assertEqual(bucketlist['done_count'], 0)
+        self.assertNotIn('items', bucketlist)
+        response = self.test_client.get(url + '2', headers=headers)
+        bucketlist = json.loads(response.data.decode('utf-8'))[
+            'bucketlists'][0]
+        self.assertEqual(bucketlist['item_count'], count)
+        self.assertEqual(len(bucketlist['items']), 2)
+        response = self.test_client.get(url + 'all', headers=headers)
+        self.assertEqual(response.status_code, 400)
+        BucketListItem.query.filter_by(bucketlist_id=bucketlist_id).delete()
+        db.session.commit()
+
+    def test_conditional_get_etag(self):
+        headers = authorization_header(self.token)
+        response = self.test_client.get('/v1/bucketlists', headers=headers)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        headers['If-None-Match'] = etag
+        with QueryCounter() as counter:
+            response = self.test_client.get('/v1/bucketlists',
+                                            headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(counter.count, 0)
+        response_cache.init_app(self.app)
+        with QueryCounter() as counter:
+            response = self.test_client.get('/v1/bucketlists',
+                                            headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(counter.count, 1)
+        response = self.test_client.get('/v1/bucketlists?limit=1',
+                                        headers=headers)
+        self.assertEqual(response.status_code, 200)
+        bucketlist_id = json.loads(self.response.data.decode('utf-8'))['id']
+        BucketListItem(name="Visit Accra", bucketlist_id=bucketlist_id).save()
+        response = self.test_client.get('/v1/bucketlists', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        BucketListItem.query.filter_by(bucketlist_id=bucketlist_id).delete()
+        db.session.commit()
+
+    def test_conditional_get_last_modified(self):
+        headers = authorization_header(self.token)
+        bucketlist_id = json.loads(self.response.data.decode('utf-8'))['id']
+        item = BucketListItem(name="Visit Accra", bucketlist_id=bucketlist_id)
+        item.save()
+        BucketList.query.filter_by(id=bucketlist_id).update(
+            {'date_modified': datetime(2016, 1, 1)})
+        BucketListItem.query.filter_by(bucketlist_id=bucketlist_id).update(
+            {'date_modified': datetime(2016, 1, 1)})
+        db.session.commit()
+        url = '/v1/bucketlists/%d' % bucketlist_id
+        response = self.test_client.get(url, headers=headers)
+        self.assertEqual(response.headers['Last-Modified'],
+                         'Fri, 01 Jan 2016 00:00:00 GMT')
+        headers['If-Modified-Since'] = response.headers['Last-Modified']
+        response = self.test_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        item.update(name="Visit Kano")
+        response = self.test_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        headers['If-None-Match'] = response.headers['ETag']
+        BucketListItem.mark_done(bucketlist_id, [item.id], True)
+        response = self.test_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        del headers['If-None-Match']
+        item.delete()
+        response = self.test_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response.headers)
+
     def test_get_single_bucketlist(self):
         response, response_json = self.get_bucketlists("1")
         self.assertEqual(response.status_code, 200)
@@ -233,8 +432,8 @@ class TestItemAPI(unittest.TestCase):
         self.response = self.post_an_item()
 
     def tearDown(self):
+        # The database deletes the bucketlist of the user with it
         User.query.filter_by(username='adeyimalik').delete()
-        BucketList.query.filter_by(id=1).delete()
         db.session.commit()
 
     def put_item(self, headers, id):
@@ -259,7 +458,8 @@ class TestItemAPI(unittest.TestCase):
     def test_post_item(self):
         self.assertEqual(self.response.status_code, 201)
         response_json = json.loads(self.response.data.decode('utf-8'))
-        self.assertGreater(len(response_json['items']), 0)
+        self.assertEqual(response_json['name'], "Visit Brazil")
+        self.assertFalse(response_json['done'])
 
     def test_post_item_invalid(self):
         headers = authorization_header(self.token)
@@ -279,7 +479,134 @@ class TestItemAPI(unittest.TestCase):
         response = self.put_item(headers, '1')
         response_json = json.loads(response.data.decode('utf-8'))
         self.assertEqual(response.status_code, 200)
-        self.assertGreater(len(response_json['items']), 0)
+        self.assertEqual(response_json['id'], 1)
+        self.assertEqual(response_json['name'], "Climb the Eiffel Tower")
+        self.assertTrue(response_json['done'])
+
+    def test_item_writes_load_with_one_query(self):
+        headers = authorization_header(self.token)
+        self.put_item(headers, '1')
+        for write in (lambda: self.put_item(headers, '1'),
+                      lambda: self.test_client.delete(
+                          '/v1/bucketlists/1/items/1', headers=headers)):
+            with QueryCounter() as counter:
+                response = write()
+            self.assertLess(response.status_code, 300)
+            selects = [statement for statement in counter.statements
+                       if statement.startswith('SELECT')]
+            self.assertEqual(len(selects), 1)
+            self.assertIn('JOIN items', counter.statements[0])
+            self.assertFalse([statement for statement in selects
+                              if 'FROM users' in statement])
+
+    def test_update_missing_item(self):
+        headers = authorization_header(self.token)
+        response = self.put_item(headers, '10')
+        self.assertEqual(response.status_code, 404)
+
+    def post_items(self, names):
+        headers = authorization_header(self.token)
+        return send_post(self.test_client, '/v1/bucketlists/1/items',
+                         [{"name": name} for name in names], headers=headers)
+
+    def patch_items(self, url, body):
+        return self.test_client.patch(url, data=json.dumps(body),
+                                      content_type="application/json",
+                                      headers=authorization_header(self.token))
+
+    def test_post_items_batch(self):
+        response = self.post_items(["Learn Yoruba", "Run a marathon"])
+        self.assertEqual(response.status_code, 201)
+        response_json = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([item['name'] for item in response_json['items']],
+                         ["Learn Yoruba", "Run a marathon"])
+        self.assertFalse(response_json['items'][0]['done'])
+
+    def test_post_items_batch_invalid(self):
+        count = BucketListItem.query.count()
+        headers = authorization_header(self.token)
+        response = send_post(self.test_client, '/v1/bucketlists/1/items',
+                             [{"name": "Learn Yoruba"}, {"done": 1}],
+                             headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BucketListItem.query.count(), count)
+
+    def test_patch_items(self):
+        response = self.post_items(["Learn Yoruba", "Run a marathon",
+                                    "Visit Kano"])
+        ids = [item['id'] for item in
+               json.loads(response.data.decode('utf-8'))['items']]
+        with QueryCounter() as counter:
+            response = self.patch_items('/v1/bucketlists/1/items',
+                                        {"ids": ids[:2], "done": True})
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(response.data.decode('utf-8'))['items']
+        self.assertEqual([item['id'] for item in items], ids[:2])
+        self.assertTrue(all(item['done'] for item in items))
+        self.assertFalse(BucketListItem.query.get(ids[2]).done)
+        updates = [statement for statement in counter.statements
+                   if statement.startswith('UPDATE items')]
+        self.assertEqual(len(updates), 1)
+
+    def test_patch_item(self):
+        response = self.patch_items('/v1/bucketlists/1/items/1',
+                                    {"done": 1})
+        self.assertEqual(response.status_code, 200)
+        items = json.loads(response.data.decode('utf-8'))['items']
+        self.assertEqual([item['id'] for item in items], [1])
+        response = self.patch_items('/v1/bucketlists/1/items/100',
+                                    {"done": 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_patch_items_invalid(self):
+        response = self.patch_items('/v1/bucketlists/1/items',
+                                    {"ids": [1]})
+        self.assertEqual(response.status_code, 400)
+        response = self.patch_items('/v1/bucketlists/1/items',
+                                    {"ids": ["one"], "done": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def get_items(self, url):
+        response = self.test_client.get(
+            url, headers=authorization_header(self.token))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))
+
+    def test_get_items(self):
+        self.post_items(["Learn Yoruba", "Run a marathon"])
+        count = BucketListItem.query.filter_by(bucketlist_id=1).count()
+        response_json = self.get_items('/v1/bucketlists/1/items?limit=1')
+        self.assertEqual(len(response_json['items']), 1)
+        self.assertEqual(response_json['pagination']['total'], count)
+        self.assertIn('next', response_json['pagination'])
+        response_json = self.get_items('/v1/bucketlists/1/items/1')
+        self.assertEqual(response_json['id'], 1)
+
+    def test_get_items_cursor_descending(self):
+        self.post_items(["Learn Yoruba", "Run a marathon", "Visit Kano"])
+        expected = [item.id for item in BucketListItem.query.filter_by(
+            bucketlist_id=1).order_by(BucketListItem.date_created.desc(),
+                                      BucketListItem.id.desc())]
+        url = '/v1/bucketlists/1/items?limit=2&order=desc&cursor='
+        seen = []
+        while url:
+            response_json = self.get_items(url)
+            seen.extend(item['id'] for item in response_json['items'])
+            url = response_json['pagination']['next']
+        self.assertEqual(seen, expected)
+
+    def test_get_items_done_filter(self):
+        response = self.post_items(["Learn Yoruba", "Run a marathon"])
+        ids = [item['id'] for item in
+               json.loads(response.data.decode('utf-8'))['items']]
+        self.patch_items('/v1/bucketlists/1/items',
+                         {"ids": ids[:1], "done": True})
+        response_json = self.get_items('/v1/bucketlists/1/items?done=1')
+        self.assertIn(ids[0], [item['id'] for item in response_json['items']])
+        self.assertTrue(all(item['done'] for item in response_json['items']))
+        response_json = self.get_items('/v1/bucketlists/1/items?done=0')
+        self.assertNotIn(ids[0],
+                         [item['id'] for item in response_json['items']])
 
     def test_update_item_invalid(self):
         headers = authorization_header(self.token)
@@ -312,6 +639,870 @@ class TestItemAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 403)
 
 
+class TestBucketListQueries(unittest.TestCase):
+
+    def setUp(self):
+        # Cached responses run no query, every measured request must miss
+        self.app = create_app(type('QueryConfig', (TestConfig,),
+                                   {'RESPONSE_CACHE_SIZE': 0}))
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.token = register_a_user(self.test_client, "querycounter")
+        self.headers = authorization_header(self.token)
+        user = User.query.filter_by(username="querycounter").first()
+        for number in range(5):
+            bucketlist = BucketList(name="List %d" % number, user_id=user.id)
+            db.session.add(bucketlist)
+            for item in range(3):
+                bucketlist.items.append(BucketListItem(name="Item %d" % item))
+        db.session.commit()
+
+    def tearDown(self):
+        user = User.query.filter_by(username='querycounter').first()
+        user.delete()
+
+    def count_queries(self, url):
+        self.test_client.get(url, headers=self.headers)
+        with QueryCounter() as counter:
+            response = self.test_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertTrue(counter.count)
+        return counter.count
+
+    def test_list_query_count_constant(self):
+        self.assertEqual(self.count_queries('/v1/bucketlists?limit=1'),
+                         self.count_queries('/v1/bucketlists?limit=5'))
+
+    def test_list_cursor_query_count_constant(self):
+        self.assertEqual(
+            self.count_queries('/v1/bucketlists?limit=1&cursor='),
+            self.count_queries('/v1/bucketlists?limit=5&cursor='))
+
+    def test_writes_do_not_reload_rows(self):
+        with QueryCounter() as counter:
+            response = send_post(self.test_client, '/v1/bucketlists',
+                                 {"name": "Written once"},
+                                 headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        created = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(created['name'], "Written once")
+        self.assertTrue(created['date_created'])
+        self.assertTrue(created['date_modified'])
+        self.assertFalse([statement for statement in counter.statements
+                          if statement.startswith('SELECT bucketlist.')])
+        with QueryCounter() as counter:
+            response = self.test_client.put(
+                '/v1/bucketlists/%d' % created['id'],
+                data=json.dumps({"name": "Written twice"}),
+                content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['name'],
+                         "Written twice")
+        # Only the lookup of the bucketlist, it isn't read after the update
+        self.assertEqual(len([statement for statement in counter.statements
+                              if statement.startswith('SELECT bucketlist.')]),
+                         1)
+        self.assertEqual(BucketList.query.get(created['id']).name,
+                         "Written twice")
+
+    def test_delete_cascades_in_database(self):
+        bucketlist = BucketList.query.filter_by(name="List 0").first()
+        bucketlist_id = bucketlist.id
+        with QueryCounter() as counter:
+            response = self.test_client.delete(
+                '/v1/bucketlists/%d' % bucketlist_id, headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual([statement for statement in counter.statements
+                          if statement.startswith('SELECT items.')], [])
+        self.assertEqual([statement for statement in counter.statements
+                          if statement.startswith('DELETE FROM items')], [])
+        self.assertEqual(BucketListItem.query.filter_by(
+            bucketlist_id=bucketlist_id).count(), 0)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
+                         '/bucketlists/<int:bucketlist_id>/items/'
+                         '<int:item_id>', endpoint='items')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.token = register_a_user(self.test_client, "cachedresponses")
+        self.headers = authorization_header(self.token)
+        response = post_a_bucketlist(self.test_client, self.token)
+        self.bucketlist_id = json.loads(response.data.decode('utf-8'))['id']
+
+    def tearDown(self):
+        user = User.query.filter_by(username='cachedresponses').first()
+        user.delete()
+
+    def get(self, url='/v1/bucketlists'):
+        response = self.test_client.get(url, headers=self.headers)
+        return response, json.loads(response.data.decode('utf-8'))
+
+    def test_cache_hit(self):
+        response, first = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        with QueryCounter() as counter:
+            response, second = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(first, second)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        response, third = self.get('/v1/bucketlists?limit=1')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+
+    def test_write_invalidates(self):
+        self.get()
+        post_a_bucketlist(self.test_client, self.token)
+        response, page = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(page['bucketlists']), 2)
+        send_post(self.test_client,
+                  '/v1/bucketlists/%d/items' % self.bucketlist_id,
+                  [{"name": "Visit Kano"}], headers=self.headers)
+        response, page = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        item = page['bucketlists'][0]['items'][0]
+        self.test_client.patch(
+            '/v1/bucketlists/%d/items' % self.bucketlist_id,
+            data=json.dumps({"ids": [item['id']], "done": 1}),
+            content_type="application/json", headers=self.headers)
+        response, page = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertTrue(page['bucketlists'][0]['items'][0]['done'])
+
+    def test_other_users_unaffected(self):
+        self.get()
+        token = register_a_user(self.test_client, "cachedneighbour")
+        post_a_bucketlist(self.test_client, token)
+        response, page = self.get()
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        User.query.filter_by(username="cachedneighbour").first().delete()
+
+
+class TestSyncAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.config['SYNC_OVERLAP_SECONDS'] = 0
+        self.app.config['SYNC_BATCH_SIZE'] = 2
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        api.add_resource(SyncAPI, '/sync', endpoint='sync')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.token = register_a_user(self.test_client, "syncer")
+        self.headers = authorization_header(self.token)
+        self.user = User.query.filter_by(username="syncer").first()
+        Tombstone.query.filter_by(user_id=self.user.id).delete()
+        self.bucketlists = []
+        for number in range(3):
+            bucketlist = BucketList(name="Sync %d" % number,
+                                    user_id=self.user.id).save()
+            self.bucketlists.append(bucketlist)
+            BucketListItem.save_all([
+                BucketListItem(name="Item %d" % item,
+                               bucketlist_id=bucketlist.id)
+                for item in range(2)])
+
+    def tearDown(self):
+        User.query.filter_by(username='syncer').first().delete()
+
+    def sync(self, since=None):
+        url = '/v1/sync'
+        if since is not None:
+            url += '?since=' + since
+        response = self.test_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))
+
+    def test_full_sync(self):
+        changes = self.sync()
+        self.assertEqual(sorted(b['id'] for b in changes['bucketlists']),
+                         sorted(b.id for b in self.bucketlists))
+        self.assertEqual(len(changes['items']), 6)
+        self.assertEqual(changes['deleted'], [])
+        self.assertNotIn('items', changes['bucketlists'][0])
+
+    def test_changes_since(self):
+        token = self.sync()['next']
+        changes = self.sync(token)
+        self.assertTrue(changes.pop('next'))
+        self.assertEqual(changes, {'deleted': [], 'bucketlists': [],
+                                   'items': []})
+        first, second = [BucketList.query.get(bucketlist.id)
+                         for bucketlist in self.bucketlists[:2]]
+        first.update(name="Renamed")
+        item = second.items.first()
+        item_id = item.id
+        item.delete()
+        changes = self.sync(token)
+        # Deleting an item modifies its bucketlist too
+        self.assertEqual([b['id'] for b in changes['bucketlists']],
+                         [first.id, second.id])
+        self.assertEqual(changes['items'], [])
+        self.assertEqual(changes['deleted'][0]['type'], 'item')
+        self.assertEqual(changes['deleted'][0]['id'], item_id)
+        self.assertEqual(changes['deleted'][0]['bucketlist_id'], second.id)
+        token = changes['next']
+        second = BucketList.query.get(second.id)
+        second.delete()
+        changes = self.sync(token)
+        self.assertEqual([(d['type'], d['id']) for d in changes['deleted']],
+                         [('bucketlist', second.id)])
+
+    def test_invalid_token(self):
+        response = self.test_client.get('/v1/sync?since=invalid',
+                                        headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+class TestExportAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.config['EXPORT_BATCH_SIZE'] = 2
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(ExportAPI, '/export', endpoint='export')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "exporter"))
+        register_a_user(self.test_client, "bystander")
+        self.user = User.query.filter_by(username="exporter").first()
+        other = User.query.filter_by(username="bystander").first()
+        self.bucketlist_ids = []
+        for number, items in enumerate([2, 0, 3]):
+            bucketlist = BucketList(name="Export %d" % number,
+                                    user_id=self.user.id).save()
+            self.bucketlist_ids.append(bucketlist.id)
+            BucketListItem.save_all([
+                BucketListItem(name="Item %d" % item,
+                               bucketlist_id=bucketlist.id)
+                for item in range(items)])
+        bucketlist = BucketList(name="Not exported", user_id=other.id).save()
+        BucketListItem(name="Not exported", bucketlist_id=bucketlist.id).save()
+
+    def tearDown(self):
+        for username in ('exporter', 'bystander'):
+            User.query.filter_by(username=username).first().delete()
+
+    def test_export(self):
+        response = self.test_client.get('/v1/export', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        lines = [json.loads(line) for line in
+                 response.data.decode('utf-8').splitlines()]
+        self.assertEqual([line['type'] for line in lines],
+                         ['bucketlist', 'item', 'item', 'bucketlist',
+                          'bucketlist', 'item', 'item', 'item'])
+        self.assertEqual([line['id'] for line in lines
+                          if line['type'] == 'bucketlist'],
+                         self.bucketlist_ids)
+        bucketlist_id = None
+        for line in lines:
+            if line['type'] == 'bucketlist':
+                bucketlist_id = line['id']
+            else:
+                self.assertEqual(line['bucketlist_id'], bucketlist_id)
+        self.assertNotIn('Not exported', response.data.decode('utf-8'))
+
+    def test_export_requires_login(self):
+        response = self.test_client.get('/v1/export')
+        self.assertEqual(response.status_code, 403)
+
+
+class TestImportAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.config['IMPORT_BATCH_SIZE'] = 2
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        api.add_resource(ExportAPI, '/export', endpoint='export')
+        api.add_resource(ImportAPI, '/import', endpoint='import')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "importer"))
+        self.user = User.query.filter_by(username="importer").first()
+
+    def tearDown(self):
+        User.query.filter_by(username='importer').first().delete()
+
+    def send_import(self, lines):
+        data = ''.join(json.dumps(line) + '\n' if not isinstance(line, str)
+                       else line + '\n' for line in lines)
+        response = self.test_client.post('/v1/import', data=data,
+                                         headers=self.headers,
+                                         content_type='application/x-ndjson')
+        return response, json.loads(response.data.decode('utf-8'))
+
+    def test_import(self):
+        response, report = self.send_import([
+            {'type': 'bucketlist', 'id': 7, 'name': 'Imported travels',
+             'is_public': True, 'date_created': '2016-02-01T10:00:00.5'},
+            {'type': 'item', 'bucketlist_id': 7, 'name': 'Visit Kano'},
+            {'type': 'bucketlist', 'id': 9, 'name': 'Imported skills'},
+            {'type': 'item', 'name': 'Learn Yoruba', 'done': 1},
+            {'type': 'item', 'bucketlist_id': 7, 'name': 'Visit Jos',
+             'date_created': '2016-02-02T10:00:00+01:00'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(report, {'bucketlists': 2, 'items': 3,
+                                  'error_count': 0, 'errors': []})
+        travels, skills = self.user.bucketlists.order_by(BucketList.id)
+        self.assertEqual(travels.name, 'Imported travels')
+        self.assertTrue(travels.is_public)
+        self.assertEqual(travels.date_created,
+                         datetime(2016, 2, 1, 10, 0, 0, 500000))
+        self.assertEqual([(item.name, item.date_created) for item in
+                          travels.items.order_by(BucketListItem.id)],
+                         [('Visit Kano', travels.date_modified),
+                          ('Visit Jos', datetime(2016, 2, 2, 9))])
+        self.assertEqual([(item.name, item.done) for item in skills.items],
+                         [('Learn Yoruba', True)])
+        response = self.test_client.get('/v1/bucketlists?q=yoruba',
+                                        headers=self.headers)
+        bucketlists = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([bucketlist['id'] for bucketlist in
+                          bucketlists['bucketlists']], [skills.id])
+
+    def test_import_reports_invalid_lines(self):
+        response, report = self.send_import([
+            {'type': 'bucketlist', 'id': 1, 'name': ''},
+            {'type': 'item', 'name': 'Orphan'},
+            'not json',
+            {'type': 'bucketlist', 'id': 2, 'name': 'Valid'},
+            {'type': 'item', 'name': 'Valid item', 'done': 'maybe'},
+            {'type': 'item', 'bucketlist_id': 1, 'name': 'Orphan too'},
+            {'type': 'user', 'name': 'Unknown'},
+            {'type': 'item', 'name': 'Bad date', 'date_created': 'May'},
+            {'type': 'item', 'name': 'Valid item'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(report['bucketlists'], 1)
+        self.assertEqual(report['items'], 1)
+        self.assertEqual(report['error_count'], 7)
+        self.assertEqual([error['line'] for error in report['errors']],
+                         [1, 2, 3, 5, 6, 7, 8])
+
+    def test_import_nothing(self):
+        response, report = self.send_import(['[]'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(report['errors'],
+                         [{'line': 1, 'message': 'not a JSON object'}])
+
+    def test_import_reads_before_writing(self):
+        lines = [{'type': 'bucketlist', 'name': 'Read first'},
+                 {'type': 'item', 'name': 'Then written'}]
+        body = io.BytesIO(b''.join(json.dumps(line).encode('utf-8') + b'\n'
+                                   for line in lines))
+        importer = Importer(self.user.id, 2, 10)
+        with QueryCounter() as counter:
+            importer.read(read_lines(body))
+        self.assertEqual(counter.count, 0)
+        read_at = datetime.utcnow()
+        importer.write()
+        db.session.commit()
+        importer.close()
+        bucketlist = self.user.bucketlists.one()
+        self.assertGreaterEqual(bucketlist.date_modified, read_at)
+        self.assertGreaterEqual(bucketlist.items.one().date_modified, read_at)
+
+    def test_export_import_round_trip(self):
+        bucketlist = BucketList(name="Round trip", user_id=self.user.id).save()
+        BucketListItem.save_all([
+            BucketListItem(name="Item %d" % item, done=item % 2 == 0,
+                           bucketlist_id=bucketlist.id) for item in range(3)])
+        exported = self.test_client.get('/v1/export', headers=self.headers)
+        response = self.test_client.post('/v1/import', data=exported.data,
+                                         headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        original, copy = self.user.bucketlists.order_by(BucketList.id)
+        self.assertNotEqual(original.id, copy.id)
+        self.assertEqual(copy.date_created, original.date_created)
+        self.assertEqual(
+            [(item.name, item.done, item.date_created)
+             for item in copy.items.order_by(BucketListItem.id)],
+            [(item.name, item.done, item.date_created)
+             for item in original.items.order_by(BucketListItem.id)])
+
+
+class TestAccountAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(AccountAPI, '/account', endpoint='account')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "leaver"))
+        user = User.query.filter_by(username="leaver").first()
+        self.user_id = user.id
+        self.bucketlist_ids = []
+        for number in range(3):
+            bucketlist = BucketList(name="Leaving %d" % number,
+                                    user_id=user.id).save()
+            self.bucketlist_ids.append(bucketlist.id)
+            BucketListItem.save_all([
+                BucketListItem(name="Item %d" % item,
+                               bucketlist_id=bucketlist.id)
+                for item in range(2)])
+
+    def tearDown(self):
+        user = User.query.filter_by(username='leaver').first()
+        if user is not None:
+            user.delete()
+
+    def assertAccountDeleted(self):
+        self.assertIsNone(User.query.get(self.user_id))
+        self.assertEqual(BucketList.query.filter(
+            BucketList.id.in_(self.bucketlist_ids)).count(), 0)
+        self.assertEqual(BucketListItem.query.filter(
+            BucketListItem.bucketlist_id.in_(self.bucketlist_ids)).count(), 0)
+        self.assertEqual(Tombstone.query.filter_by(
+            user_id=self.user_id).count(), 0)
+        response = self.test_client.get('/v1/bucketlists',
+                                        headers=self.headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_delete_account(self):
+        BucketList.query.get(self.bucketlist_ids[0]).items.first().delete()
+        response = self.test_client.delete('/v1/account',
+                                           headers=self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertAccountDeleted()
+
+    def test_delete_large_account_in_batches(self):
+        self.app.config['ACCOUNT_DELETE_ASYNC_ITEMS'] = 5
+        self.app.config['ACCOUNT_DELETE_BATCH_SIZE'] = 2
+        with QueryCounter() as counter:
+            response = self.test_client.delete('/v1/account',
+                                               headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        deletes = [statement for statement in counter.statements
+                   if statement.startswith('DELETE FROM bucketlist WHERE')]
+        self.assertEqual(len(deletes), 2)
+        self.assertAccountDeleted()
+
+    def test_sweep_detached_bucketlists(self):
+        self.app.config['ACCOUNT_DELETE_ASYNC_ITEMS'] = 5
+        # The batches are never deleted, as when the worker dies
+        account_deletion._delete_bucketlists = lambda ids, batch_size: None
+        try:
+            response = self.test_client.delete('/v1/account',
+                                               headers=self.headers)
+        finally:
+            del account_deletion._delete_bucketlists
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(BucketList.query.filter(
+            BucketList.id.in_(self.bucketlist_ids)).count(), 3)
+        self.assertEqual(account_deletion.sweep(2), 3)
+        self.assertAccountDeleted()
+        self.assertEqual(account_deletion.sweep(2), 0)
+
+
+class TestStatsAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
+                         '/bucketlists/<int:bucketlist_id>/items/'
+                         '<int:item_id>', endpoint='items')
+        api.add_resource(ImportAPI, '/import', endpoint='import')
+        api.add_resource(StatsAPI, '/stats', endpoint='stats')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "counter"))
+        self.user = User.query.filter_by(username="counter").first()
+        self.first = BucketList(name="First", user_id=self.user.id).save().id
+        self.second = BucketList(name="Second", user_id=self.user.id).save().id
+
+    def tearDown(self):
+        User.query.filter_by(username='counter').first().delete()
+
+    def items_url(self, bucketlist_id, item_id=None):
+        url = '/v1/bucketlists/%d/items' % bucketlist_id
+        return url if item_id is None else '%s/%d' % (url, item_id)
+
+    def send(self, method, url, body):
+        response = getattr(self.test_client, method)(
+            url, data=json.dumps(body), content_type="application/json",
+            headers=self.headers)
+        self.assertLess(response.status_code, 300)
+        return json.loads(response.data.decode('utf-8'))
+
+    def stats(self):
+        response = self.test_client.get('/v1/stats', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))
+
+    def test_counts_follow_item_writes(self):
+        self.send('post', self.items_url(self.first), {"name": "One"})
+        items = self.send('post', self.items_url(self.first), [
+            {"name": "Two", "done": 1}, {"name": "Three"},
+            {"name": "Four"}])['items']
+        self.send('put', self.items_url(self.first, items[1]['id']),
+                  {"done": 1})
+        self.send('patch', self.items_url(self.first),
+                  {"ids": [items[1]['id'], items[2]['id']], "done": 1})
+        self.send('patch', self.items_url(self.first),
+                  {"ids": [items[0]['id']], "done": 0})
+        self.test_client.delete(self.items_url(self.first, items[2]['id']),
+                                headers=self.headers)
+        self.test_client.post('/v1/import', headers=self.headers, data=(
+            '{"type": "bucketlist", "name": "Imported"}\n'
+            '{"type": "item", "name": "Done", "done": true}\n'
+            '{"type": "item", "name": "Not done"}\n'))
+        stats = self.stats()
+        self.assertEqual([(b['name'], b['item_count'], b['done_count'])
+                          for b in stats['bucketlists']],
+                         [("First", 3, 1), ("Second", 0, 0),
+                          ("Imported", 2, 1)])
+        self.assertEqual(stats['total'], {'bucketlists': 3, 'items': 5,
+                                          'done': 2, 'completed': 0})
+        self.assertEqual(BucketList.reconcile_counts(), 0)
+
+    def test_stats_do_not_read_items(self):
+        self.send('post', self.items_url(self.second), [
+            {"name": "Done", "done": 1}])
+        with QueryCounter() as counter:
+            stats = self.stats()
+        self.assertEqual(stats['total']['completed'], 1)
+        self.assertFalse([statement for statement in counter.statements
+                          if 'items' in statement])
+
+
+class TestPublicAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
+                         '/bucketlists/<int:bucketlist_id>/items/'
+                         '<int:item_id>', endpoint='items')
+        api.add_resource(PublicBucketListAPI, '/public/bucketlists',
+                         endpoint='public')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "publisher"))
+
+    def tearDown(self):
+        User.query.filter_by(username='publisher').first().delete()
+
+    def send(self, method, url, body):
+        response = getattr(self.test_client, method)(
+            url, data=json.dumps(body), content_type="application/json",
+            headers=self.headers)
+        self.assertLess(response.status_code, 300)
+        return json.loads(response.data.decode('utf-8'))
+
+    def post_bucketlist(self, name, is_public=True):
+        return self.send('post', '/v1/bucketlists',
+                         {"name": name, "is_public": is_public})['id']
+
+    def feed(self, url='/v1/public/bucketlists'):
+        response = self.test_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, json.loads(response.data.decode('utf-8'))
+
+    def test_feed_lists_public_bucketlists(self):
+        first = self.post_bucketlist("First")
+        self.post_bucketlist("Private", False)
+        self.post_bucketlist("Last")
+        self.send('post', '/v1/bucketlists/%d/items' % first,
+                  {"name": "Visit Kano", "done": 1})
+        response, feed = self.feed()
+        self.assertEqual([(b['name'], b['owner'], b['item_count'],
+                           b['done_count']) for b in feed['bucketlists']],
+                         [("Last", "publisher", 0, 0),
+                          ("First", "publisher", 1, 1)])
+        self.assertIsNone(feed['pagination']['next'])
+
+    def test_feed_follows_writes(self):
+        first = self.post_bucketlist("First")
+        second = self.post_bucketlist("Second", False)
+        third = self.post_bucketlist("Third")
+        response, feed = self.feed()
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        with QueryCounter() as counter:
+            response, cached = self.feed()
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(cached, feed)
+        self.send('post', '/v1/bucketlists/%d/items' % first,
+                  {"name": "Visit Kano"})
+        self.send('put', '/v1/bucketlists/%d' % second, {"is_public": True})
+        self.send('put', '/v1/bucketlists/%d' % third, {"is_public": False})
+        with QueryCounter() as counter:
+            response, feed = self.feed()
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(counter.count, 1)
+        self.assertEqual([(b['name'], b['item_count'])
+                          for b in feed['bucketlists']],
+                         [("Second", 0), ("First", 1)])
+        self.test_client.delete('/v1/bucketlists/%d' % second,
+                                headers=self.headers)
+        response, feed = self.feed()
+        self.assertEqual([b['id'] for b in feed['bucketlists']], [first])
+
+    def test_keyset_pagination(self):
+        public_feed.size = 2
+        ids = [self.post_bucketlist("Bucketlist %d" % n) for n in range(5)]
+        ids.reverse()
+        self.feed()
+        url, seen, caches = '/v1/public/bucketlists?limit=2', [], []
+        while url:
+            response, feed = self.feed(url)
+            seen.extend(b['id'] for b in feed['bucketlists'])
+            caches.append(response.headers['X-Cache'])
+            url = feed['pagination'].get('next')
+        self.assertEqual(seen, ids)
+        self.assertEqual(caches, ['HIT', 'MISS', 'MISS'])
+        self.assertEqual(public_feed.stats()['size'], 2)
+        # The head follows bucketlists made public past its oldest entry
+        self.send('put', '/v1/bucketlists/%d' % ids[0], {"is_public": False})
+        response, feed = self.feed('/v1/public/bucketlists?limit=2')
+        self.assertEqual([b['id'] for b in feed['bucketlists']], ids[1:3])
+
+    def test_invalid_cursor(self):
+        response = self.test_client.get('/v1/public/bucketlists?cursor=bad')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBatchAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        api.add_resource(ItemListAPI, '/bucketlists/<int:bucketlist_id>/items',
+                         '/bucketlists/<int:bucketlist_id>/items/'
+                         '<int:item_id>', endpoint='items')
+        api.add_resource(ImportAPI, '/import', endpoint='import')
+        api.add_resource(BatchAPI, '/batch', endpoint='batch')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.headers = authorization_header(
+            register_a_user(self.test_client, "batcher"))
+        self.user = User.query.filter_by(username="batcher").first()
+        self.bucketlist_id = BucketList(name="Travel",
+                                        user_id=self.user.id).save().id
+
+    def tearDown(self):
+        User.query.filter_by(username='batcher').first().delete()
+
+    def batch(self, body, status=200):
+        response = send_post(self.test_client, '/v1/batch', body,
+                             self.headers)
+        self.assertEqual(response.status_code, status)
+        return json.loads(response.data.decode('utf-8'))
+
+    def bucketlist_names(self):
+        return [bucketlist.name for bucketlist in
+                BucketList.query.filter_by(user_id=self.user.id)]
+
+    def test_batch_runs_requests(self):
+        items_url = '/v1/bucketlists/%d/items' % self.bucketlist_id
+        result = self.batch([
+            {"method": "POST", "url": "/v1/bucketlists",
+             "body": {"name": "Learn"}},
+            {"method": "POST", "url": items_url,
+             "body": [{"name": "Visit Kano"}, {"name": "Visit Jos"}]},
+            {"url": items_url + "?done=0&limit=1"},
+            {"url": "/v1/bucketlists/0/items"},
+            {"method": "POST", "url": "/v1/import",
+             "body": '{"type": "bucketlist", "name": "Imported"}\n'},
+        ])
+        statuses = [response['status'] for response in result['responses']]
+        self.assertEqual(statuses, [201, 201, 200, 404, 201])
+        self.assertEqual(result['responses'][0]['body']['name'], "Learn")
+        page = result['responses'][2]['body']
+        self.assertEqual([item['name'] for item in page['items']],
+                         ["Visit Kano"])
+        self.assertIn('next', page['pagination'])
+        self.assertEqual(sorted(self.bucketlist_names()),
+                         ["Imported", "Learn", "Travel"])
+
+    def test_batch_authenticates_once(self):
+        verify_token = User.verify_token
+        calls = []
+
+        def counting_verify_token(token):
+            calls.append(token)
+            return verify_token(token)
+        User.verify_token = staticmethod(counting_verify_token)
+        try:
+            result = self.batch([{"url": "/v1/bucketlists"}] * 3)
+        finally:
+            User.verify_token = staticmethod(verify_token)
+        self.assertEqual([response['status']
+                          for response in result['responses']], [200] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_atomic_batch_rolls_back(self):
+        result = self.batch({"atomic": True, "requests": [
+            {"method": "POST", "url": "/v1/bucketlists",
+             "body": {"name": "Learn"}},
+            {"method": "PUT", "url": "/v1/bucketlists/%d" %
+             self.bucketlist_id, "body": {"name": "Renamed"}},
+            {"method": "POST", "url": "/v1/bucketlists/0/items",
+             "body": {"name": "Lost"}},
+            {"method": "POST", "url": "/v1/bucketlists",
+             "body": {"name": "Never sent"}},
+        ]}, status=400)
+        self.assertEqual([response['status']
+                          for response in result['responses']],
+                         [201, 200, 404])
+        self.assertEqual(self.bucketlist_names(), ["Travel"])
+
+    def test_atomic_batch_sees_its_writes(self):
+        self.test_client.get('/v1/bucketlists', headers=self.headers)
+        result = self.batch({"atomic": True, "requests": [
+            {"method": "POST", "url": "/v1/bucketlists",
+             "body": {"name": "Learn"}},
+            {"url": "/v1/bucketlists"},
+        ]})
+        listing = result['responses'][1]['body']
+        self.assertEqual([bucketlist['name']
+                          for bucketlist in listing['bucketlists']],
+                         ["Travel", "Learn"])
+        response = self.test_client.get('/v1/bucketlists',
+                                        headers=self.headers)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(sorted(self.bucketlist_names()), ["Learn", "Travel"])
+
+    def test_batch_reads_its_writes(self):
+        items_url = '/v1/bucketlists/%d/items' % self.bucketlist_id
+        for atomic in (False, True):
+            self.test_client.get('/v1/bucketlists?items=count',
+                                 headers=self.headers)
+            result = self.batch({"atomic": atomic, "requests": [
+                {"method": "POST", "url": items_url,
+                 "body": {"name": "Visit Kano"}},
+                {"url": "/v1/bucketlists?items=count"},
+            ]})
+            listing = result['responses'][1]['body']
+            self.assertEqual(listing['bucketlists'][0]['item_count'],
+                             atomic and 2 or 1)
+
+    def test_invalid_batch(self):
+        self.batch({"requests": []}, status=400)
+        self.batch([{"method": "TRACE", "url": "/v1/bucketlists"}],
+                   status=400)
+        self.batch([{"url": "v1/bucketlists"}], status=400)
+        result = self.batch([{"method": "POST", "url": "/v1/batch",
+                              "body": [{"url": "/v1/bucketlists"}]}])
+        self.assertEqual(result['responses'][0]['status'], 400)
+        response = send_post(self.test_client, '/v1/batch',
+                             [{"url": "/v1/bucketlists"}])
+        self.assertEqual(response.status_code, 403)
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestSQLInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        api.add_resource(CreateUserAPI, '/auth/register', endpoint='register')
+        api.add_resource(BucketListAPI, '/bucketlists',
+                                        '/bucketlists/<int:id>',
+                                        endpoint='bucketlists')
+        db.create_all()
+        self.test_client = self.app.test_client()
+        self.token = register_a_user(self.test_client, "instrumented")
+        post_a_bucketlist(self.test_client, self.token)
+        self.handler = RecordingHandler()
+        logging.getLogger('bucketlist_api.slow_query').addHandler(
+            self.handler)
+
+    def tearDown(self):
+        logging.getLogger('bucketlist_api.slow_query').removeHandler(
+            self.handler)
+        User.query.filter_by(username='instrumented').first().delete()
+
+    def test_server_timing_header(self):
+        headers = authorization_header(self.token)
+        with QueryCounter() as counter:
+            response = self.test_client.get('/v1/bucketlists',
+                                            headers=headers)
+        self.assertIn('desc="%d queries"' % counter.count,
+                      response.headers['Server-Timing'])
+
+    def test_server_timing_disabled(self):
+        self.app.config['SQL_SERVER_TIMING'] = False
+        headers = authorization_header(self.token)
+        response = self.test_client.get('/v1/bucketlists', headers=headers)
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_slow_query_log(self):
+        self.app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+        headers = authorization_header(self.token)
+        self.test_client.get('/v1/bucketlists', headers=headers)
+        self.assertTrue(self.handler.records)
+        entry = json.loads(self.handler.records[0].getMessage())
+        self.assertEqual(entry['path'], '/v1/bucketlists')
+        self.assertIn('SELECT', entry['statement'])
+
+    def test_failed_statement_not_left_timing(self):
+        connection = db.get_engine(self.app).connect()
+        try:
+            with self.assertRaises(OperationalError):
+                connection.execute('SELECT * FROM missing_table')
+            self.assertEqual(connection.info.get('query_start'), [])
+        finally:
+            connection.close()
+
+
 class TestHelpAPI(unittest.TestCase):
 
     def setUp(self):
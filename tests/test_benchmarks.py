@@ -0,0 +1,25 @@
+import unittest
+from bucketlist_api import create_app
+from bucketlist_api.config import TestConfig
+from benchmarks.api import run, scenarios, summarize
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def tearDown(self):
+        create_app(TestConfig)
+
+    def test_api_benchmark_runs(self):
+        # Enough bucketlists for every searched word to match one of them
+        report = run(users=1, bucketlists=200, items=1, requests=4,
+                     workers=2, hash_rounds=1000)
+        self.assertEqual(sorted(report['endpoints']),
+                         sorted(name for name, _ in scenarios(None)))
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 4, name)
+            self.assertEqual(result['errors'], 0, name)
+
+    def test_summarize_without_latencies(self):
+        self.assertEqual(summarize([], 2, 0), {
+            'requests': 0, 'errors': 2, 'throughput': None, 'p50_ms': None,
+            'p95_ms': None, 'p99_ms': None})
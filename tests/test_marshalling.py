@@ -0,0 +1,58 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+import pytz
+from flask_restful import marshal, fields
+from bucketlist_api.marshalling import compile_fields
+from bucketlist_api.serializers import (bucketlist_collection_serializer,
+                                        bucketlist_serializer,
+                                        help_message_serializer)
+from benchmarks.serializers import make_page
+
+
+class TestCompiledSerializers(unittest.TestCase):
+
+    def assertSameOutput(self, data, serializer):
+        self.assertEqual(json.dumps(compile_fields(serializer)(data)),
+                         json.dumps(marshal(data, serializer)))
+
+    def test_bucketlist_collection(self):
+        self.assertSameOutput(make_page(5, 3), bucketlist_collection_serializer)
+
+    def test_cursor_pagination_without_total(self):
+        data = make_page(2, 1)
+        data['pagination'] = {'next': 'http://localhost/v1/bucketlists'}
+        self.assertSameOutput(data, bucketlist_collection_serializer)
+
+    def test_list_of_bucketlists(self):
+        self.assertSameOutput(make_page(3, 2)['bucketlists'],
+                              bucketlist_serializer)
+
+    def test_missing_values(self):
+        self.assertSameOutput({}, bucketlist_collection_serializer)
+
+    def test_help_message(self):
+        data = {
+            "message": "Access the app with url provided",
+            "items": {"methods": "POST", "url": ["/a", "/b"],
+                      "PublicAccess": False},
+        }
+        self.assertSameOutput(data, help_message_serializer)
+
+    def test_uncompiled_field_types(self):
+        serializer = {
+            'price': fields.Fixed(decimals=2),
+            'owner': fields.String(attribute='user.name'),
+            'nested': {'id': fields.Integer},
+        }
+        data = {'price': 3.14159, 'user': {'name': 'malik'}, 'id': 4}
+        self.assertSameOutput(data, serializer)
+
+    def test_rfc822(self):
+        serializer = {'date': fields.DateTime}
+        start = datetime(1999, 12, 31, 23, 59, 59)
+        for days in range(0, 4000, 37):
+            date = start + timedelta(days=days, seconds=days)
+            self.assertSameOutput({'date': date}, serializer)
+            self.assertSameOutput({'date': pytz.timezone('Africa/Lagos')
+                                   .localize(date)}, serializer)
@@ -1,10 +1,17 @@
 import os
 import sys
 import inspect
-from bucketlist_api.models import User, BucketList, BucketListItem
+from bucketlist_api.models import (User, BucketList, BucketListItem,
+                                   _window_functions)
 import unittest
 from bucketlist_api import create_app, db
+from bucketlist_api.cache import (TokenCache, token_cache, MemoryBackend,
+                                  response_cache, PublicFeed)
+from bucketlist_api.hashing import password_hasher
+from werkzeug.exceptions import ServiceUnavailable
+from sqlalchemy.exc import IntegrityError
 from bucketlist_api.config import TestConfig
+import threading
 import time
 
 
@@ -18,6 +25,9 @@ class Testmodels(unittest.TestCase):
         self.user.save()
         self.token = self.user.generate_auth_token()
 
+    def tearDown(self):
+        self.user.delete()
+
     def test_user_model(self):
         self.assertGreater(self.user.id, 0)
 
@@ -43,6 +53,91 @@ class Testmodels(unittest.TestCase):
     def test_user_exist(self):
         self.assertTrue(User.user_exist("tester"))
 
+    def test_username_unique(self):
+        self.assertRaises(IntegrityError, User(username="tester",
+                                               password="wahab").save)
+        db.session.rollback()
+
+
+class TestPasswordHashing(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        db.create_all()
+
+    def test_rehash_on_login(self):
+        user = User(username="rehash", password="wahab")
+        user.save()
+        self.app.config['PASSWORD_HASH_ROUNDS'] = 2000
+        password_hasher.init_app(self.app)
+        self.assertTrue(User.get_user("rehash", "wahab"))
+        self.assertIn('rounds=2000', User.query.get(user.id).password_hash)
+
+    def test_hash_in_worker_process(self):
+        self.app.config['PASSWORD_HASH_WORKERS'] = 1
+        password_hasher.init_app(self.app)
+        user = User(username="pooled", password="wahab")
+        self.assertTrue(user.verify_password("wahab"))
+        self.assertFalse(user.verify_password("invalid"))
+
+    def test_queue_full(self):
+        self.app.config['PASSWORD_HASH_WORKERS'] = 1
+        self.app.config['PASSWORD_HASH_QUEUE_DEPTH'] = 0
+        password_hasher.init_app(self.app)
+        password_hasher._slots.acquire()
+        try:
+            self.assertRaises(ServiceUnavailable, User, username="busy",
+                              password="wahab")
+        finally:
+            password_hasher._slots.release()
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        db.create_all()
+        self.user = User(username="cached", password="wahab")
+        self.user.save()
+        self.token = self.user.generate_auth_token()
+
+    def tearDown(self):
+        User.query.filter_by(username="cached").delete()
+        db.session.commit()
+
+    def test_verify_token_cached(self):
+        identity = User.verify_token(self.token)
+        self.assertEqual(identity.id, self.user.id)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+        cached = User.verify_token(self.token)
+        self.assertIs(cached, identity)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    def test_delete_user_invalidates_token(self):
+        User.verify_token(self.token)
+        self.user.delete()
+        self.assertIsNone(User.verify_token(self.token))
+
+    def test_password_change_invalidates_token(self):
+        User.verify_token(self.token)
+        self.user.set_password("newpassword")
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        cache = TokenCache(max_size=2)
+        for user_id in range(3):
+            cache.set(str(user_id), User.verify_token(self.token))
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('2'))
+
+    def test_entry_capped_by_token_expiry(self):
+        cache = TokenCache(ttl=300)
+        cache.set('token', User.verify_token(self.token),
+                  token_expiry=time.time() - 1)
+        self.assertIsNone(cache.get('token'))
+
 
 class TestBucketListModels(unittest.TestCase):
 
@@ -50,10 +145,14 @@ class TestBucketListModels(unittest.TestCase):
         self.app = create_app(TestConfig)
         self.app.app_context().push()
         db.create_all()
+        self.user = User(username="traveller", password="wahab").save()
         self.bucketlist = BucketList(name="Travel the World")
-        self.bucketlist.user_id = 10
+        self.bucketlist.user_id = self.user.id
         self.bucketlist.save()
 
+    def tearDown(self):
+        self.user.delete()
+
     def test_bucketlist_init(self):
         self.assertGreater(self.bucketlist.id, 0)
 
@@ -61,6 +160,65 @@ class TestBucketListModels(unittest.TestCase):
         self.bucketlist.update(is_public=True)
         self.assertTrue(self.bucketlist.is_public)
 
+    def test_item_counts(self):
+        item = BucketListItem(name="See the pyramids",
+                              bucketlist_id=self.bucketlist.id).save()
+        BucketListItem(name="See the alps", done=True,
+                       bucketlist_id=self.bucketlist.id).save()
+        item.update(done=True)
+        bucketlist = BucketList.query.get(self.bucketlist.id)
+        self.assertEqual((bucketlist.item_count, bucketlist.done_count),
+                         (2, 2))
+        item.delete()
+        bucketlist = BucketList.query.get(self.bucketlist.id)
+        self.assertEqual((bucketlist.item_count, bucketlist.done_count),
+                         (1, 1))
+
+    def test_mark_done_counts_null_done(self):
+        item_id = db.session.execute(BucketListItem.__table__.insert(), {
+            'name': "See the pyramids", 'done': None,
+            'bucketlist_id': self.bucketlist.id}).inserted_primary_key[0]
+        BucketList.update_counts({self.bucketlist.id: (1, 0)})
+        db.session.commit()
+        for done, done_count in ((False, 0), (True, 1), (True, 1),
+                                 (False, 0)):
+            BucketListItem.mark_done(self.bucketlist.id, [item_id], done)
+            bucketlist = BucketList.query.get(self.bucketlist.id)
+            db.session.refresh(bucketlist)
+            self.assertEqual(bucketlist.done_count, done_count)
+
+    def test_item_writes_touch_bucketlist(self):
+        def modified():
+            return db.session.query(BucketList.date_modified).filter_by(
+                id=self.bucketlist.id).scalar()
+        dates = [modified()]
+        item = BucketListItem(name="See the pyramids",
+                              bucketlist_id=self.bucketlist.id).save()
+        dates.append(modified())
+        item.update(name="See the sphinx")
+        dates.append(modified())
+        BucketListItem.save_all([BucketListItem(
+            name="See the alps", bucketlist_id=self.bucketlist.id)])
+        dates.append(modified())
+        BucketListItem.mark_done(self.bucketlist.id, [item.id], True)
+        dates.append(modified())
+        item.delete()
+        dates.append(modified())
+        self.assertEqual(dates, sorted(set(dates)))
+
+    def test_reconcile_counts(self):
+        BucketListItem(name="See the pyramids",
+                       bucketlist_id=self.bucketlist.id).save()
+        BucketList.query.filter_by(id=self.bucketlist.id).update(
+            {'item_count': 5, 'done_count': 3}, synchronize_session=False)
+        self.assertEqual(BucketList.reconcile_counts(self.bucketlist.id,
+                                                     self.bucketlist.id), 1)
+        db.session.commit()
+        bucketlist = BucketList.query.get(self.bucketlist.id)
+        self.assertEqual((bucketlist.item_count, bucketlist.done_count),
+                         (1, 0))
+        self.assertEqual(BucketList.reconcile_counts(), 0)
+
 
 class TestBucketListItemModels(unittest.TestCase):
 
@@ -75,8 +233,126 @@ class TestBucketListItemModels(unittest.TestCase):
         self.bucketlist_item.save()
 
     def tearDown(self):
-        self.bucketlist.delete()
         self.bucketlist_item.delete()
+        self.bucketlist.delete()
 
     def test_bucketlist_item_init(self):
         self.assertGreater(self.bucketlist_item.id, 0)
+
+
+class TestLoadItems(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        db.create_all()
+        self.user = User(username="preview", password="wahab").save()
+        self.bucketlists = []
+        for number in range(3):
+            bucketlist = BucketList(name="List %d" % number,
+                                    user_id=self.user.id).save()
+            BucketListItem.save_all([
+                BucketListItem(name="Item %d" % item,
+                               bucketlist_id=bucketlist.id)
+                for item in range(number + 1)])
+            self.bucketlists.append(bucketlist)
+
+    def tearDown(self):
+        _window_functions.clear()
+        self.user.delete()
+
+    def previews(self, limit):
+        return [[item.name for item in bucketlist.item_list] for bucketlist in
+                BucketList.load_items(self.bucketlists, limit=limit)]
+
+    def test_preview_without_window_functions(self):
+        expected = [["Item 0"], ["Item 0", "Item 1"], ["Item 0", "Item 1"]]
+        self.assertEqual(self.previews(2), expected)
+        _window_functions['sqlite'] = False
+        self.assertEqual(self.previews(2), expected)
+        self.assertEqual(len(self.previews(None)[2]), 3)
+
+
+class TestResponseCacheBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        db.create_all()
+
+    def test_memory_backend_evicts_entries_not_counters(self):
+        backend = MemoryBackend(max_size=2)
+        self.assertEqual(backend.incr('generation:1'), 1)
+        for key in ('a', 'b', 'c'):
+            backend.set(key, key, 60)
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.get('c'), 'c')
+        self.assertEqual(backend.get('generation:1'), 1)
+
+    def test_invalidate_after_commit(self):
+        user = User(username="generation", password="wahab")
+        user.save()
+        generation = response_cache.backend.get('generation:%d' % user.id)
+        user.update(username="generation2", commit=False)
+        self.assertEqual(
+            response_cache.backend.get('generation:%d' % user.id), generation)
+        db.session.rollback()
+        self.assertEqual(
+            response_cache.backend.get('generation:%d' % user.id), generation)
+        BucketList(name="Travel", user_id=user.id).save()
+        self.assertEqual(
+            response_cache.backend.get('generation:%d' % user.id),
+            generation + 1)
+        user.delete()
+
+
+class TestPublicFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.records = {1: 'first', 2: 'second', 3: 'third'}
+        self.loading = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.feed = PublicFeed()
+
+    def load(self, ids=None, after=None, limit=None):
+        self.loading.set()
+        self.release.wait(5)
+        entries = [((id, id), record) for id, record in
+                   sorted(self.records.items(), reverse=True)
+                   if ids is None or id in ids]
+        return entries[:limit]
+
+    def names(self):
+        entries, _, _ = self.feed.page(self.load, None, 10)
+        return [record for key, record in entries]
+
+    def test_readers_do_not_wait_for_a_load(self):
+        self.assertEqual(self.names(), ['third', 'second', 'first'])
+        self.records[2] = 'renamed'
+        self.feed.refresh(2, True)
+        self.release.clear()
+        syncing = threading.Thread(target=self.names)
+        syncing.start()
+        self.assertTrue(self.loading.wait(5))
+        # The head is served as it is while the other reader queries
+        self.assertEqual(self.names(), ['third', 'second', 'first'])
+        self.assertEqual(self.feed.stats()['size'], 3)
+        self.feed.refresh(3, True)
+        self.release.set()
+        syncing.join()
+        self.records[3] = 'changed'
+        self.assertEqual(self.names(), ['changed', 'renamed', 'first'])
+
+    def test_load_dropped_when_invalidated(self):
+        self.assertEqual(self.names(), ['third', 'second', 'first'])
+        self.feed.refresh(1, True)
+        self.release.clear()
+        self.loading.clear()
+        syncing = threading.Thread(target=self.names)
+        syncing.start()
+        self.assertTrue(self.loading.wait(5))
+        self.feed.invalidate()
+        self.release.set()
+        syncing.join()
+        self.assertEqual(self.feed.stats()['size'], 0)
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+from bucketlist_api import create_app, db
+from bucketlist_api.config import TestConfig
+
+
+class TestSQLitePragmas(unittest.TestCase):
+
+    def setUp(self):
+        # WAL needs a database file, the test database is in memory
+        self.directory = tempfile.mkdtemp()
+        self.database = 'sqlite:///' + os.path.join(self.directory,
+                                                    'pragmas.sqlite')
+
+    def tearDown(self):
+        create_app(TestConfig)
+        shutil.rmtree(self.directory)
+
+    def pragmas(self, settings):
+        settings['SQLALCHEMY_DATABASE_URI'] = self.database
+        app = create_app(type('PragmaConfig', (TestConfig,), settings))
+        engine = db.get_engine(app)
+        connection = engine.connect()
+        try:
+            return dict((name, connection.execute('PRAGMA %s' % name)
+                         .scalar()) for name in ('journal_mode',
+                                                 'synchronous', 'cache_size',
+                                                 'busy_timeout',
+                                                 'foreign_keys'))
+        finally:
+            connection.close()
+            engine.dispose()
+
+    def test_config_pragmas(self):
+        pragmas = self.pragmas({})
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                   'cache_size': -65536,
+                                   'busy_timeout': 5000, 'foreign_keys': 1})
+
+    def test_custom_pragmas(self):
+        pragmas = self.pragmas({'SQLITE_PRAGMAS': [('foreign_keys', 'ON'),
+                                                   ('busy_timeout', 100)]})
+        self.assertEqual(pragmas['journal_mode'], 'delete')
+        self.assertEqual(pragmas['synchronous'], 2)
+        self.assertEqual(pragmas['busy_timeout'], 100)
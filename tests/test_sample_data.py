@@ -0,0 +1,63 @@
+import unittest
+from bucketlist_api import create_app, db
+from bucketlist_api.config import TestConfig
+from bucketlist_api.models import User, BucketList, BucketListItem
+from bucketlist_api.sample_data import generate
+from bucketlist_api.search import search_index
+
+
+class TestSampleData(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app.app_context().push()
+        db.create_all()
+
+    def tearDown(self):
+        users = User.query.filter(User.username.like('sample%'))
+        bucketlists = BucketList.query.filter(BucketList.user_id.in_(
+            [user.id for user in users]))
+        BucketListItem.query.filter(BucketListItem.bucketlist_id.in_(
+            [bucketlist.id for bucketlist in bucketlists])).delete(
+                synchronize_session=False)
+        bucketlists.delete(synchronize_session=False)
+        users.delete(synchronize_session=False)
+        search_index.rebuild(db.session)
+        db.session.commit()
+
+    def rows(self, bucketlist_ids):
+        return [(bucketlist.name, bucketlist.is_public, bucketlist.date_created,
+                 [(item.name, item.done) for item in bucketlist.items])
+                for bucketlist in BucketList.query.filter(
+                    BucketList.id.in_(bucketlist_ids)).order_by(BucketList.id)]
+
+    def test_generate_counts(self):
+        created = generate(users=3, bucketlists=4, items=5, batch_size=7)
+        self.assertEqual(len(created), 3)
+        for username, bucketlist_ids in created.items():
+            user = User.query.filter_by(username=username).one()
+            self.assertEqual(user.bucketlists.count(), 4)
+            self.assertEqual([bucketlist.id for bucketlist in
+                              user.bucketlists.order_by(BucketList.id)],
+                             list(bucketlist_ids))
+        self.assertTrue(User.get_user(username, 'password'))
+        self.assertEqual(BucketListItem.query.filter(
+            BucketListItem.bucketlist_id.in_(list(bucketlist_ids))).count(),
+            20)
+
+    def test_generate_indexed(self):
+        created = generate(users=2, bucketlists=3, items=2, seed=3)
+        username, bucketlist_ids = sorted(created.items())[0]
+        user = User.query.filter_by(username=username).one()
+        bucketlist = BucketList.query.get(bucketlist_ids[0])
+        found = search_index.search(user.bucketlists, BucketList,
+                                    bucketlist.name, user.id, db.session)
+        self.assertIn(bucketlist.id, [hit.id for hit in found])
+
+    def test_generate_deterministic(self):
+        first = generate(users=2, bucketlists=3, items=4, seed=7)
+        second = generate(users=2, bucketlists=3, items=4, seed=7)
+        first_ids = sorted(i for ids in first.values() for i in ids)
+        second_ids = sorted(i for ids in second.values() for i in ids)
+        self.assertNotEqual(first_ids, second_ids)
+        self.assertEqual(self.rows(first_ids), self.rows(second_ids))
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from bucketlist_api import create_app, db
+from bucketlist_api.config import TestConfig
+from bucketlist_api.cache import response_cache, token_cache
+from bucketlist_api.server import PreforkServer, server_options
+
+
+class Worker(object):
+
+    def __init__(self, app):
+        self.app = app
+
+
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        # The test database is in memory, disposing its engine would lose it
+        self.directory = tempfile.mkdtemp()
+        self.app = self.make_app()
+
+    def make_app(self, **settings):
+        settings['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+            self.directory, 'serve.sqlite')
+        return create_app(type('ServerConfig', (TestConfig,), settings))
+
+    def tearDown(self):
+        db.get_engine(self.app).dispose()
+        shutil.rmtree(self.directory)
+
+    def test_server_options(self):
+        options = server_options(self.app.config, workers=3, bind=None)
+        self.assertEqual(options['workers'], 3)
+        self.assertEqual(options['bind'], self.app.config['SERVER_BIND'])
+        self.assertEqual(options['worker_class'], 'gthread')
+        self.assertEqual(server_options(self.app.config, threads=1)[
+            'worker_class'], 'sync')
+        server = PreforkServer(self.app, options)
+        self.assertEqual(server.cfg.workers, 3)
+        self.assertEqual(server.cfg.keepalive,
+                         self.app.config['SERVER_KEEPALIVE'])
+        self.assertIs(server.load(), self.app)
+
+    def test_post_fork_disposes_engine(self):
+        engine = db.get_engine(self.app)
+        engine.execute('SELECT 1')
+        pool = engine.pool
+        server = PreforkServer(self.app, server_options(self.app.config))
+        server.cfg.post_fork(None, Worker(server))
+        self.assertIsNot(engine.pool, pool)
+
+    def test_workers_without_shared_cache(self):
+        PreforkServer(self.app, server_options(self.app.config, workers=1))
+        self.assertEqual(response_cache.backend.max_size,
+                         self.app.config['RESPONSE_CACHE_SIZE'])
+        self.assertTrue(token_cache.max_size)
+        PreforkServer(self.app, server_options(self.app.config, workers=2))
+        self.assertEqual(self.app.config['RESPONSE_CACHE_SIZE'], 0)
+        self.assertEqual(response_cache.backend.max_size, 0)
+        self.assertEqual(token_cache.max_size, 0)
+
+    def test_workers_with_shared_cache(self):
+        backend = 'bucketlist_api.cache.MemoryBackend'
+        app = self.make_app(RESPONSE_CACHE_BACKEND=backend)
+        PreforkServer(app, server_options(app.config, workers=2))
+        self.assertEqual(response_cache.backend.max_size,
+                         app.config['RESPONSE_CACHE_SIZE'])
+        self.assertTrue(app.config['RESPONSE_CACHE_SIZE'])
+        self.assertEqual(token_cache.max_size, 0)